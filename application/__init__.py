@@ -1,74 +1,100 @@
-from flask import (Flask,
-                   request,
-                   session,
-                   abort)
+"""Build the app: create_app() configures it and registers its views.
 
-import string
-import random
-import json
-import logging
+Importing the package (which the models, the database and the commands
+do) stays cheap and has no side effect: the blueprints and what they
+need are imported by create_app, and files and the database are only
+read there. The database's tables are created by `flask init-db`.
+"""
+
+import os
+
+from flask import Flask
+from werkzeug.utils import import_string
 
 # EMAIL
 
-from flask_mail import Mail, Message
+from flask_mail import Mail
 mail = Mail()
 
 # BLUEPRINTS
-from views.client.gifts.views import gifts_blueprint
-from views.client.claims.views import claims_blueprint
-from views.client.categories.views import categories_blueprint
-from views.client.users.views import users_blueprint
-
-from views.auth.login.views import login_blueprint
-from views.auth.logout.views import logout_blueprint
-
-from views.api.gifts.views import api_gifts_blueprint
-from views.api.categories.views import api_categories_blueprint
-
-# DATABASE
+# Imported by create_app only
+BLUEPRINTS = [
+    'application.views.client.gifts.views.gifts_blueprint',
+    'application.views.client.claims.views.claims_blueprint',
+    'application.views.client.categories.views.categories_blueprint',
+    'application.views.client.users.views.users_blueprint',
+
+    'application.views.auth.login.views.login_blueprint',
+    'application.views.auth.logout.views.logout_blueprint',
+
+    'application.views.api.gifts.views.api_gifts_blueprint',
+    'application.views.api.categories.views.api_categories_blueprint',
+    'application.views.api.claims.views.api_claims_blueprint',
+    'application.views.api.users.views.api_users_blueprint',
+
+    'application.views.internal.stats.views.internal_stats_blueprint',
+    'application.views.internal.metrics.views.internal_metrics_blueprint',
+]
+
+
+def create_app(profile=None):
+    """Return the app, configured by instance/flask.cfg.
+
+    Argument:
+    profile (str): e.g. 'production', to load instance/production.cfg
+                   over flask.cfg. Defaults to the GIFTR_PROFILE
+                   environment variable, if any.
+    """
+    from application.cache import category_registry, fragment_cache
+    from application.commands import register_commands
+    from application.csrf import init_csrf
+    from application.database import init_db
+    from application.instrumentation import query_stats
+    from application.mailer import configure_mail, mail_sender
+    from application.metrics import metrics
+    from application.oauth import oauth_client
+    from application.search import search_index
+    from application.sweeper import gift_sweeper
 
-import sys
-from sqlalchemy import create_engine
-
-from application.models import (Base,
-                    User,
-                    Gift,
-                    Category,
-                    Claim)
-
-
-def create_app():
     # App
     app = Flask(__name__, instance_relative_config=True)
     app.config.from_pyfile('flask.cfg')
+    profile = profile or os.environ.get('GIFTR_PROFILE')
+    if profile:
+        app.config.from_pyfile('%s.cfg' % profile)
+
+    # Secret key: from the environment, never from the code. No random
+    # fallback: each process (or reload) would sign sessions and CSRF
+    # tokens with its own key, and log everyone out
+    app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY') or \
+        app.config.get('SECRET_KEY')
+    if not app.config['SECRET_KEY']:
+        raise RuntimeError('Set the SECRET_KEY environment variable, the '
+                           'same for all the processes of the app.')
+    init_csrf(app)
 
     # Db
-    engine = create_engine('sqlite:///giftr.db')
-    Base.metadata.create_all(engine)
+    engine = init_db(app)
+    query_stats.init_app(app, engine)
+    metrics.init_app(app, engine)
+    category_registry.init_app(app)
+    fragment_cache.init_app(app)
+    search_index.init_app(app, engine)
+    gift_sweeper.init_app(app)
 
     # Email
-    mail_secrets_f = open('mail_secrets.json', 'r')
-    mail_secrets = mail_secrets_f.read()
-    mail_secrets_json = json.loads(mail_secrets)
-    app.config.update(
-        MAIL_SERVER=mail_secrets_json['server'],
-        MAIL_PORT=mail_secrets_json['port'],
-        MAIL_USE_SSL=mail_secrets_json['use_ssl'],
-        MAIL_USERNAME=mail_secrets_json['username'],
-        MAIL_PASSWORD=mail_secrets_json['password']
-    )
+    configure_mail(app)
     mail.init_app(app)
+    mail_sender.init_app(app)
 
-    # Blueprints
-    app.register_blueprint(gifts_blueprint)
-    app.register_blueprint(claims_blueprint)
-    app.register_blueprint(categories_blueprint)
-    app.register_blueprint(users_blueprint)
+    # OAuth providers
+    oauth_client.init_app(app)
 
-    app.register_blueprint(login_blueprint)
-    app.register_blueprint(logout_blueprint)
+    # Blueprints
+    for blueprint in BLUEPRINTS:
+        app.register_blueprint(import_string(blueprint))
 
-    app.register_blueprint(api_gifts_blueprint)
-    app.register_blueprint(api_categories_blueprint)
+    # Command line
+    register_commands(app)
 
     return app
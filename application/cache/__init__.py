@@ -0,0 +1,6 @@
+"""In-process caches of data that rarely changes."""
+
+from application.cache.categories import category_registry
+from application.cache.fragments import fragment_cache
+
+__all__ = ['category_registry', 'fragment_cache']
@@ -0,0 +1,87 @@
+"""Keep a process-wide snapshot of the categories."""
+
+import threading
+import time
+
+from application.database import db_session
+from application.metrics import CATEGORY_CACHE
+from application.models import Category
+from application.models.table_version import get_version
+
+
+class CategoryRegistry(object):
+    """Cached, read-only snapshot of all categories.
+
+    The snapshot is reloaded when this process writes a category (see
+    invalidate) and when another process did, which is noticed by checking
+    the category table's version in the database at most every
+    check_interval seconds.
+    """
+
+    def __init__(self, check_interval=5):
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._categories = None
+        self._by_id = {}
+        self._version = None
+        self._checked_at = 0
+
+    def init_app(self, app):
+        """Configure the registry from the app's config.
+
+        Argument:
+        app (object): the Flask app.
+        """
+        app.config.setdefault('CATEGORY_CACHE_CHECK_INTERVAL', 5)
+        self.check_interval = app.config['CATEGORY_CACHE_CHECK_INTERVAL']
+        self.invalidate()
+
+    def all(self):
+        """Return the list of all categories, ordered by id."""
+        return self._snapshot()[0]
+
+    def get(self, cat_id):
+        """Return the category of id cat_id, or None.
+
+        Argument:
+        cat_id (int): the id of the desired category.
+        """
+        return self._snapshot()[1].get(cat_id)
+
+    def invalidate(self):
+        """Forget the snapshot, it'll be reloaded on next read."""
+        with self._lock:
+            self._categories = None
+            self._by_id = {}
+            self._version = None
+
+    def _snapshot(self):
+        """Return the (list, dict by id) snapshot, fresh enough."""
+        categories, by_id = self._categories, self._by_id
+        stale = time.time() - self._checked_at >= self.check_interval
+        if categories is not None and not stale:
+            CATEGORY_CACHE.inc(('hit',))
+            return categories, by_id
+
+        with self._lock:
+            # Don't hold the request's session: the snapshot outlives it
+            session = db_session.session_factory()
+            try:
+                version = get_version(session, Category.__tablename__)
+                if self._categories is None or version != self._version:
+                    CATEGORY_CACHE.inc(('reload',))
+                    categories = session.query(Category) \
+                                        .order_by(Category.id) \
+                                        .all()
+                    self._categories = categories
+                    self._by_id = dict((cat.id, cat) for cat in categories)
+                    self._version = version
+                else:
+                    CATEGORY_CACHE.inc(('check',))
+                self._checked_at = time.time()
+                return self._categories, self._by_id
+            finally:
+                session.close()
+
+
+category_registry = CategoryRegistry()
@@ -0,0 +1,254 @@
+"""Cache rendered HTML: gift cards, and feed pages for anonymous visitors.
+
+A gift card is keyed on everything it shows: the gift's id, updated_at
+and the few values that change without touching updated_at (counters,
+state, creator and category names), who is looking at it, and the
+template's version. It is never stale, it just stops being asked for.
+
+A feed page is keyed on its URL and on a generation number that the
+views writing gifts bump (see invalidate_feed), and only lives for
+FRAGMENT_CACHE_PAGE_TIMEOUT seconds, for what the views can't see
+(another process without a shared backend, the sweeper).
+
+The cache lives in this process (LocalCache), or in Redis when
+FRAGMENT_CACHE_URL is set, to be shared by all the web processes.
+"""
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from flask import (request,
+                   session,
+                   render_template,
+                   Markup)
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+
+class LocalCache(object):
+    """Thread-safe LRU cache of strings, capped in total size."""
+
+    def __init__(self, max_size=16 * 1024 * 1024):
+        """Start empty.
+
+        Argument:
+        max_size (int): the total length of the values to keep at most,
+                        the least recently used ones are evicted first.
+        """
+        self.max_size = max_size
+        self.size = 0
+        self._entries = OrderedDict()
+        # Counters are tiny and must not be evicted
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Return the value of key, None if missing or expired."""
+        with self._lock:
+            if key in self._counters:
+                return str(self._counters[key])
+            entry = self._entries.pop(key, None)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at is not None and expires_at < time.time():
+                self.size -= len(value)
+                return None
+            # Most recently used last
+            self._entries[key] = entry
+            return value
+
+    def set(self, key, value, timeout=None):
+        """Store value under key, for timeout seconds if not None."""
+        expires_at = time.time() + timeout if timeout else None
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.size -= len(old[0])
+            if len(value) > self.max_size:
+                return
+            self._entries[key] = (value, expires_at)
+            self.size += len(value)
+            while self.size > self.max_size:
+                _, (evicted, _) = self._entries.popitem(last=False)
+                self.size -= len(evicted)
+
+    def incr(self, key):
+        """Increment the integer stored under key, return its new value."""
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + 1
+            return self._counters[key]
+
+    def clear(self):
+        """Forget everything."""
+        with self._lock:
+            self._entries.clear()
+            self._counters.clear()
+            self.size = 0
+
+
+class RedisCache(object):
+    """Same interface as LocalCache, shared by all processes via Redis.
+
+    Redis evicts according to its own maxmemory-policy (use allkeys-lru).
+    """
+
+    def __init__(self, url, prefix='giftr:'):
+        """Connect to Redis.
+
+        Arguments:
+        url (str): e.g. redis://localhost:6379/0.
+        prefix (str): prepended to every key.
+        """
+        if redis is None:
+            raise RuntimeError('FRAGMENT_CACHE_URL needs the redis package: '
+                               'pip install redis')
+        self.prefix = prefix
+        self._redis = redis.StrictRedis.from_url(url)
+
+    def get(self, key):
+        """Return the value of key, None if missing or expired."""
+        value = self._redis.get(self.prefix + key)
+        return value.decode('utf-8') if value is not None else None
+
+    def set(self, key, value, timeout=None):
+        """Store value under key, for timeout seconds if not None."""
+        self._redis.set(self.prefix + key, value.encode('utf-8'),
+                        ex=timeout or None)
+
+    def incr(self, key):
+        """Increment the integer stored under key, return its new value."""
+        return self._redis.incr(self.prefix + key)
+
+    def clear(self):
+        """Forget every key of this app."""
+        for key in self._redis.scan_iter(self.prefix + '*'):
+            self._redis.delete(key)
+
+
+class FragmentCache(object):
+    """Render gift cards and anonymous feed pages once, serve them again."""
+
+    def __init__(self):
+        self.app = None
+        self.backend = None
+        self._template_versions = {}
+
+    def init_app(self, app):
+        """Configure the cache and make gift_card() available to templates.
+
+        Argument:
+        app (object): the Flask app.
+        """
+        app.config.setdefault('FRAGMENT_CACHE_ENABLED', True)
+        app.config.setdefault('FRAGMENT_CACHE_MAX_SIZE', 16 * 1024 * 1024)
+        app.config.setdefault('FRAGMENT_CACHE_URL', None)
+        app.config.setdefault('FRAGMENT_CACHE_PAGE_TIMEOUT', 30)
+        self.app = app
+        self._template_versions = {}
+
+        if app.config['FRAGMENT_CACHE_URL']:
+            self.backend = RedisCache(app.config['FRAGMENT_CACHE_URL'])
+        else:
+            self.backend = LocalCache(app.config['FRAGMENT_CACHE_MAX_SIZE'])
+
+        app.jinja_env.globals['gift_card'] = self.gift_card
+
+    @property
+    def enabled(self):
+        """Whether the app is configured to use the cache."""
+        return self.app is not None and \
+            self.app.config['FRAGMENT_CACHE_ENABLED']
+
+    def gift_card(self, gift, page):
+        """Return the rendered gift_card.html of a gift, from the cache.
+
+        Arguments:
+        gift (object): the gift, with its creator and category loaded.
+        page (str): the page the card is shown on ("gifts", "gift"...).
+        """
+        def render():
+            return render_template('gift_card.html', gift=gift, page=page)
+
+        if not self.enabled:
+            return Markup(render())
+
+        if not session.get('username'):
+            viewer = 'anonymous'
+        elif session.get('user_id') == gift.creator_id:
+            viewer = 'creator'
+        else:
+            viewer = 'member'
+
+        key = 'card:%s' % _digest([
+            gift.id, gift.updated_at, gift.name, gift.description,
+            gift.picture, gift.expires_at, gift.open, gift.state,
+            gift.claim_count, gift.creator.name, gift.category.name,
+            page, viewer, self.template_version('gift_card.html')])
+
+        html = self.backend.get(key)
+        if html is None:
+            html = render()
+            self.backend.set(key, html)
+        return Markup(html)
+
+    def anonymous_page(self, f):
+        """Serve a page from the cache to anonymous visitors (decorator).
+
+        Logged in users, flashed messages and search results always get
+        a fresh page.
+        """
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            if not self.enabled or session.get('username') or \
+                    session.get('_flashes') or request.args.get('q'):
+                return f(*args, **kwargs)
+
+            generation = self.backend.get('feed-generation') or '0'
+            key = 'page:%s' % _digest([request.full_path, generation])
+            html = self.backend.get(key)
+            if html is not None:
+                return html
+
+            response = f(*args, **kwargs)
+            if isinstance(response, basestring):
+                self.backend.set(key, response,
+                                 self.app.config['FRAGMENT_CACHE_PAGE_TIMEOUT'])  # noqa
+            return response
+        return decorated_function
+
+    def invalidate_feed(self):
+        """Forget the cached feed pages, e.g. after a gift changed."""
+        if self.backend is not None:
+            self.backend.incr('feed-generation')
+
+    def template_version(self, name):
+        """Return a short hash of a template's source.
+
+        Computed once per process, unless templates auto reload.
+
+        Argument:
+        name (str): the template's name.
+        """
+        version = self._template_versions.get(name)
+        if version is None or self.app.jinja_env.auto_reload:
+            env = self.app.jinja_env
+            source = env.loader.get_source(env, name)[0]
+            version = hashlib.sha1(source.encode('utf-8')).hexdigest()[:8]
+            self._template_versions[name] = version
+        return version
+
+
+def _digest(parts):
+    """Return a short, stable key for a list of values."""
+    key = u'|'.join(u'%s' % (part,) for part in parts)
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+
+fragment_cache = FragmentCache()
@@ -0,0 +1,127 @@
+"""Define command line tasks, run them with `flask <command>`."""
+
+import click
+
+from application.database import db_session
+from application.mailer import mail_sender
+from application.search import search_index
+from application.counters import refresh_claim_counters
+from application.sweeper import gift_sweeper
+from application.models import Base
+from application.migrations import (create_schema,
+                                    upgrade,
+                                    duplicate_keys,
+                                    backfill_timestamps)
+
+
+def register_commands(app):
+    """Attach the app's commands to its `flask` command line.
+
+    Argument:
+    app (object): the Flask app.
+    """
+    @app.cli.command('init-db')
+    def init_db():
+        """Create the database's tables and search index, if missing."""
+        engine = app.extensions['sqlalchemy_engine']
+        if create_schema(engine):
+            click.echo('Created the search index.')
+        click.echo('Database is ready.')
+
+    @app.cli.command('upgrade-db')
+    def upgrade_db():
+        """Add the missing tables, columns and indexes to the database,
+        drop the indexes the models don't declare anymore.
+
+        Leaves out, and reports, the unique indexes that rows break.
+        """
+        engine = app.extensions['sqlalchemy_engine']
+        changes = upgrade(engine)
+        for action, kind, name in changes:
+            click.echo('%s %s %s' % (action.capitalize(), kind, name))
+
+        # New counter columns start at zero: count the existing claims
+        if ('created', 'column', 'gift.claim_count') in changes:
+            refresh_claim_counters(db_session)
+            db_session.commit()
+            click.echo('Counted the claims of every gift.')
+
+        skipped = [name for action, kind, name in changes
+                   if action == 'skipped']
+        if skipped:
+            raise click.ClickException('\n'.join(
+                unique_index_error(engine, name) for name in skipped))
+        click.echo('Database is up to date.')
+
+    @app.cli.command('backfill-timestamps')
+    @click.option('--utc-offset', type=float, default=0,
+                  help='Hours between UTC and the local time the existing '
+                       'timestamps were written in (e.g. 2 for UTC+2).')
+    def backfill_timestamps_command(utc_offset):
+        """Fix the timestamps of existing rows (UTC, no missing dates).
+
+        Refuses to run twice on the same database.
+        """
+        try:
+            changed = backfill_timestamps(db_session, utc_offset)
+        except RuntimeError as e:
+            db_session.rollback()
+            raise click.ClickException(str(e))
+        db_session.commit()
+        for name, count in sorted(changed.items()):
+            click.echo('%s: %d row(s) fixed.' % (name, count))
+
+    @app.cli.command('rebuild-claim-counters')
+    def rebuild_claim_counters():
+        """Count the claims of every gift again."""
+        count = refresh_claim_counters(db_session)
+        db_session.commit()
+        click.echo('Counted the claims of %d gift(s).' % count)
+
+    @app.cli.command('rebuild-search-index')
+    def rebuild_search_index():
+        """Index all the gifts again, for search."""
+        search_index.rebuild(db_session)
+        db_session.commit()
+        click.echo('Search index rebuilt.')
+
+    @app.cli.command('sweep-gifts')
+    @click.option('--once', is_flag=True,
+                  help='Expire and archive the due gifts and exit.')
+    def sweep_gifts(once):
+        """Expire (and archive) the gifts past their date."""
+        if once:
+            expired, archived = gift_sweeper.sweep()
+            click.echo('Expired %d gift(s), archived %d gift(s).'
+                       % (expired, archived))
+        else:
+            gift_sweeper.run()
+
+    @app.cli.command('send-mail')
+    @click.option('--once', is_flag=True,
+                  help='Send one batch of due mails and exit.')
+    def send_mail(once):
+        """Send the queued mails (run it alongside the web server)."""
+        if once:
+            sent = mail_sender.send_pending()
+            click.echo('Sent %d mail(s).' % sent)
+        else:
+            mail_sender.run()
+
+
+def unique_index_error(engine, index_name):
+    """Return the message for a unique index the upgrade left out.
+
+    Arguments:
+    engine (object): an engine bound to the database.
+    index_name (str): the name of the index, one of the models'.
+    """
+    index = [index for table in Base.metadata.sorted_tables
+             for index in table.indexes if index.name == index_name][0]
+    table = index.table
+    return ('Left out the index %s: rows of %s share their %s. Make them '
+            'unique and run upgrade-db again. The rows, by %s: %s'
+            % (index.name, table.name,
+               ', '.join(column.name for column in index.columns),
+               list(table.primary_key)[0].name,
+               ', '.join(str(key) for key in duplicate_keys(engine, index))))
@@ -0,0 +1,82 @@
+"""Keep the gifts' claim counters in step with their claims.
+
+Gift.claim_count and Gift.accepted_claim_id repeat what the claim table
+says, so that gift listings can show them without querying claims. The
+claims views update them in the same transaction as the claims
+themselves. If they ever drift, refresh_claim_counters counts again.
+
+The counters are not a change of the gift: updated_at is left alone.
+"""
+
+from sqlalchemy import and_, func, select
+
+from application.models import Gift, Claim
+
+
+def claim_added(session, gift_id):
+    """Count one more claim on a gift.
+
+    Arguments:
+    session (object): the database session of the current request.
+    gift_id (int): the id of the claimed gift.
+    """
+    return _update_counters(session, [gift_id],
+                            {Gift.claim_count: Gift.claim_count + 1})
+
+
+def claim_removed(session, claim):
+    """Count one less claim on a gift, forget it if it was accepted.
+
+    Arguments:
+    session (object): the database session of the current request.
+    claim (object): the claim being deleted.
+    """
+    values = {Gift.claim_count: Gift.claim_count - 1}
+    if claim.accepted:
+        values[Gift.accepted_claim_id] = None
+    return _update_counters(session, [claim.gift_id], values)
+
+
+def refresh_claim_counters(session, gift_ids=None):
+    """Count the claims of gifts again, return the number of gifts.
+
+    One statement, whatever the number of gifts.
+
+    Arguments:
+    session (object): a database session.
+    gift_ids (list): the ids of the gifts to refresh, None for all gifts.
+    """
+    claim_count = select([func.count(Claim.id)]) \
+        .where(Claim.gift_id == Gift.id) \
+        .as_scalar()
+    accepted_claim_id = select([func.min(Claim.id)]) \
+        .where(and_(Claim.gift_id == Gift.id,
+                    Claim.accepted.is_(True))) \
+        .as_scalar()
+    return _update_counters(session, gift_ids,
+                            {Gift.claim_count: claim_count,
+                             Gift.accepted_claim_id: accepted_claim_id})
+
+
+def _update_counters(session, gift_ids, values):
+    """UPDATE the counters of gifts in SQL, leaving updated_at alone.
+
+    The gifts already loaded in the session have their counters expired,
+    they are read again on next access.
+    """
+    if gift_ids is not None and not gift_ids:
+        return 0
+
+    values = dict(values)
+    values[Gift.updated_at] = Gift.updated_at
+
+    query = session.query(Gift)
+    if gift_ids is not None:
+        query = query.filter(Gift.id.in_(gift_ids))
+    count = query.update(values, synchronize_session=False)
+
+    for gift in session.identity_map.values():
+        if isinstance(gift, Gift) and (gift_ids is None or
+                                       gift.id in gift_ids):
+            session.expire(gift, ['claim_count', 'accepted_claim_id'])
+    return count
@@ -0,0 +1,51 @@
+"""Protect the app's forms against cross-site request forgery.
+
+Source: http://flask.pocoo.org/snippets/3/
+"""
+
+import logging
+import random
+import string
+
+from flask import request, session, abort, current_app
+
+
+def init_csrf(app):
+    """Check the token of every form POSTed, give templates csrf_token().
+
+    Argument:
+    app (object): the Flask app.
+    """
+    app.config.setdefault('CSRF_ENABLED', True)
+    app.before_request(csrf_protect)
+    app.jinja_env.globals['csrf_token'] = generate_csrf_token
+
+
+def csrf_protect():
+    """Check on every POST form submit for a hidden CSRF PROTECT token."""
+    if not current_app.config['CSRF_ENABLED']:
+        return
+    if request.method == "POST" and request.form:
+        token = session.pop('_csrf_token', None)
+        if not token or token != request.form.get('_csrf_token'):
+            log = 'CSRF Protection blocked a POST request.'
+            log += '\nRequest was: ' + str(dict(request.form))
+            log += '\nResponded with error 403.'
+            logging.warning(log)
+            abort(403)
+
+
+def generate_csrf_token():
+    """Return and store in session a random CSRF PROTECT token."""
+    if '_csrf_token' not in session:
+        session['_csrf_token'] = get_random_string()
+    return session['_csrf_token']
+
+
+def get_random_string():
+    """Get a random string of 32 uppercase letters and digits."""
+    choice = string.ascii_uppercase + string.digits
+    # Tokens must not be guessable
+    rng = random.SystemRandom()
+    chars = [rng.choice(choice) for x in xrange(32)]
+    return ''.join(chars)
@@ -0,0 +1,150 @@
+"""Create the database engine and the request-scoped session."""
+
+import os
+import timeit
+
+from flask import _app_ctx_stack
+from sqlalchemy import create_engine, event, exc
+from sqlalchemy.engine.url import make_url
+from sqlalchemy.orm import scoped_session, sessionmaker
+from sqlalchemy.pool import QueuePool
+
+from application.metrics import POOL_WAIT
+
+# One session per application context (so per request and per thread).
+# Views use it like a regular session: db_session.query(...), .add(), ...
+db_session = scoped_session(sessionmaker(),
+                            scopefunc=_app_ctx_stack.__ident_func__)
+
+
+class TimedQueuePool(QueuePool):
+    """A QueuePool timing how long it takes to hand out a connection."""
+
+    def _do_get(self):
+        start = timeit.default_timer()
+        try:
+            return QueuePool._do_get(self)
+        finally:
+            POOL_WAIT.observe(timeit.default_timer() - start)
+
+
+def get_database_url(config):
+    """Return the database URL, from the environment or the app's config.
+
+    Argument:
+    config (dict): the Flask app's config.
+    """
+    return os.environ.get('DATABASE_URL') or config['DATABASE_URL']
+
+
+def make_engine(config):
+    """Return a pooled engine for the database configured in config.
+
+    Works for a server database (e.g. postgresql://...) as well as for a
+    local SQLite file, which gets tuned so that readers don't block behind
+    the writer.
+
+    Argument:
+    config (dict): the Flask app's config.
+    """
+    url = make_url(get_database_url(config))
+
+    connect_args = {}
+    if url.drivername.startswith('sqlite'):
+        # Pooled connections are handed from thread to thread
+        connect_args['check_same_thread'] = False
+    elif url.drivername in ('postgresql', 'postgresql+psycopg2'):
+        # Timestamps are in UTC, like SQLite's CURRENT_TIMESTAMP
+        connect_args['options'] = '-c timezone=utc'
+
+    engine = create_engine(
+        url,
+        poolclass=TimedQueuePool,
+        pool_size=config['DATABASE_POOL_SIZE'],
+        max_overflow=config['DATABASE_MAX_OVERFLOW'],
+        pool_recycle=config['DATABASE_POOL_RECYCLE'],
+        pool_pre_ping=config['DATABASE_POOL_PRE_PING'],
+        connect_args=connect_args)
+
+    if url.drivername.startswith('sqlite'):
+        set_sqlite_pragmas(engine, config)
+    guard_against_forks(engine)
+
+    return engine
+
+
+def guard_against_forks(engine):
+    """Never hand out a connection opened by another process.
+
+    A forked process inherits its parent's pooled connections, which
+    both would then use at once. Servers calling server.after_fork
+    dispose of them already; this catches the others.
+
+    Argument:
+    engine (object): an engine.
+    """
+    @event.listens_for(engine, 'connect')
+    def on_connect(dbapi_connection, connection_record):
+        connection_record.info['pid'] = os.getpid()
+
+    @event.listens_for(engine, 'checkout')
+    def on_checkout(dbapi_connection, connection_record, connection_proxy):
+        pid = os.getpid()
+        if connection_record.info['pid'] != pid:
+            # Drop it without closing it: it's the parent's
+            connection_record.connection = connection_proxy.connection = None
+            raise exc.DisconnectionError(
+                'Connection opened by process %s, checked out by %s.'
+                % (connection_record.info['pid'], pid))
+
+
+def set_sqlite_pragmas(engine, config):
+    """Apply WAL journaling and friends on every new SQLite connection.
+
+    Arguments:
+    engine (object): an engine bound to a SQLite database.
+    config (dict): the Flask app's config.
+    """
+    pragmas = [
+        'PRAGMA journal_mode=WAL',
+        'PRAGMA synchronous=NORMAL',
+        'PRAGMA busy_timeout=%d' % config['SQLITE_BUSY_TIMEOUT'],
+        'PRAGMA mmap_size=%d' % config['SQLITE_MMAP_SIZE'],
+    ]
+
+    @event.listens_for(engine, 'connect')
+    def on_connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for pragma in pragmas:
+            cursor.execute(pragma)
+        cursor.close()
+
+
+def init_db(app):
+    """Create a pooled engine from the app's config and bind the session.
+
+    The session is removed (closed and rolled back if needed) when the
+    application context is torn down, so every request starts clean.
+
+    Argument:
+    app (object): the Flask app.
+    """
+    app.config.setdefault('DATABASE_URL', 'sqlite:///giftr.db')
+    app.config.setdefault('DATABASE_POOL_SIZE', 5)
+    app.config.setdefault('DATABASE_MAX_OVERFLOW', 10)
+    app.config.setdefault('DATABASE_POOL_RECYCLE', 3600)
+    app.config.setdefault('DATABASE_POOL_PRE_PING', True)
+    app.config.setdefault('SQLITE_BUSY_TIMEOUT', 5000)
+    app.config.setdefault('SQLITE_MMAP_SIZE', 64 * 1024 * 1024)
+
+    engine = make_engine(app.config)
+
+    db_session.configure(bind=engine)
+    app.extensions['sqlalchemy_engine'] = engine
+
+    @app.teardown_appcontext
+    def remove_session(exception=None):
+        """Give the session's connection back to the pool."""
+        db_session.remove()
+
+    return engine
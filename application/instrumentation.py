@@ -0,0 +1,238 @@
+"""Measure what each request costs in SQL, per route.
+
+Listeners on the engine time every statement. Within a request, they
+add up the number of queries, the time spent in the database and the
+slowest statement, which are then:
+
+- sent back in a Server-Timing header, in debug mode (SERVER_TIMING);
+- added to per-route histograms, served as JSON on /_internal/stats;
+- logged as JSON to the giftr.sql.slow logger for the statements
+  slower than SQL_SLOW_QUERY_MS, in or out of a request.
+
+Statements run while a streamed response is being sent, after the view
+returned, are logged if slow but not counted in the request's totals.
+"""
+
+import json
+import logging
+import threading
+import timeit
+
+from flask import g, has_request_context, request
+from sqlalchemy import event
+
+# Upper bounds of the histograms' buckets, in milliseconds
+TIME_BUCKETS = (1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000,
+                float('inf'))
+# Upper bounds of the histograms' buckets, in queries
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, float('inf'))
+
+# The longest statement kept, in the logs and the stats
+MAX_STATEMENT_LENGTH = 1000
+
+slow_query_logger = logging.getLogger('giftr.sql.slow')
+
+
+class Histogram(object):
+    """Count values in buckets, keep their sum. Not thread-safe."""
+
+    def __init__(self, buckets):
+        """Start empty.
+
+        Argument:
+        buckets (tuple): the buckets' upper bounds (included), ascending,
+                         the last one being infinity.
+        """
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0
+
+    def observe(self, value):
+        """Count a value in the first bucket it fits in."""
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        self.count += 1
+        self.sum += value
+
+    def snapshot(self):
+        """Return the histogram as a JSON-ready dict."""
+        return {'buckets': [[_bound(bound), count]
+                            for bound, count in zip(self.buckets,
+                                                    self.counts)],
+                'count': self.count,
+                'sum': round(self.sum, 3)}
+
+
+class RouteStats(object):
+    """Totals and histograms of the requests of a route."""
+
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.latency = Histogram(TIME_BUCKETS)
+        self.db_time = Histogram(TIME_BUCKETS)
+        self.queries = Histogram(QUERY_BUCKETS)
+        self.max_queries = 0
+        self.slowest = None
+
+    def add(self, status, latency, queries, db_time, slowest):
+        """Account for a request."""
+        self.requests += 1
+        if status >= 500:
+            self.errors += 1
+        self.latency.observe(latency)
+        self.db_time.observe(db_time)
+        self.queries.observe(queries)
+        self.max_queries = max(self.max_queries, queries)
+        if slowest is not None and \
+                (self.slowest is None or slowest[0] > self.slowest[0]):
+            self.slowest = slowest
+
+    def snapshot(self):
+        """Return the route's stats as a JSON-ready dict."""
+        return {'requests': self.requests,
+                'errors': self.errors,
+                'latency_ms': self.latency.snapshot(),
+                'db_time_ms': self.db_time.snapshot(),
+                'queries': self.queries.snapshot(),
+                'max_queries': self.max_queries,
+                'slowest_query': None if self.slowest is None else
+                {'duration_ms': round(self.slowest[0], 3),
+                 'statement': self.slowest[1]}}
+
+
+class QueryStats(object):
+    """Time the engine's statements and the app's requests, per route."""
+
+    def __init__(self):
+        self.app = None
+        self.routes = {}
+        self._lock = threading.Lock()
+
+    def init_app(self, app, engine):
+        """Listen to the engine's statements and the app's requests.
+
+        Arguments:
+        app (object): the Flask app.
+        engine (object): the app's engine.
+        """
+        app.config.setdefault('SQL_SLOW_QUERY_MS', 250)
+        app.config.setdefault('SERVER_TIMING', None)
+        app.config.setdefault('INTERNAL_STATS_ENABLED', True)
+        self.app = app
+        self.reset()
+
+        event.listen(engine, 'before_cursor_execute', self._before_execute)
+        event.listen(engine, 'after_cursor_execute', self._after_execute)
+        event.listen(engine, 'handle_error', self._on_error)
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.teardown_request(self._teardown_request)
+
+    @property
+    def server_timing(self):
+        """Whether responses get a Server-Timing header."""
+        enabled = self.app.config['SERVER_TIMING']
+        return self.app.debug if enabled is None else enabled
+
+    def reset(self):
+        """Forget the stats gathered so far."""
+        with self._lock:
+            self.routes = {}
+
+    def snapshot(self):
+        """Return the stats of every route as a JSON-ready dict."""
+        with self._lock:
+            return dict((endpoint, stats.snapshot())
+                        for endpoint, stats in self.routes.items())
+
+    # Engine events
+
+    def _before_execute(self, conn, cursor, statement, parameters, context,
+                        executemany):
+        conn.info.setdefault('query_start', []).append(timeit.default_timer())
+
+    def _after_execute(self, conn, cursor, statement, parameters, context,
+                       executemany):
+        duration = (timeit.default_timer() -
+                    conn.info['query_start'].pop()) * 1000
+
+        endpoint = None
+        if has_request_context():
+            endpoint = request.endpoint
+            totals = getattr(g, '_query_stats', None)
+            if totals is not None:
+                totals['queries'] += 1
+                totals['db_time'] += duration
+                if totals['slowest'] is None or \
+                        duration > totals['slowest'][0]:
+                    totals['slowest'] = (duration,
+                                         statement[:MAX_STATEMENT_LENGTH])
+
+        threshold = self.app.config['SQL_SLOW_QUERY_MS']
+        if threshold is not None and duration >= threshold:
+            # No parameters: they may hold personal data
+            slow_query_logger.warning(json.dumps({
+                'event': 'slow_query',
+                'endpoint': endpoint,
+                'duration_ms': round(duration, 3),
+                'executemany': executemany,
+                'statement': statement[:MAX_STATEMENT_LENGTH]}))
+
+    def _on_error(self, context):
+        # The statement failed: after_cursor_execute won't pop its start
+        starts = context.connection.info.get('query_start') \
+            if context.connection is not None else None
+        if starts:
+            starts.pop()
+
+    # Request hooks
+
+    def _before_request(self):
+        g._query_stats = {'start': timeit.default_timer(),
+                          'queries': 0,
+                          'db_time': 0.0,
+                          'slowest': None,
+                          'recorded': False}
+
+    def _after_request(self, response):
+        totals = self._record(response.status_code)
+        if totals is not None and self.server_timing:
+            response.headers['Server-Timing'] = \
+                'db;dur=%.3f;desc="%d queries", app;dur=%.3f' % (
+                    totals['db_time'], totals['queries'],
+                    totals['latency'])
+        return response
+
+    def _teardown_request(self, exception=None):
+        # The view raised: after_request was skipped
+        if exception is not None:
+            self._record(500)
+
+    def _record(self, status):
+        """Add the current request to its route's stats, once."""
+        totals = getattr(g, '_query_stats', None)
+        if totals is None or totals['recorded']:
+            return None
+        totals['recorded'] = True
+        totals['latency'] = (timeit.default_timer() - totals['start']) * 1000
+
+        endpoint = request.endpoint or 'unmatched'
+        with self._lock:
+            stats = self.routes.get(endpoint)
+            if stats is None:
+                stats = self.routes[endpoint] = RouteStats()
+            stats.add(status, totals['latency'], totals['queries'],
+                      totals['db_time'], totals['slowest'])
+        return totals
+
+
+def _bound(bound):
+    """Return a bucket's bound for JSON, which has no infinity."""
+    return '+Inf' if bound == float('inf') else bound
+
+
+query_stats = QueryStats()
@@ -0,0 +1,194 @@
+"""Queue outgoing emails in the database and send them in the background.
+
+Views only enqueue a mail, in the same transaction as the change it is
+about. A MailSender then sends the due mails in batches over a single
+SMTP connection, retrying failures with an exponential backoff. It runs
+in a thread of the web process or in its own process (`flask send-mail`).
+"""
+
+import json
+import logging
+from datetime import datetime, timedelta
+
+from flask_mail import Message
+
+from application.database import db_session
+from application.metrics import MAILS_ENQUEUED, MAILS_SENT, MAIL_FAILURES
+from application.models import OutboundMail
+from application.workers import PeriodicWorker
+
+
+def enqueue_mail(session, subject, sender, recipients, body):
+    """Add a mail to the outbox, it is sent once the session commits.
+
+    Arguments:
+    session (object): the database session of the current request.
+    subject (str): the subject of the mail.
+    sender (str): the sender's email address.
+    recipients (list): the recipients' email addresses.
+    body (str): the plain text body of the mail.
+    """
+    mail = OutboundMail(subject=subject,
+                        sender=sender,
+                        recipients=','.join(recipients),
+                        body=body)
+    session.add(mail)
+    MAILS_ENQUEUED.inc()
+    return mail
+
+
+def configure_mail(app):
+    """Read the SMTP server's settings from the MAIL_SECRETS file.
+
+    Without the file, Flask-Mail's MAIL_* settings of the config apply
+    (localhost, port 25, by default).
+
+    Argument:
+    app (object): the Flask app.
+    """
+    app.config.setdefault('MAIL_SECRETS', 'mail_secrets.json')
+    file_name = app.config['MAIL_SECRETS']
+    if not file_name:
+        return
+    try:
+        with open(file_name, 'r') as f:
+            secrets = json.load(f)
+    except IOError:
+        logging.getLogger(__name__).warning(
+            'No %s: mails are sent through the MAIL_* settings.', file_name)
+        return
+
+    app.config.update(
+        MAIL_SERVER=secrets['server'],
+        MAIL_PORT=secrets['port'],
+        MAIL_USE_SSL=secrets['use_ssl'],
+        MAIL_USERNAME=secrets['username'],
+        MAIL_PASSWORD=secrets['password']
+    )
+
+
+class MailSender(PeriodicWorker):
+    """Send the mails of the outbox, in batches, with retries."""
+
+    name = 'giftr-mail-sender'
+    interval_key = 'MAIL_OUTBOX_INTERVAL'
+    enabled_key = 'MAIL_OUTBOX_WORKER'
+
+    def init_app(self, app):
+        """Configure the sender from the app's config.
+
+        Argument:
+        app (object): the Flask app.
+        """
+        app.config.setdefault('MAIL_OUTBOX_WORKER', False)
+        app.config.setdefault('MAIL_OUTBOX_INTERVAL', 10)
+        app.config.setdefault('MAIL_OUTBOX_BATCH_SIZE', 50)
+        app.config.setdefault('MAIL_OUTBOX_MAX_ATTEMPTS', 6)
+        app.config.setdefault('MAIL_OUTBOX_RETRY_DELAY', 30)
+        app.config.setdefault('MAIL_OUTBOX_LEASE', 300)
+        self.app = app
+        self.start_on_first_request(app)
+
+    def run_once(self):
+        """Send one batch of due mails."""
+        self.send_pending()
+
+    def send_pending(self):
+        """Send one batch of due mails, return the number of mails sent.
+
+        Needs an application context.
+        """
+        config = self.app.config
+        mails = self._claim_batch(config['MAIL_OUTBOX_BATCH_SIZE'],
+                                  config['MAIL_OUTBOX_LEASE'])
+        if not mails:
+            return 0
+
+        sent = 0
+        try:
+            # One SMTP connection for the whole batch
+            with self.app.extensions['mail'].connect() as connection:
+                for mail in mails:
+                    try:
+                        connection.send(self._to_message(mail))
+                    except Exception as e:
+                        self._failed(mail, e)
+                    else:
+                        mail.status = 'sent'
+                        mail.sent_at = datetime.utcnow()
+                        MAILS_SENT.inc()
+                        sent += 1
+        except Exception as e:
+            # Could not even connect: retry everything that wasn't sent
+            for mail in mails:
+                if mail.status == 'sending':
+                    self._failed(mail, e)
+
+        db_session.commit()
+        return sent
+
+    def _claim_batch(self, size, lease):
+        """Reserve due mails for this sender, return them.
+
+        A mail is reserved by pushing its next_attempt_at past the lease,
+        provided nobody changed it in between. If this sender dies, the
+        mail becomes due again once the lease is over.
+        """
+        now = datetime.utcnow()
+        candidates = db_session.query(OutboundMail.id,
+                                      OutboundMail.next_attempt_at) \
+                               .filter(OutboundMail.status.in_(['pending',
+                                                                'sending'])) \
+                               .filter(OutboundMail.next_attempt_at <= now) \
+                               .order_by(OutboundMail.next_attempt_at) \
+                               .limit(size) \
+                               .all()
+
+        claimed = []
+        for mail_id, next_attempt_at in candidates:
+            count = db_session.query(OutboundMail) \
+                              .filter_by(id=mail_id,
+                                         next_attempt_at=next_attempt_at) \
+                              .update({'status': 'sending',
+                                       'next_attempt_at': now + timedelta(seconds=lease)},  # noqa
+                                      synchronize_session=False)
+            if count:
+                claimed.append(mail_id)
+        db_session.commit()
+
+        if not claimed:
+            return []
+        return db_session.query(OutboundMail) \
+                         .filter(OutboundMail.id.in_(claimed)) \
+                         .all()
+
+    def _failed(self, mail, error):
+        """Schedule a retry of a mail, or give up on it."""
+        config = self.app.config
+        mail.attempts += 1
+        mail.last_error = unicode(error)[:500]
+
+        if mail.attempts >= config['MAIL_OUTBOX_MAX_ATTEMPTS']:
+            MAIL_FAILURES.inc(('true',))
+            mail.status = 'failed'
+            logging.error('Gave up sending mail %s: %s', mail.id, error)
+            return
+
+        MAIL_FAILURES.inc(('false',))
+        delay = config['MAIL_OUTBOX_RETRY_DELAY'] * 2 ** (mail.attempts - 1)
+        mail.status = 'pending'
+        mail.next_attempt_at = datetime.utcnow() + timedelta(seconds=delay)
+        logging.warning('Could not send mail %s, retrying in %ss: %s',
+                        mail.id, delay, error)
+
+    @staticmethod
+    def _to_message(mail):
+        """Return the Flask-Mail message of an outbox mail."""
+        message = Message(mail.subject,
+                          sender=mail.sender,
+                          recipients=mail.recipients.split(','))
+        message.body = mail.body
+        return message
+
+
+mail_sender = MailSender()
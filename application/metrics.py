@@ -0,0 +1,427 @@
+"""Count what the app does, for Prometheus to scrape on /metrics.
+
+Counters and histograms live in memory, each behind its own lock held
+for a dict update only. Gauges are read when scraped.
+
+With several processes (e.g. pre-forked workers, `flask send-mail`),
+each one only sees its own numbers. Set METRICS_DIR to a directory
+shared by all of them: each process then writes its counters and
+histograms there every METRICS_FLUSH_INTERVAL seconds (and on exit),
+and /metrics adds up the files of all processes, whichever worker
+answers the scrape. Per-process gauges get a pid label. Empty the
+directory when deploying, before the processes start.
+"""
+
+import atexit
+import json
+import os
+import tempfile
+import threading
+import time
+import timeit
+
+from flask import g, has_request_context, request
+from sqlalchemy import event, func
+
+from application.instrumentation import Histogram as Buckets
+from application.models import Base, OutboundMail
+
+# Upper bounds of the histograms' buckets
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5,
+                   10, float('inf'))
+WAIT_BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5,
+                float('inf'))
+SIZE_BUCKETS = (0, 1, 5, 10, 25, 50, 100, 250, 500, 1000, float('inf'))
+
+
+class Metric(object):
+    """A named family of samples, one per set of label values."""
+
+    kind = None
+
+    def __init__(self, name, help, labels=()):
+        """Name the family.
+
+        Arguments:
+        name (str): the metric's name, e.g. giftr_mail_sent_total.
+        help (str): what it counts, one line.
+        labels (tuple): the names of its labels.
+        """
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def reset(self):
+        """Forget the samples counted so far."""
+        with self._lock:
+            self._values = {}
+
+    def dump(self):
+        """Return the family's samples as a JSON-ready list."""
+        with self._lock:
+            return [[list(labels), value]
+                    for labels, value in self._values.items()]
+
+
+class Counter(Metric):
+    """A value that only goes up."""
+
+    kind = 'counter'
+
+    def inc(self, labels=(), amount=1):
+        """Add amount to the counter of some label values.
+
+        Arguments:
+        labels (tuple): the values of the labels, in order.
+        amount (float): what to add.
+        """
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+
+class Histogram(Metric):
+    """Observed values, counted in buckets."""
+
+    kind = 'histogram'
+
+    def __init__(self, name, help, labels=(), buckets=SECONDS_BUCKETS):
+        Metric.__init__(self, name, help, labels)
+        self.buckets = buckets
+
+    def observe(self, value, labels=()):
+        """Count a value for some label values.
+
+        Arguments:
+        value (float): the value.
+        labels (tuple): the values of the labels, in order.
+        """
+        with self._lock:
+            buckets = self._values.get(labels)
+            if buckets is None:
+                buckets = self._values[labels] = Buckets(self.buckets)
+            buckets.observe(value)
+
+    def dump(self):
+        """Return the family's samples as a JSON-ready list."""
+        with self._lock:
+            return [[list(labels), [list(buckets.counts), buckets.sum]]
+                    for labels, buckets in self._values.items()]
+
+
+class Gauge(Metric):
+    """A value read when scraped, by a function.
+
+    The function returns a dict of values by label values. Gauges of the
+    whole app (e.g. read from the database) are only read by the process
+    answering the scrape, the others are read by every process.
+    """
+
+    kind = 'gauge'
+
+    def __init__(self, name, help, collect, labels=(), per_process=True):
+        Metric.__init__(self, name, help, labels)
+        self.collect = collect
+        self.per_process = per_process
+
+    def dump(self):
+        """Return the family's samples as a JSON-ready list."""
+        return [[list(labels), value]
+                for labels, value in self.collect().items()]
+
+
+class Metrics(object):
+    """The app's metrics, and their text exposition."""
+
+    def __init__(self):
+        self.app = None
+        self.families = []
+        self._last_flush = 0
+
+    def add(self, metric):
+        """Register a metric, in place of any other one of that name."""
+        self.families = [family for family in self.families
+                         if family.name != metric.name]
+        self.families.append(metric)
+        return metric
+
+    def init_app(self, app, engine):
+        """Count requests and database connections, read the gauges.
+
+        Arguments:
+        app (object): the Flask app.
+        engine (object): the app's engine.
+        """
+        app.config.setdefault('METRICS_ENABLED', True)
+        app.config.setdefault('METRICS_ALLOWED_ADDRESSES', ['127.0.0.1',
+                                                           '::1'])
+        app.config.setdefault('METRICS_DIR', None)
+        app.config.setdefault('METRICS_FLUSH_INTERVAL', 10)
+        self.app = app
+
+        app.before_request(_start_timer)
+        app.after_request(_count_request)
+        app.teardown_request(_count_failed_request)
+        event.listen(engine.pool, 'checkout', _count_checkout)
+        # The identity map holds its objects weakly: by the end of the
+        # request it has lost most of them, so count them as they load
+        event.listen(Base, 'load', _count_load, propagate=True)
+
+        for name, help, read in [
+                ('giftr_db_pool_size', 'Connections kept in the pool.',
+                 lambda pool: pool.size()),
+                ('giftr_db_pool_checked_out', 'Connections in use.',
+                 lambda pool: pool.checkedout()),
+                ('giftr_db_pool_overflow',
+                 'Connections in use beyond the pool size.',
+                 lambda pool: max(pool.overflow(), 0))]:
+            self.add(Gauge(name, help, _pool_gauge(engine, read)))
+        self.add(Gauge('giftr_mail_outbox', 'Mails in the outbox.',
+                       _outbox_sizes, labels=('status',), per_process=False))
+
+        if app.config['METRICS_DIR']:
+            atexit.register(self.flush)
+
+    def reset(self):
+        """Start counting from zero, e.g. in a process just forked."""
+        for family in self.families:
+            family.reset()
+        self._last_flush = 0
+
+    @property
+    def directory(self):
+        """The directory shared by the processes, None if there's one."""
+        return self.app.config['METRICS_DIR'] if self.app else None
+
+    def maybe_flush(self):
+        """Write this process's file if it's been a while (cheap)."""
+        if self.directory and time.time() - self._last_flush >= \
+                self.app.config['METRICS_FLUSH_INTERVAL']:
+            self.flush()
+
+    def flush(self):
+        """Write this process's counters and histograms to METRICS_DIR."""
+        directory = self.directory
+        if not directory:
+            return
+        self._last_flush = time.time()
+        state = dict((family.name, family.dump())
+                     for family in self.families
+                     if not isinstance(family, Gauge))
+        state['_gauges'] = dict((family.name, family.dump())
+                                for family in self.families
+                                if isinstance(family, Gauge) and
+                                family.per_process)
+        # Write then rename: readers never see half a file
+        fd, path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(state, f)
+        os.rename(path, os.path.join(directory, '%d.json' % os.getpid()))
+
+    def render(self):
+        """Return all the metrics in Prometheus' text format."""
+        directory = self.directory
+        pid = str(os.getpid())
+        own = dict((family.name, family.dump()) for family in self.families)
+
+        # The other processes' files, and this process's live numbers
+        states = [(pid, own, own)]
+        if directory:
+            interval = self.app.config['METRICS_FLUSH_INTERVAL']
+            stale = time.time() - 3 * interval
+            for name in os.listdir(directory):
+                if not name.endswith('.json') or name[:-5] == pid:
+                    continue
+                path = os.path.join(directory, name)
+                try:
+                    with open(path) as f:
+                        state = json.load(f)
+                    fresh = os.path.getmtime(path) >= stale
+                except (IOError, OSError, ValueError):
+                    continue
+                # A dead process's counters still count, its gauges don't
+                states.append((name[:-5], state,
+                               state.get('_gauges', {}) if fresh else {}))
+
+        lines = []
+        for family in self.families:
+            lines.append('# HELP %s %s' % (family.name, family.help))
+            lines.append('# TYPE %s %s' % (family.name, family.kind))
+            if isinstance(family, Gauge):
+                lines.extend(_render_gauge(family, states, bool(directory)))
+            elif isinstance(family, Histogram):
+                lines.extend(_render_histogram(family, states))
+            else:
+                lines.extend(_render_counter(family, states))
+        return '\n'.join(lines) + '\n'
+
+
+def _render_counter(family, states):
+    totals = {}
+    for pid, state, gauges in states:
+        for labels, value in state.get(family.name, []):
+            labels = tuple(labels)
+            totals[labels] = totals.get(labels, 0) + value
+    return ['%s%s %s' % (family.name, _labels(family.labels, key),
+                         _number(total))
+            for key, total in sorted(totals.items())]
+
+
+def _render_histogram(family, states):
+    totals = {}
+    for pid, state, gauges in states:
+        for labels, (counts, total) in state.get(family.name, []):
+            labels = tuple(labels)
+            merged = totals.setdefault(labels, [[0] * len(counts), 0])
+            merged[0] = [a + b for a, b in zip(merged[0], counts)]
+            merged[1] += total
+
+    lines = []
+    for labels, (counts, total) in sorted(totals.items()):
+        cumulative = 0
+        for bound, count in zip(family.buckets, counts):
+            cumulative += count
+            lines.append('%s_bucket%s %d' % (
+                family.name,
+                _labels(family.labels + ('le',), labels + (_number(bound),)),
+                cumulative))
+        lines.append('%s_sum%s %s' % (family.name,
+                                      _labels(family.labels, labels),
+                                      _number(total)))
+        lines.append('%s_count%s %d' % (family.name,
+                                        _labels(family.labels, labels),
+                                        cumulative))
+    return lines
+
+
+def _render_gauge(family, states, multiprocess):
+    if not family.per_process or not multiprocess:
+        own = states[0][1]
+        return ['%s%s %s' % (family.name, _labels(family.labels, key),
+                             _number(sample))
+                for key, sample in sorted(own.get(family.name, []))]
+
+    lines = []
+    for pid, state, gauges in states:
+        for labels, value in sorted(gauges.get(family.name, [])):
+            lines.append('%s%s %s' % (
+                family.name,
+                _labels(family.labels + ('pid',), tuple(labels) + (pid,)),
+                _number(value)))
+    return lines
+
+
+def _labels(names, values):
+    """Return {name="value",...}, escaped, or nothing without labels."""
+    if not names:
+        return ''
+    return '{%s}' % ','.join(
+        '%s="%s"' % (name, unicode(value).replace('\\', r'\\')
+                                         .replace('"', r'\"')
+                                         .replace('\n', r'\n'))
+        for name, value in zip(names, values))
+
+
+def _number(value):
+    """Return a number the way Prometheus writes it."""
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float):
+        return repr(value)
+    return str(value)
+
+
+metrics = Metrics()
+
+REQUESTS = metrics.add(Counter(
+    'giftr_http_requests_total', 'Requests handled.',
+    ('endpoint', 'method', 'status')))
+REQUEST_DURATION = metrics.add(Histogram(
+    'giftr_http_request_duration_seconds',
+    'Time to handle a request, until the view returns.', ('endpoint',)))
+OBJECTS_LOADED = metrics.add(Histogram(
+    'giftr_db_session_objects_loaded',
+    'Objects added to the database session\'s identity map by queries, '
+    'per request.', ('endpoint',), buckets=SIZE_BUCKETS))
+POOL_CHECKOUTS = metrics.add(Counter(
+    'giftr_db_pool_checkouts_total', 'Connections taken from the pool.'))
+POOL_WAIT = metrics.add(Histogram(
+    'giftr_db_pool_wait_seconds',
+    'Time to get a connection from the pool, opening it if needed.',
+    buckets=WAIT_BUCKETS))
+CATEGORY_CACHE = metrics.add(Counter(
+    'giftr_category_cache_lookups_total',
+    'Category registry reads: hit (in memory), check (version read '
+    'from the database) or reload (categories read again).',
+    ('result',)))
+MAILS_ENQUEUED = metrics.add(Counter(
+    'giftr_mail_enqueued_total', 'Mails added to the outbox by views.'))
+MAILS_SENT = metrics.add(Counter(
+    'giftr_mail_sent_total', 'Mails sent.'))
+MAIL_FAILURES = metrics.add(Counter(
+    'giftr_mail_failures_total',
+    'Failed attempts to send a mail, final if given up on.', ('final',)))
+
+
+# Request hooks
+
+def _start_timer():
+    g._metrics_start = timeit.default_timer()
+    g._metrics_loaded = 0
+
+
+def _count_request(response):
+    _count(response.status_code)
+    return response
+
+
+def _count_failed_request(exception=None):
+    # The view raised: after_request was skipped
+    if exception is not None:
+        _count(500)
+
+
+def _count(status):
+    """Count the current request, once."""
+    start = getattr(g, '_metrics_start', None)
+    if start is None:
+        return
+    g._metrics_start = None
+    endpoint = request.endpoint or 'unmatched'
+    REQUEST_DURATION.observe(timeit.default_timer() - start, (endpoint,))
+    REQUESTS.inc((endpoint, request.method, str(status)))
+    OBJECTS_LOADED.observe(g._metrics_loaded, (endpoint,))
+    metrics.maybe_flush()
+
+
+# Gauges and events
+
+def _count_checkout(dbapi_connection, connection_record, connection_proxy):
+    POOL_CHECKOUTS.inc()
+
+
+def _count_load(target, context):
+    if has_request_context() and hasattr(g, '_metrics_loaded'):
+        g._metrics_loaded += 1
+
+
+def _pool_gauge(engine, read):
+    """Return a gauge's function reading the engine's current pool."""
+    # engine.dispose() replaces the pool: look it up every time
+    return lambda: {(): read(engine.pool)}
+
+
+def _outbox_sizes():
+    """Return the number of mails in the outbox, by status."""
+    from application.database import db_session
+
+    session = db_session.session_factory()
+    try:
+        rows = session.query(OutboundMail.status,
+                             func.count(OutboundMail.id)) \
+                      .group_by(OutboundMail.status) \
+                      .all()
+    finally:
+        session.close()
+    return dict(((status,), count) for status, count in rows)
@@ -0,0 +1,276 @@
+"""Bring an existing database up to date with the models."""
+
+from datetime import datetime, timedelta
+
+from sqlalchemy import DateTime, and_, bindparam, func, inspect, select
+from sqlalchemy.schema import CreateColumn
+
+from application.models import (Base,
+                    User,
+                    Category,
+                    Gift,
+                    Claim,
+                    OutboundMail,
+                    gift_archive,
+                    claim_archive)
+from application.models.gift import GIFT_LIFETIME
+from application.models.table_version import bump_version, get_version
+from application.search import search_index
+
+# The tables whose timestamps backfill_timestamps fixes
+BACKFILLED_TABLES = [User.__table__,
+                     Category.__table__,
+                     Gift.__table__,
+                     Claim.__table__,
+                     OutboundMail.__table__,
+                     gift_archive,
+                     claim_archive]
+
+# The table_version row recording that backfill_timestamps was applied
+BACKFILL_MARKER = 'backfill_timestamps'
+
+
+def create_schema(engine):
+    """Create the tables and the search index, those that don't exist.
+
+    Safe to run several times. Return True if the search index was
+    created (and filled with the gifts already in the database).
+
+    Argument:
+    engine (object): an engine bound to the database to set up.
+    """
+    Base.metadata.create_all(engine)
+    return search_index.create_index(engine)
+
+
+def upgrade(engine):
+    """Bring the database's schema up to date, return the changes.
+
+    Creates the missing tables, columns and indexes, rebuilds the tables
+    whose primary key changed (keeping their rows), and drops the
+    indexes of the models' tables that no model declares anymore (left
+    by an older version, they slow down every write). Safe to run
+    several times: what is already up to date is left untouched.
+    Return a list of (action, kind, name) tuples, e.g.
+    ('created', 'column', 'gift.claim_count') or
+    ('dropped', 'index', 'ix_gift_expires_at').
+
+    A unique index is left out, as ('skipped', 'index', name), while
+    rows share the values it would make unique: duplicate_keys lists
+    them. Fix them, then upgrade again.
+
+    Argument:
+    engine (object): an engine bound to the database to upgrade.
+    """
+    # New tables come with their columns and indexes
+    Base.metadata.create_all(engine)
+
+    changes = []
+    inspector = inspect(engine)
+    for table in Base.metadata.sorted_tables:
+        # E.g. the archive tables, keyed by the gift or claim id at first
+        primary_key = inspector.get_pk_constraint(table.name)
+        if primary_key['constrained_columns'] != \
+                [column.name for column in table.primary_key]:
+            rebuild_table(engine, table)
+            changes.append(('rebuilt', 'table', table.name))
+
+    # Fresh: the inspector caches what it read
+    inspector = inspect(engine)
+    for table in Base.metadata.sorted_tables:
+        existing = set(column['name']
+                       for column in inspector.get_columns(table.name))
+        for column in table.columns:
+            if column.name not in existing:
+                add_column(engine, table, column)
+                changes.append(('created', 'column',
+                                '%s.%s' % (table.name, column.name)))
+
+        existing = inspector.get_indexes(table.name)
+        existing_names = set(index['name'] for index in existing)
+        for index in table.indexes:
+            if index.name in existing_names:
+                continue
+            # Creating it would fail on them, and stop the upgrade there
+            if index.unique and duplicate_keys(engine, index):
+                changes.append(('skipped', 'index', index.name))
+                continue
+            index.create(engine)
+            changes.append(('created', 'index', index.name))
+
+        declared = set(index.name for index in table.indexes)
+        for index in existing:
+            # Not those backing a unique constraint (PostgreSQL)
+            if index['name'] in declared or \
+                    index.get('duplicates_constraint'):
+                continue
+            drop_index(engine, index['name'])
+            changes.append(('dropped', 'index', index['name']))
+
+    if search_index.create_index(engine):
+        changes.append(('created', 'index', 'gift_search'))
+    return changes
+
+
+def duplicate_keys(engine, index):
+    """Return the primary keys of the rows a unique index would reject.
+
+    Those sharing the values of the index's columns with another row, in
+    order. Rows with a NULL in these columns don't count: the index
+    allows them.
+
+    Arguments:
+    engine (object): an engine bound to the database.
+    index (object): the index of the models, on an existing table.
+    """
+    table = index.table
+    key = list(table.primary_key)[0]
+    columns = list(index.columns)
+    duplicated = select(columns) \
+        .where(and_(*[column.isnot(None) for column in columns])) \
+        .group_by(*columns) \
+        .having(func.count() > 1) \
+        .alias()
+    rows = engine.execute(
+        select([key])
+        .select_from(table.join(duplicated, and_(*[
+            column == duplicated.c[column.name] for column in columns])))
+        .order_by(key))
+    return [row[0] for row in rows]
+
+
+def add_column(engine, table, column):
+    """Add a column of the models to an existing table.
+
+    The column needs a server default if it is not nullable.
+
+    Arguments:
+    engine (object): an engine bound to the database.
+    table (object): the column's table.
+    column (object): the column to add.
+    """
+    preparer = engine.dialect.identifier_preparer
+    definition = CreateColumn(column).compile(dialect=engine.dialect)
+    engine.execute('ALTER TABLE %s ADD COLUMN %s'
+                   % (preparer.format_table(table), definition))
+
+
+def rebuild_table(engine, table):
+    """Create a table again from the models, keeping its rows.
+
+    For what ALTER TABLE can't change, e.g. the primary key. The rows
+    are copied aside and back, with the columns both versions have.
+
+    Arguments:
+    engine (object): an engine bound to the database.
+    table (object): the table of the models.
+    """
+    preparer = engine.dialect.identifier_preparer
+    name = preparer.format_table(table)
+    copy = preparer.quote(table.name + '_rebuild')
+    existing = set(column['name']
+                   for column in inspect(engine).get_columns(table.name))
+    columns = ', '.join(preparer.quote(column.name)
+                        for column in table.columns
+                        if column.name in existing)
+
+    with engine.begin() as connection:
+        connection.execute('CREATE TABLE %s AS SELECT * FROM %s'
+                           % (copy, name))
+        # Its indexes go with it
+        connection.execute('DROP TABLE %s' % name)
+        table.create(connection)
+        connection.execute('INSERT INTO %s (%s) SELECT %s FROM %s'
+                           % (name, columns, columns, copy))
+        connection.execute('DROP TABLE %s' % copy)
+
+
+def drop_index(engine, name):
+    """Drop an index the models don't know about.
+
+    Arguments:
+    engine (object): an engine bound to the database.
+    name (str): the name of the index.
+    """
+    preparer = engine.dialect.identifier_preparer
+    engine.execute('DROP INDEX %s' % preparer.quote(name))
+
+
+def backfill_timestamps(session, utc_offset=0, batch_size=1000):
+    """Bring the timestamps of existing rows in line with the models.
+
+    Timestamps are in UTC. Rows written before that were in the server's
+    local time: utc_offset (in hours, e.g. 2 for UTC+2) moves them back
+    to UTC. Missing creation dates are set to now, missing expiry dates to
+    the creation date plus the gift lifetime. Return the number of rows
+    changed, per table.
+
+    Applied once: shifting the rows again would move them away from UTC.
+    The run is recorded in table_version (BACKFILL_MARKER), and a second
+    one raises RuntimeError, after which the caller rolls back.
+
+    Rows are read and written batch_size at a time, in the session's
+    transaction: the caller commits.
+
+    Arguments:
+    session (object): a database session.
+    utc_offset (float): the hours between the old local times and UTC.
+    batch_size (int): the number of rows to read at a time.
+    """
+    # Recorded first: a concurrent run waits on this write, then sees it
+    bump_version(session, BACKFILL_MARKER)
+    if get_version(session, BACKFILL_MARKER) > 1:
+        raise RuntimeError('The timestamps were already backfilled.')
+
+    shift = timedelta(hours=utc_offset)
+    now = datetime.utcnow()
+
+    changed = {}
+    for table in BACKFILLED_TABLES:
+        # id, or archive_id for the archive tables
+        key = list(table.primary_key)[0]
+        columns = [column for column in table.columns
+                   if isinstance(column.type, DateTime)]
+        update = table.update() \
+                      .where(key == bindparam('_id')) \
+                      .values(dict((column, bindparam('_' + column.name))
+                                   for column in columns))
+
+        count = 0
+        last_id = 0
+        while True:
+            rows = session.execute(select([key] + columns)
+                                   .where(key > last_id)
+                                   .order_by(key)
+                                   .limit(batch_size)).fetchall()
+            if not rows:
+                break
+            last_id = rows[-1][0]
+
+            params = []
+            for row in rows:
+                values = dict((column.name, row[column.name])
+                              for column in columns)
+                fixed = dict((name, value - shift if value else value)
+                             for name, value in values.items())
+                if 'created_at' in fixed and not fixed['created_at']:
+                    fixed['created_at'] = now
+                if 'expires_at' in fixed and not fixed['expires_at']:
+                    fixed['expires_at'] = fixed['created_at'] + GIFT_LIFETIME
+                if fixed != values:
+                    fixed = dict(('_' + name, value)
+                                 for name, value in fixed.items())
+                    fixed['_id'] = row[0]
+                    params.append(fixed)
+
+            if params:
+                session.execute(update, params)
+                count += len(params)
+
+        if count:
+            # Raw statements: tell the caches (see models.table_version)
+            bump_version(session, table.name)
+        changed[table.name] = count
+
+    return changed
+
@@ -5,5 +5,9 @@ from user import User
 from category import Category
 from gift import Gift
 from claim import Claim
+from archive import gift_archive, claim_archive
+from table_version import TableVersion
+from outbound_mail import OutboundMail
 
-__all__ = ['User', 'Gift', 'Category', 'Claim']
\ No newline at end of file
+__all__ = ['User', 'Gift', 'Category', 'Claim', 'TableVersion',
+           'OutboundMail', 'gift_archive', 'claim_archive']
\ No newline at end of file
@@ -0,0 +1,41 @@
+from sqlalchemy import (Table,
+                        Column,
+                        Integer,
+                        DateTime,
+                        Index)
+
+from application.models import (Base,
+                    Gift,
+                    Claim)
+
+
+def archive_table(name, table, *indexes):
+    """Return a cold copy of a table: same columns, no constraints.
+
+    The copy has a primary key of its own, archive_id, and an
+    archived_at column on top of the table's columns. The rows keep
+    their original id, as a plain indexed column: the database may hand
+    out the id of an archived row again, and the copy then holds both.
+
+    Arguments:
+    name (str): the name of the copy.
+    table (object): the table to copy.
+    indexes (list): the names of the columns to index, one index each.
+    """
+    columns = [Column('archive_id', Integer, primary_key=True)]
+    columns.extend(Column(column.name, column.type)
+                   for column in table.columns)
+    columns.append(Column('archived_at', DateTime))
+    archive = Table(name, Base.metadata, *columns)
+    for column_name in ('id',) + indexes:
+        Index('ix_%s_%s' % (name, column_name), archive.c[column_name])
+    return archive
+
+
+# Long dead gifts and their claims, moved out of the hot tables by the
+# sweeper (see application.sweeper). Indexed by their original id, and
+# for deleting a user's data.
+gift_archive = archive_table('gift_archive', Gift.__table__, 'creator_id')
+
+claim_archive = archive_table('claim_archive', Claim.__table__,
+                              'gift_id', 'creator_id')
@@ -1,8 +1,8 @@
 from sqlalchemy import Column, ForeignKey, Integer, String, DateTime
 from sqlalchemy.orm import relationship
-from datetime import datetime
 
 from application.models import Base
+from application.models.functions import utcnow
 
 class Category(Base):
     """Database table for a gift category."""
@@ -26,11 +26,12 @@ class Category(Base):
 
     created_at = Column(
                     DateTime,
-                    default=datetime.now())
+                    default=utcnow(),
+                    server_default=utcnow())
 
     updated_at = Column(
                     DateTime,
-                    onupdate=datetime.now())
+                    onupdate=utcnow())
 
     @property
     def serialize(self):
@@ -4,12 +4,12 @@ from sqlalchemy import (Column,
                         String,
                         DateTime,
                         Boolean)
-from sqlalchemy.orm import relationship
-from datetime import datetime
+from sqlalchemy.orm import relationship, backref
 
 from application.models import (Base,
                     User,
                     Gift)
+from application.models.functions import utcnow
 
 class Claim(Base):
     """Database table for a claim on a gift."""
@@ -27,11 +27,12 @@ class Claim(Base):
 
     created_at = Column(
                     DateTime,
-                    default=datetime.now())
+                    default=utcnow(),
+                    server_default=utcnow())
 
     updated_at = Column(
                     DateTime,
-                    onupdate=datetime.now())
+                    onupdate=utcnow())
 
     accepted = Column(
                 Boolean,
@@ -39,15 +40,25 @@ class Claim(Base):
 
     gift_id = Column(
                     Integer,
-                    ForeignKey('gift.id'))
+                    ForeignKey('gift.id', ondelete='CASCADE'),
+                    index=True)
 
-    gift = relationship(Gift)
+    # A claim is never shown without its gift and creator:
+    # always load them in the same query.
+    # A gift's claims go with it (see gifts.delete_post for the
+    # set-based delete, passive_deletes avoids loading them first).
+    gift = relationship(Gift,
+                        lazy='joined',
+                        backref=backref('claims',
+                                        cascade='all, delete-orphan',
+                                        passive_deletes=True))
 
     creator_id = Column(
                     Integer,
-                    ForeignKey('user.id'))
+                    ForeignKey('user.id'),
+                    index=True)
 
-    creator = relationship(User)
+    creator = relationship(User, lazy='joined')
 
     @property
     def serialize(self):
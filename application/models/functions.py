@@ -0,0 +1,31 @@
+from sqlalchemy import DateTime
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.expression import FunctionElement
+
+
+class utcnow(FunctionElement):
+    """The database's current time, in UTC, as a timestamp column default.
+
+    SQLite's CURRENT_TIMESTAMP has no fractional seconds: stored next to
+    the microseconds SQLAlchemy writes, the dates would not compare as
+    dates anymore ('... 10:00:00' < '... 10:00:00.000000'). On SQLite,
+    utcnow writes SQLAlchemy's format instead.
+    """
+
+    type = DateTime()
+
+
+@compiles(utcnow)
+def compile_utcnow(element, compiler, **kw):
+    return 'CURRENT_TIMESTAMP'
+
+
+@compiles(utcnow, 'sqlite')
+def compile_utcnow_sqlite(element, compiler, **kw):
+    # %f is seconds with milliseconds: pad to microseconds
+    return "(strftime('%Y-%m-%d %H:%M:%f000', 'now'))"
+
+
+@compiles(utcnow, 'postgresql')
+def compile_utcnow_postgresql(element, compiler, **kw):
+    return "(now() AT TIME ZONE 'utc')"
@@ -3,19 +3,43 @@ from sqlalchemy import (Column,
                         Integer,
                         String,
                         DateTime,
-                        Boolean)
-from sqlalchemy.orm import relationship
+                        Boolean,
+                        Index)
+from sqlalchemy.orm import relationship, backref
 from datetime import datetime, timedelta
 
 from application.models import (Base,
                     User,
                     Category)
+from application.models.functions import utcnow
+
+# How long a gift stays in the feed, from its creation or extension
+GIFT_LIFETIME = timedelta(days=5)
+
+
+def default_expires_at():
+    """Return the expiry date of a gift created now, in UTC."""
+    return datetime.utcnow() + GIFT_LIFETIME
+
 
 class Gift(Base):
     """Database table for a gift."""
 
     # TABLE #
     __tablename__ = 'gift'
+    __table_args__ = (
+        # Gift feed (live gifts only), all categories or one category,
+        # by expiry date. Also used by the sweeper to find the gifts to
+        # expire or archive.
+        Index('ix_gift_state_expires_at', 'state', 'expires_at'),
+        Index('ix_gift_state_category_id_expires_at',
+              'state', 'category_id', 'expires_at'),
+        # Gift API, all categories or one category, by creation date
+        Index('ix_gift_created_at', 'created_at'),
+        Index('ix_gift_category_id_created_at', 'category_id', 'created_at'),
+        # Gifts of a user, by creation date
+        Index('ix_gift_creator_id_created_at', 'creator_id', 'created_at'),
+    )
     # MAPPER#
     id = Column(
             Integer,
@@ -35,29 +59,63 @@ class Gift(Base):
             Boolean,
             default=True)
 
+    # Timestamps are in UTC, created_at and updated_at from the database's
+    # clock. The default (on top of the server default) also covers the
+    # databases created before the server default existed.
     created_at = Column(
                     DateTime,
-                    default=datetime.now())
+                    default=utcnow(),
+                    server_default=utcnow())
 
     updated_at = Column(
                     DateTime,
-                    onupdate=datetime.now())
+                    onupdate=utcnow())
 
     expires_at = Column(
                     DateTime,
-                    default=datetime.now() + timedelta(days=5))
+                    default=default_expires_at)
+
+    # 'active': listed in the feed (open or promised).
+    # 'expired': not listed anymore, can be brought back (gifts.extend).
+    # 'closed': was promised and is past its pick up date.
+    # Set by the sweeper (application.sweeper) as expires_at passes.
+    state = Column(
+                String(10),
+                nullable=False,
+                default='active',
+                server_default='active')
 
     creator_id = Column(
                     Integer,
-                    ForeignKey('user.id'))
+                    ForeignKey('user.id', ondelete='CASCADE'))
+
+    # Loaded on demand: use joinedload(Gift.creator) in listings.
+    # A user's gifts go with them (see users.delete_post for the
+    # set-based delete, passive_deletes avoids loading them first).
+    creator = relationship(User,
+                           backref=backref('gifts',
+                                           cascade='all, delete-orphan',
+                                           passive_deletes=True))
+
+    # Copies of what the claim table says, so that listings don't have to
+    # query it: kept up to date by the claims views (see
+    # application.counters), rebuilt with `flask rebuild-claim-counters`.
+    claim_count = Column(
+                    Integer,
+                    nullable=False,
+                    default=0,
+                    server_default='0')
 
-    creator = relationship(User)
+    # No foreign key: claim already references gift
+    accepted_claim_id = Column(
+                            Integer)
 
     category_id = Column(
                     Integer,
                     ForeignKey('category.id'))
 
-    category = relationship(Category)
+    # Shown with every gift, and small: always loaded in the same query
+    category = relationship(Category, lazy='joined')
 
     @property
     def serialize(self):
@@ -70,5 +128,7 @@ class Gift(Base):
             'created_at': self.created_at,
             'updated_at': self.updated_at,
             'creator_id': self.creator_id,
-            'category_id': self.category_id
+            'category_id': self.category_id,
+            'claim_count': self.claim_count,
+            'accepted_claim_id': self.accepted_claim_id
         }
\ No newline at end of file
@@ -0,0 +1,65 @@
+from sqlalchemy import (Column,
+                        Integer,
+                        String,
+                        Text,
+                        DateTime,
+                        Index)
+from datetime import datetime
+
+from application.models import Base
+
+class OutboundMail(Base):
+    """Database table for an email waiting to be sent (the outbox)."""
+
+    # TABLE #
+    __tablename__ = 'outbound_mail'
+    __table_args__ = (
+        # Sender picking the next due mails
+        Index('ix_outbound_mail_status_next_attempt_at',
+              'status', 'next_attempt_at'),
+    )
+    # MAPPER #
+    id = Column(
+            Integer,
+            primary_key=True)
+
+    subject = Column(
+                String(200),
+                nullable=False)
+
+    sender = Column(
+                String(120),
+                nullable=False)
+
+    # Comma separated email addresses
+    recipients = Column(
+                    String(500),
+                    nullable=False)
+
+    body = Column(
+            Text)
+
+    # pending, sending, sent or failed
+    status = Column(
+                String(10),
+                nullable=False,
+                default='pending')
+
+    attempts = Column(
+                Integer,
+                nullable=False,
+                default=0)
+
+    next_attempt_at = Column(
+                        DateTime,
+                        default=datetime.utcnow)
+
+    last_error = Column(
+                    String(500))
+
+    created_at = Column(
+                    DateTime,
+                    default=datetime.utcnow)
+
+    sent_at = Column(
+                DateTime)
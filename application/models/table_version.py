@@ -0,0 +1,130 @@
+from sqlalchemy import Column, Integer, String, DateTime, event
+from sqlalchemy.orm import Session
+from datetime import datetime
+
+from application.models import Base
+
+class TableVersion(Base):
+    """Database table counting the writes to every other table.
+
+    Each transaction bumps the version of the tables it wrote, once, when
+    it commits, so that any process can tell if its cached copy of a
+    table is stale with a single primary key lookup.
+    """
+
+    # TABLE #
+    __tablename__ = 'table_version'
+    # MAPPER #
+    name = Column(
+            String(80),
+            primary_key=True)
+
+    version = Column(
+                Integer,
+                nullable=False,
+                default=0)
+
+    updated_at = Column(
+                    DateTime)
+
+
+def get_version(session, name):
+    """Return the current version of a table (0 if never written).
+
+    Arguments:
+    session (object): a database session.
+    name (str): the name of the table.
+    """
+    table = TableVersion.__table__
+    query = table.select().with_only_columns([table.c.version]) \
+                          .where(table.c.name == name)
+    return session.execute(query).scalar() or 0
+
+
+def get_versions(session, names):
+    """Return a {name: version} dict of several tables, in one query.
+
+    Arguments:
+    session (object): a database session.
+    names (list): the names of the tables.
+    """
+    table = TableVersion.__table__
+    query = table.select().with_only_columns([table.c.name,
+                                              table.c.version]) \
+                          .where(table.c.name.in_(names))
+    versions = dict((name, 0) for name in names)
+    versions.update(session.execute(query).fetchall())
+    return versions
+
+
+def bump_version(session, name):
+    """Increment the version of a table in the session's transaction.
+
+    Arguments:
+    session (object): a database session.
+    name (str): the name of the table.
+    """
+    table = TableVersion.__table__
+    result = session.execute(table.update()
+                                  .where(table.c.name == name)
+                                  .values(version=table.c.version + 1,
+                                          updated_at=datetime.utcnow()))
+    if not result.rowcount:
+        session.execute(table.insert()
+                             .values(name=name,
+                                     version=1,
+                                     updated_at=datetime.utcnow()))
+
+
+def written_tables(session):
+    """Return the set of tables the session's transaction wrote so far.
+
+    Filled at flush time, bumped and emptied when the transaction
+    commits.
+
+    Argument:
+    session (object): a database session.
+    """
+    return session.info.setdefault('written_tables', set())
+
+
+@event.listens_for(Session, 'before_flush')
+def collect_flushed_tables(session, flush_context, instances):
+    """Note the tables a flush writes, for bump_written_tables."""
+    names = written_tables(session)
+    for obj in session.new | session.deleted:
+        names.add(obj.__table__.name)
+    for obj in session.dirty:
+        if session.is_modified(obj, include_collections=False):
+            names.add(obj.__table__.name)
+    names.discard(TableVersion.__tablename__)
+
+
+@event.listens_for(Session, 'after_bulk_update')
+@event.listens_for(Session, 'after_bulk_delete')
+def collect_bulk_table(context):
+    """Note the table written by query.update/delete()."""
+    written_tables(context.session).add(context.primary_table.name)
+
+
+@event.listens_for(Session, 'before_commit')
+def bump_written_tables(session):
+    """Bump the version of every table the transaction wrote, once.
+
+    At commit rather than at each flush: a table_version row stays
+    locked from its update to the commit, and the busy tables' rows are
+    shared by every writer.
+    """
+    # The commit's own flush comes after this hook
+    session.flush()
+    names = written_tables(session)
+    for name in sorted(names):
+        bump_version(session, name)
+    names.clear()
+
+
+@event.listens_for(Session, 'after_transaction_end')
+def forget_written_tables(session, transaction):
+    """Forget the tables of a transaction rolled back."""
+    if transaction.parent is None:
+        written_tables(session).clear()
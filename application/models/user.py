@@ -1,8 +1,8 @@
 from sqlalchemy import Column, ForeignKey, Integer, String, DateTime
 from sqlalchemy.orm import relationship
-from datetime import datetime
 
 from application.models import Base
+from application.models.functions import utcnow
 
 class User(Base):
     """Database table for a user."""
@@ -20,7 +20,8 @@ class User(Base):
 
     email = Column(
                 String(80),
-                nullable=False)
+                nullable=False,
+                index=True)
 
     address = Column(
                 String(200))
@@ -29,15 +30,18 @@ class User(Base):
                 String(80))
 
     oauth_id = Column(
-                String(80))
+                String(80),
+                unique=True,
+                index=True)
 
     created_at = Column(
                     DateTime,
-                    default=datetime.now())
+                    default=utcnow(),
+                    server_default=utcnow())
 
     updated_at = Column(
                     DateTime,
-                    onupdate=datetime.now())
+                    onupdate=utcnow())
 
     @property
     def serialize(self):
@@ -0,0 +1,247 @@
+"""Talk to Google and Facebook for the login and logout routes.
+
+The client secrets are read once, when the app starts. The calls go
+through a pooled requests session (kept-alive connections, one TLS
+handshake per provider and connection rather than per call) with
+timeouts, and the code exchange through a per-thread httplib2 client,
+which oauth2client needs. Google's verdict on an access token
+(tokeninfo) is cached for a few seconds.
+
+The providers' URLs come from the config, so that the app can be
+pointed at a local stub of them.
+"""
+
+import json
+import logging
+import threading
+import time
+
+import requests
+
+
+class OAuthClient(object):
+    """Shared HTTP client and secrets of the OAuth providers."""
+
+    def __init__(self):
+        self.app = None
+        self.google_secrets = None
+        self.facebook_secrets = None
+        self.session = None
+        self._local = threading.local()
+        self._tokeninfo = {}
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        """Read the client secrets and set up the HTTP client.
+
+        A missing secrets file only disables its provider.
+
+        Argument:
+        app (object): the Flask app.
+        """
+        app.config.setdefault('GOOGLE_CLIENT_SECRETS',
+                              'google_client_secrets.json')
+        app.config.setdefault('FACEBOOK_CLIENT_SECRETS',
+                              'fb_client_secrets.json')
+        app.config.setdefault('GOOGLE_TOKEN_URL', None)
+        app.config.setdefault('GOOGLE_TOKENINFO_URL',
+                              'https://www.googleapis.com/oauth2/v1/tokeninfo')
+        app.config.setdefault('GOOGLE_USERINFO_URL',
+                              'https://www.googleapis.com/oauth2/v1/userinfo')
+        app.config.setdefault('GOOGLE_REVOKE_URL',
+                              'https://accounts.google.com/o/oauth2/revoke')
+        app.config.setdefault('FACEBOOK_GRAPH_URL',
+                              'https://graph.facebook.com')
+        app.config.setdefault('OAUTH_TIMEOUT', 10)
+        app.config.setdefault('OAUTH_POOL_SIZE', 10)
+        app.config.setdefault('OAUTH_TOKENINFO_TTL', 60)
+        self.app = app
+
+        # Read once, not on every login
+        config = app.config
+        self.google_secrets = _load_secrets(config['GOOGLE_CLIENT_SECRETS'])
+        self.facebook_secrets = _load_secrets(
+            config['FACEBOOK_CLIENT_SECRETS'])
+
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(
+            pool_connections=2,
+            pool_maxsize=app.config['OAUTH_POOL_SIZE'])
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self._local = threading.local()
+        with self._lock:
+            self._tokeninfo = {}
+
+    @property
+    def google_client_id(self):
+        """This app's Google client id, None if Google isn't set up."""
+        if self.google_secrets is None:
+            return None
+        return self.google_secrets['web']['client_id']
+
+    def request(self, method, url, **kwargs):
+        """Send a request through the pooled session, with the timeout.
+
+        Raise requests.RequestException if the provider can't be reached.
+
+        Arguments:
+        method (str): e.g. 'GET'.
+        url (str): the URL to request.
+        kwargs (dict): passed on to requests.
+        """
+        kwargs.setdefault('timeout', self.app.config['OAUTH_TIMEOUT'])
+        return self.session.request(method, url, **kwargs)
+
+    # GOOGLE
+
+    def google_exchange(self, code):
+        """Upgrade a one-time authorization code into credentials.
+
+        Raise oauth2client's FlowExchangeError if Google refuses it.
+
+        Argument:
+        code (str): the code sent by the login page.
+        """
+        # Slow to import: only on the first Google login
+        from oauth2client.client import OAuth2WebServerFlow
+
+        web = self.google_secrets['web']
+        flow = OAuth2WebServerFlow(
+            web['client_id'],
+            client_secret=web['client_secret'],
+            scope='',
+            redirect_uri='postmessage',
+            auth_uri=web['auth_uri'],
+            token_uri=self.app.config['GOOGLE_TOKEN_URL'] or web['token_uri'])
+        return flow.step2_exchange(code, http=self._http())
+
+    def google_tokeninfo(self, access_token):
+        """Return Google's verdict on an access token, as a dict.
+
+        Successful verdicts are cached for OAUTH_TOKENINFO_TTL seconds,
+        at most until the token expires.
+
+        Argument:
+        access_token (str): the token to verify.
+        """
+        now = time.time()
+        with self._lock:
+            cached = self._tokeninfo.get(access_token)
+            if cached is not None and cached[1] > now:
+                return cached[0]
+
+        tokeninfo = self.request('GET',
+                                 self.app.config['GOOGLE_TOKENINFO_URL'],
+                                 params={'access_token': access_token}).json()
+
+        if tokeninfo.get('error') is None:
+            ttl = min(self.app.config['OAUTH_TOKENINFO_TTL'],
+                      int(tokeninfo.get('expires_in') or 0))
+            with self._lock:
+                # Forget the expired verdicts before adding one
+                self._tokeninfo = dict(
+                    (token, entry)
+                    for token, entry in self._tokeninfo.items()
+                    if entry[1] > now)
+                if ttl > 0:
+                    self._tokeninfo[access_token] = (tokeninfo, now + ttl)
+        return tokeninfo
+
+    def google_userinfo(self, access_token):
+        """Return the profile of the owner of an access token, as a dict.
+
+        Argument:
+        access_token (str): a verified access token.
+        """
+        return self.request('GET',
+                            self.app.config['GOOGLE_USERINFO_URL'],
+                            params={'access_token': access_token,
+                                    'alt': 'json'}).json()
+
+    def google_revoke(self, access_token):
+        """Revoke an access token, return True if Google did.
+
+        Argument:
+        access_token (str): the token to revoke.
+        """
+        with self._lock:
+            self._tokeninfo.pop(access_token, None)
+        headers = {'content-type': 'application/x-www-form-urlencoded'}
+        result = self.request('POST',
+                              self.app.config['GOOGLE_REVOKE_URL'],
+                              params={'token': access_token},
+                              headers=headers)
+        return result.status_code == 200
+
+    # FACEBOOK
+
+    def facebook_exchange(self, access_token):
+        """Exchange a short-lived token for a long-lived one, return it.
+
+        Argument:
+        access_token (str): the token sent by the login page.
+        """
+        web = self.facebook_secrets['web']
+        params = {'grant_type': 'fb_exchange_token',
+                  'client_id': web['app_id'],
+                  'client_secret': web['app_secret'],
+                  'fb_exchange_token': access_token}
+        result = self.request('GET',
+                              self.app.config['FACEBOOK_GRAPH_URL'] +
+                              '/oauth/access_token',
+                              params=params)
+        return result.json().get('access_token')
+
+    def facebook_me(self, access_token):
+        """Return the profile of the owner of an access token, as a dict.
+
+        Argument:
+        access_token (str): a long-lived access token.
+        """
+        params = {'access_token': access_token,
+                  'fields': 'name,id,email,picture'}
+        return self.request('GET',
+                            self.app.config['FACEBOOK_GRAPH_URL'] +
+                            '/v2.8/me',
+                            params=params).json()
+
+    def facebook_revoke(self, fb_id, access_token):
+        """Revoke the app's permissions, return True if Facebook did.
+
+        Arguments:
+        fb_id (str): the user's Facebook id.
+        access_token (str): the user's access token.
+        """
+        headers = {'content-type': 'application/x-www-form-urlencoded'}
+        result = self.request('DELETE',
+                              '%s/%s/permissions'
+                              % (self.app.config['FACEBOOK_GRAPH_URL'],
+                                 fb_id),
+                              params={'access_token': access_token},
+                              headers=headers)
+        return result.status_code == 200
+
+    def _http(self):
+        """Return this thread's httplib2 client (it isn't thread-safe)."""
+        import httplib2
+
+        http = getattr(self._local, 'http', None)
+        if http is None:
+            http = httplib2.Http(timeout=self.app.config['OAUTH_TIMEOUT'])
+            self._local.http = http
+        return http
+
+
+def _load_secrets(file_name):
+    """Return the content of a client secrets file, None if missing."""
+    try:
+        with open(file_name, 'r') as f:
+            return json.load(f)
+    except IOError:
+        logging.getLogger(__name__).warning(
+            'No %s: logging in with this provider is disabled.', file_name)
+        return None
+
+
+oauth_client = OAuthClient()
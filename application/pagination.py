@@ -0,0 +1,148 @@
+"""Paginate queries with opaque cursors (keyset pagination).
+
+A page is fetched with "WHERE (sort_column, id) < (last seen values)"
+instead of an OFFSET, so every page costs the same, however deep it is.
+Ranked results (search) have nothing to seek on: their cursors hide an
+offset instead.
+"""
+
+import base64
+import json
+from datetime import datetime
+
+from sqlalchemy import and_, or_
+
+CURSOR_DATETIME_FORMAT = '%Y-%m-%dT%H:%M:%S.%f'
+
+
+def encode_cursor(sort_value, id_value):
+    """Return an opaque cursor pointing after a row.
+
+    Arguments:
+    sort_value (datetime): the row's value for the sort column.
+    id_value (int): the row's id.
+    """
+    payload = json.dumps([sort_value.strftime(CURSOR_DATETIME_FORMAT),
+                          id_value])
+    return base64.urlsafe_b64encode(payload).rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Return the (sort_value, id_value) tuple hidden in a cursor.
+
+    Raise ValueError if the cursor was not made by encode_cursor.
+
+    Argument:
+    cursor (str): a cursor from encode_cursor.
+    """
+    try:
+        padding = '=' * (-len(cursor) % 4)
+        payload = base64.urlsafe_b64decode(str(cursor) + padding)
+        sort_value, id_value = json.loads(payload)
+        return (datetime.strptime(sort_value, CURSOR_DATETIME_FORMAT),
+                int(id_value))
+    except (TypeError, ValueError):
+        raise ValueError('Invalid cursor: %r' % cursor)
+
+
+def encode_offset_cursor(offset):
+    """Return an opaque cursor for results that can only be skipped.
+
+    For ranked results (e.g. search), which have no column to seek on.
+
+    Argument:
+    offset (int): the number of results to skip.
+    """
+    return base64.urlsafe_b64encode(json.dumps({'offset': offset})) \
+                 .rstrip('=')
+
+
+def decode_offset_cursor(cursor):
+    """Return the offset hidden in a cursor, 0 if there is no cursor.
+
+    Raise ValueError if the cursor was not made by encode_offset_cursor.
+
+    Argument:
+    cursor (str): a cursor from encode_offset_cursor.
+    """
+    if not cursor:
+        return 0
+    try:
+        padding = '=' * (-len(cursor) % 4)
+        payload = base64.urlsafe_b64decode(str(cursor) + padding)
+        return max(int(json.loads(payload)['offset']), 0)
+    except (TypeError, ValueError, KeyError):
+        raise ValueError('Invalid cursor: %r' % cursor)
+
+
+def search_page(search, text, limit, cursor=None, **filters):
+    """Return a page of search results' ids and the next page's cursor.
+
+    The next cursor is None on the last page.
+    Raise ValueError if the cursor is invalid.
+
+    Arguments:
+    search (function): the search function, e.g. search_index.search.
+    text (str): what the user searches.
+    limit (int): the page size.
+    cursor (str): the cursor of the page, None for the first page.
+    filters (dict): passed along to the search function.
+    """
+    offset = decode_offset_cursor(cursor)
+    # Fetch one more id to know if there is a next page
+    ids = search(text=text, limit=limit + 1, offset=offset, **filters)
+
+    next_cursor = None
+    if len(ids) > limit:
+        ids = ids[:limit]
+        next_cursor = encode_offset_cursor(offset + limit)
+
+    return ids, next_cursor
+
+
+def get_limit(args, default, maximum):
+    """Return the page size asked for in the query string, within bounds.
+
+    Arguments:
+    args (dict): the request's query string arguments.
+    default (int): the page size when none (or an invalid one) is asked.
+    maximum (int): the biggest page size allowed.
+    """
+    limit = args.get('limit', type=int)
+    if not limit or limit < 1:
+        return default
+    return min(limit, maximum)
+
+
+def paginate(query, sort_column, id_column, limit, cursor=None):
+    """Return a page of a query, newest first, and the next page's cursor.
+
+    The next cursor is None on the last page.
+    Raise ValueError if the cursor is invalid.
+
+    Arguments:
+    query (object): the query to paginate, without ORDER BY.
+    sort_column (object): the datetime column to sort on (descending).
+    id_column (object): the primary key column, to break ties.
+    limit (int): the page size.
+    cursor (str): the cursor of the page, None for the first page.
+    """
+    if cursor:
+        sort_value, id_value = decode_cursor(cursor)
+        query = query.filter(or_(sort_column < sort_value,
+                                 and_(sort_column == sort_value,
+                                      id_column < id_value)))
+
+    # Fetch one more row to know if there is a next page
+    rows = query.order_by(sort_column.desc(), id_column.desc()) \
+                .limit(limit + 1) \
+                .all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor(getattr(last, sort_column.key),
+                                    getattr(last, id_column.key))
+
+    return rows, next_cursor
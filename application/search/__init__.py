@@ -0,0 +1,70 @@
+"""Search the gifts by name and description.
+
+The backend is picked from the database: an FTS5 index on SQLite, plain
+LIKE queries on other databases. Set SEARCH_BACKEND to 'like' or 'fts5'
+to force one.
+"""
+
+from application.search.backends import (SearchBackend,
+                                         LikeBackend,
+                                         SQLiteFTSBackend)
+
+
+class SearchIndex(object):
+    """Proxy to the backend chosen for the app."""
+
+    backends = {
+        'like': LikeBackend,
+        'fts5': SQLiteFTSBackend,
+    }
+
+    def __init__(self):
+        self.backend = LikeBackend()
+
+    def init_app(self, app, engine):
+        """Pick the backend. Its index is created by `flask init-db`.
+
+        Arguments:
+        app (object): the Flask app.
+        engine (object): the app's database engine.
+        """
+        name = app.config.get('SEARCH_BACKEND')
+        if not name:
+            name = 'fts5' if engine.dialect.name == 'sqlite' else 'like'
+        self.backend = self.backends[name]()
+
+    def create_index(self, engine):
+        """Create the backend's index if missing, return True if created.
+
+        Argument:
+        engine (object): the app's database engine.
+        """
+        if not self.backend.create(engine):
+            return False
+        # A new index starts with the gifts already in the database
+        with engine.begin() as connection:
+            self.backend.rebuild(connection)
+        return True
+
+    def __getattr__(self, name):
+        return getattr(self.backend, name)
+
+
+def fetch_in_order(query, id_column, ids):
+    """Return the rows of query whose ids are in ids, in the same order.
+
+    Arguments:
+    query (object): a query on a table, e.g. on gifts.
+    id_column (object): the table's id column.
+    ids (list): the ids, e.g. the results of a search.
+    """
+    if not ids:
+        return []
+    by_id = dict((getattr(row, id_column.key), row)
+                 for row in query.filter(id_column.in_(ids)))
+    return [by_id[i] for i in ids if i in by_id]
+
+
+search_index = SearchIndex()
+
+__all__ = ['search_index', 'fetch_in_order', 'SearchBackend']
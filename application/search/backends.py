@@ -0,0 +1,170 @@
+"""Full-text search backends for gifts.
+
+A backend keeps its index in sync with the gift table (index, remove)
+and returns the ids of the gifts matching a text, best match first.
+"""
+
+import re
+from datetime import datetime
+
+from sqlalchemy import (MetaData,
+                        Table,
+                        Column,
+                        Integer,
+                        Text,
+                        or_,
+                        select,
+                        literal_column)
+
+from application.models import Gift
+
+
+class SearchBackend(object):
+    """Interface of a search backend."""
+
+    def create(self, engine):
+        """Create the index if it doesn't exist, return True if created.
+
+        Argument:
+        engine (object): the app's database engine.
+        """
+        return False
+
+    def rebuild(self, session):
+        """Index every gift again, from scratch.
+
+        Argument:
+        session (object): a database session or connection,
+                          the caller commits.
+        """
+
+    def index(self, session, gift):
+        """Add or update a gift in the index.
+
+        Arguments:
+        session (object): the session the gift was flushed with.
+        gift (object): the gift.
+        """
+
+    def remove(self, session, gift_ids):
+        """Remove gifts from the index, before they are deleted.
+
+        Arguments:
+        session (object): the session deleting the gifts.
+        gift_ids (object): a list of ids, or a query selecting them.
+        """
+
+    def search(self, session, text, limit, offset=0,
+               category_id=None, live_only=False):
+        """Return the ids of the gifts matching a text, best match first.
+
+        Arguments:
+        session (object): a database session.
+        text (str): what the user typed.
+        limit (int): the maximum number of ids to return.
+        offset (int): the number of matches to skip.
+        category_id (int): only search the gifts of that category.
+        live_only (bool): only search the gifts that haven't expired.
+        """
+        raise NotImplementedError
+
+    @staticmethod
+    def _filter(query, category_id, live_only):
+        """Apply the category and expiry filters to a query on gifts."""
+        if category_id:
+            query = query.where(Gift.category_id == category_id)
+        if live_only:
+            query = query.where(Gift.state == 'active') \
+                         .where(Gift.expires_at > datetime.utcnow())
+        return query
+
+
+class LikeBackend(SearchBackend):
+    """Search with LIKE on the gift table: no index, for any database.
+
+    Every search scans the table, only use it for small catalogues or
+    when the database has no full-text search.
+    """
+
+    def search(self, session, text, limit, offset=0,
+               category_id=None, live_only=False):
+        words = tokenize(text)
+        if not words:
+            return []
+
+        query = select([Gift.id])
+        for word in words:
+            pattern = '%' + word + '%'
+            query = query.where(or_(Gift.name.ilike(pattern),
+                                    Gift.description.ilike(pattern)))
+        query = self._filter(query, category_id, live_only)
+        query = query.order_by(Gift.created_at.desc(), Gift.id.desc()) \
+                     .limit(limit) \
+                     .offset(offset)
+        return [row[0] for row in session.execute(query)]
+
+
+class SQLiteFTSBackend(SearchBackend):
+    """Search an SQLite FTS5 index of the gifts' names and descriptions.
+
+    The index is a virtual table whose rowids are the gifts' ids, results
+    are ranked with bm25. Every word matches as a prefix, so results show
+    up while the user is still typing.
+    """
+
+    table = Table('gift_search', MetaData(),
+                  Column('rowid', Integer, primary_key=True),
+                  Column('name', Text),
+                  Column('description', Text))
+
+    def create(self, engine):
+        exists = engine.execute("SELECT 1 FROM sqlite_master "
+                                "WHERE name = 'gift_search'").scalar()
+        if exists:
+            return False
+        engine.execute("CREATE VIRTUAL TABLE gift_search USING fts5("
+                       "name, description, "
+                       "tokenize = 'unicode61 remove_diacritics 1')")
+        return True
+
+    def rebuild(self, session):
+        session.execute(self.table.delete())
+        session.execute(self.table.insert().from_select(
+            ['rowid', 'name', 'description'],
+            select([Gift.id, Gift.name, Gift.description])))
+
+    def index(self, session, gift):
+        session.execute(self.table.insert().prefix_with('OR REPLACE'),
+                        {'rowid': gift.id,
+                         'name': gift.name,
+                         'description': gift.description})
+
+    def remove(self, session, gift_ids):
+        if hasattr(gift_ids, 'subquery'):
+            gift_ids = gift_ids.subquery()
+        session.execute(self.table.delete()
+                                  .where(self.table.c.rowid.in_(gift_ids)))
+
+    def search(self, session, text, limit, offset=0,
+               category_id=None, live_only=False):
+        words = tokenize(text)
+        if not words:
+            return []
+
+        # "word"* for every word: prefix match, all words required
+        match = ' '.join('"%s"*' % word for word in words)
+        table = self.table
+        query = select([Gift.id]) \
+            .select_from(table.join(Gift.__table__,
+                                    Gift.id == table.c.rowid)) \
+            .where(literal_column('gift_search').match(match))
+        query = self._filter(query, category_id, live_only)
+        query = query.order_by(literal_column('gift_search.rank')) \
+                     .limit(limit) \
+                     .offset(offset)
+        return [row[0] for row in session.execute(query)]
+
+
+def tokenize(text):
+    """Return the words of a search text, without any query syntax."""
+    return re.findall(r'\w+', text or '', re.UNICODE)[:10]
@@ -0,0 +1,193 @@
+"""Serialize selected columns to JSON without loading ORM objects.
+
+A model's `serialize` property builds a dict from a fully loaded object,
+which is fine for one object but dominates the cost of long lists. A
+RowEncoder instead selects only the columns it needs, as plain tuples,
+and converts them with per-column converters worked out once.
+
+ujson is used if it is installed, the standard json module otherwise.
+"""
+
+import json
+
+from sqlalchemy import DateTime
+from werkzeug.http import http_date
+
+from application.models import User, Category, Gift, Claim
+
+try:
+    import ujson
+    dumps = ujson.dumps
+except ImportError:
+    dumps = json.JSONEncoder(separators=(',', ':')).encode
+
+
+def encode_datetime(value):
+    """Return a datetime in the HTTP date format, like Flask's jsonify."""
+    if value is None:
+        return None
+    return http_date(value.timetuple())
+
+
+class RowEncoder(object):
+    """Turn rows of a fixed list of columns into JSON."""
+
+    def __init__(self, columns):
+        """Work out the conversion of each column once and for all.
+
+        Argument:
+        columns (list): the model's columns to select and serialize,
+                        the JSON keys are the columns' keys.
+        """
+        self.columns = list(columns)
+        self.keys = [column.key for column in self.columns]
+        # Only the columns that need converting, as (position, function)
+        self.converters = [(i, encode_datetime)
+                           for i, column in enumerate(self.columns)
+                           if isinstance(column.type, DateTime)]
+        self._subsets = {}
+
+    def only(self, keys):
+        """Return an encoder of some of this encoder's columns.
+
+        Raise ValueError if a key is not one of this encoder's.
+
+        Argument:
+        keys (list): the keys of the columns to keep, in the order given.
+        """
+        keys = tuple(keys)
+        subset = self._subsets.get(keys)
+        if subset is None:
+            by_key = dict(zip(self.keys, self.columns))
+            unknown = [key for key in keys if key not in by_key]
+            if unknown:
+                raise ValueError('Unknown field(s): %s'
+                                 % ', '.join(unknown))
+            subset = RowEncoder([by_key[key] for key in keys])
+            self._subsets[keys] = subset
+        return subset
+
+    def query(self, session, *hidden):
+        """Return a query selecting the encoder's columns.
+
+        Arguments:
+        session (object): a database session.
+        hidden (list): more columns to select but not to serialize, for
+                       the caller's use (e.g. to paginate). They come last
+                       and the encoder ignores them.
+        """
+        columns = list(self.columns)
+        selected = set(id(column) for column in columns)
+        columns += [column for column in hidden if id(column) not in selected]
+        return session.query(*columns)
+
+    def to_dict(self, row):
+        """Return a row as a JSON-ready dict.
+
+        Argument:
+        row (tuple): a row of the encoder's columns.
+        """
+        values = list(row)
+        for i, convert in self.converters:
+            values[i] = convert(values[i])
+        return dict(zip(self.keys, values))
+
+    def object_to_dict(self, obj):
+        """Return an already loaded object as a JSON-ready dict.
+
+        Argument:
+        obj (object): an instance of the encoder's model.
+        """
+        return self.to_dict([getattr(obj, key) for key in self.keys])
+
+    def dumps(self, row):
+        """Return a row as a JSON object.
+
+        Argument:
+        row (tuple): a row of the encoder's columns.
+        """
+        return dumps(self.to_dict(row))
+
+    def stream(self, rows, name, transform=None, **extra):
+        """Yield {name: [rows...], extra...} as JSON, chunk by chunk.
+
+        Memory stays flat as long as rows is an iterator.
+
+        Arguments:
+        rows (iterable): rows of the encoder's columns.
+        name (str): the key of the list of rows.
+        transform (function): called with each row and its dict, to add
+                              keys to the dict before it is dumped.
+        extra (dict): other keys to add after the list.
+        """
+        yield '{%s:[' % dumps(name)
+        separator = ''
+        for row in rows:
+            if transform is None:
+                yield separator + self.dumps(row)
+            else:
+                serialized = self.to_dict(row)
+                transform(row, serialized)
+                yield separator + dumps(serialized)
+            separator = ','
+        yield ']'
+        for key, value in extra.items():
+            yield ',%s:%s' % (dumps(key), dumps(value))
+        yield '}'
+
+    def stream_lines(self, rows, batch_size=500):
+        """Yield rows as newline-delimited JSON, batch_size rows per chunk.
+
+        Arguments:
+        rows (iterable): rows of the encoder's columns.
+        batch_size (int): the number of rows in a chunk.
+        """
+        lines = []
+        for row in rows:
+            lines.append(self.dumps(row))
+            if len(lines) == batch_size:
+                yield '\n'.join(lines) + '\n'
+                lines = []
+        if lines:
+            yield '\n'.join(lines) + '\n'
+
+
+# Same keys as the models' serialize properties
+user_encoder = RowEncoder([User.id,
+                           User.name,
+                           User.email,
+                           User.address,
+                           User.picture,
+                           User.created_at,
+                           User.updated_at])
+
+# What anybody may see of a user (no email, no address)
+public_user_encoder = RowEncoder([User.id,
+                                  User.name,
+                                  User.picture,
+                                  User.created_at])
+
+category_encoder = RowEncoder([Category.id,
+                               Category.name,
+                               Category.description,
+                               Category.picture,
+                               Category.created_at,
+                               Category.updated_at])
+
+gift_encoder = RowEncoder([Gift.id,
+                           Gift.name,
+                           Gift.picture,
+                           Gift.description,
+                           Gift.created_at,
+                           Gift.updated_at,
+                           Gift.creator_id,
+                           Gift.category_id,
+                           Gift.claim_count,
+                           Gift.accepted_claim_id])
+
+claim_encoder = RowEncoder([Claim.id,
+                            Claim.message,
+                            Claim.created_at,
+                            Claim.updated_at,
+                            Claim.gift_id,
+                            Claim.creator_id])
@@ -0,0 +1,45 @@
+"""Get the app ready to serve from several pre-forked processes.
+
+A pre-forking server (e.g. gunicorn with preload_app) builds the app
+once, in its master process, then forks the workers. So:
+
+- warm_up does the slow first-request work before the fork, once for
+  all workers, and leaves no database connection open behind it;
+- after_fork, called in each worker, gives it its own connections,
+  metrics and background threads (threads don't survive a fork).
+"""
+
+from application.cache import category_registry
+from application.mailer import mail_sender
+from application.metrics import metrics
+from application.sweeper import gift_sweeper
+
+
+def warm_up(app):
+    """Load the categories and compile every template, then disconnect.
+
+    Argument:
+    app (object): the Flask app.
+    """
+    with app.app_context():
+        category_registry.all()
+    for name in app.jinja_env.list_templates():
+        if name.endswith('.html'):
+            app.jinja_env.get_template(name)
+
+    # The workers must not share the master's connections
+    app.extensions['sqlalchemy_engine'].dispose()
+
+
+def after_fork(app):
+    """Reset what a worker process must not share with its master.
+
+    Argument:
+    app (object): the Flask app.
+    """
+    app.extensions['sqlalchemy_engine'].dispose()
+    metrics.reset()
+    # Rather than on the worker's first request: the outbox and the
+    # sweeper don't wait for traffic
+    mail_sender.start_if_enabled()
+    gift_sweeper.start_if_enabled()
@@ -0,0 +1,148 @@
+"""Expire the gifts past their date, archive the long dead ones.
+
+The feed only lists the 'active' gifts (see Gift.state). The sweeper
+flips the gifts past their expires_at to 'expired' (or 'closed' if they
+were promised), in batches, so that the feed's index only holds live
+gifts. With GIFT_ARCHIVE_AFTER_DAYS set, it also moves the gifts dead
+for that long, and their claims, to the gift_archive and claim_archive
+tables.
+
+It runs in a thread of the web process or in its own process
+(`flask sweep-gifts`).
+"""
+
+from datetime import datetime, timedelta
+
+from sqlalchemy import case, literal, select
+
+from application.database import db_session
+from application.models import Gift, Claim, gift_archive, claim_archive
+from application.search import search_index
+from application.cache import fragment_cache
+from application.workers import PeriodicWorker
+
+
+class GiftSweeper(PeriodicWorker):
+    """Expire and archive gifts, in batches."""
+
+    name = 'giftr-gift-sweeper'
+    interval_key = 'GIFT_SWEEPER_INTERVAL'
+    enabled_key = 'GIFT_SWEEPER_WORKER'
+
+    def init_app(self, app):
+        """Configure the sweeper from the app's config.
+
+        Argument:
+        app (object): the Flask app.
+        """
+        app.config.setdefault('GIFT_SWEEPER_WORKER', False)
+        app.config.setdefault('GIFT_SWEEPER_INTERVAL', 60)
+        app.config.setdefault('GIFT_SWEEPER_BATCH_SIZE', 500)
+        app.config.setdefault('GIFT_ARCHIVE_AFTER_DAYS', None)
+        self.app = app
+        self.start_on_first_request(app)
+
+    def run_once(self):
+        """Expire and archive everything that is due."""
+        self.sweep()
+
+    def sweep(self):
+        """Expire and archive all the due gifts, return how many of each.
+
+        One transaction per batch, so that the web process never waits
+        long on the sweeper. Needs an application context.
+        """
+        size = self.app.config['GIFT_SWEEPER_BATCH_SIZE']
+
+        expired = 0
+        while True:
+            count = self.expire_batch(size)
+            expired += count
+            if count < size:
+                break
+
+        archived = 0
+        days = self.app.config['GIFT_ARCHIVE_AFTER_DAYS']
+        if days:
+            before = datetime.utcnow() - timedelta(days=days)
+            while True:
+                count = self.archive_batch(size, before)
+                archived += count
+                if count < size:
+                    break
+
+        if expired:
+            fragment_cache.invalidate_feed()
+        return expired, archived
+
+    def expire_batch(self, size):
+        """Flip up to size active gifts past their date, return how many.
+
+        Argument:
+        size (int): the maximum number of gifts to expire.
+        """
+        ids = [gift_id for gift_id, in
+               db_session.query(Gift.id)
+                         .filter(Gift.state == 'active')
+                         .filter(Gift.expires_at <= datetime.utcnow())
+                         .limit(size)]
+        if not ids:
+            return 0
+
+        state = case([(Gift.open.is_(False), 'closed')], else_='expired')
+        # Expiring is not an edit: leave updated_at alone
+        db_session.query(Gift) \
+                  .filter(Gift.id.in_(ids)) \
+                  .update({Gift.state: state,
+                           Gift.updated_at: Gift.updated_at},
+                          synchronize_session=False)
+        db_session.commit()
+        return len(ids)
+
+    def archive_batch(self, size, before):
+        """Move up to size gifts dead before a date, and their claims, to
+        the archive tables, return how many gifts.
+
+        Arguments:
+        size (int): the maximum number of gifts to archive.
+        before (datetime): archive the gifts that expired before that.
+        """
+        ids = [gift_id for gift_id, in
+               db_session.query(Gift.id)
+                         .filter(Gift.state.in_(['expired', 'closed']))
+                         .filter(Gift.expires_at <= before)
+                         .limit(size)]
+        if not ids:
+            return 0
+
+        now = datetime.utcnow()
+        db_session.execute(_copy(Claim.__table__, claim_archive,
+                                 Claim.gift_id.in_(ids), now))
+        db_session.execute(_copy(Gift.__table__, gift_archive,
+                                 Gift.id.in_(ids), now))
+
+        search_index.remove(db_session, ids)
+        db_session.query(Claim) \
+                  .filter(Claim.gift_id.in_(ids)) \
+                  .delete(synchronize_session=False)
+        db_session.query(Gift) \
+                  .filter(Gift.id.in_(ids)) \
+                  .delete(synchronize_session=False)
+        db_session.commit()
+        return len(ids)
+
+
+def _copy(table, archive, condition, archived_at):
+    """Return an INSERT ... SELECT copying rows of a table to its archive.
+
+    The archive numbers the copies itself (archive_id): an id may come
+    back, once its row is gone from the table.
+    """
+    names = [column.name for column in table.columns]
+    rows = select([table.c[name] for name in names] +
+                  [literal(archived_at, archive.c.archived_at.type)]) \
+        .where(condition)
+    return archive.insert().from_select(names + ['archived_at'], rows)
+
+
+gift_sweeper = GiftSweeper()
@@ -0,0 +1,60 @@
+"""Look up many resources by id in one request: ?ids=1,2,3.
+
+Clients hydrating a list ask for all its ids at once instead of one
+request per id. The ids are resolved with a single IN query, up to
+API_BATCH_MAX_IDS of them, and the response is keyed by id:
+
+    {"gifts": {"1": {...}, "3": {...}}, "missing": [2]}
+
+Ids that don't exist are listed in "missing" rather than failing the
+whole request.
+"""
+
+from flask import jsonify, current_app
+
+
+def requested_ids(args):
+    """Return the ids asked for with ids=, in order, without duplicates.
+
+    Raise ValueError if an id is not an integer, or if there are more
+    than API_BATCH_MAX_IDS of them.
+
+    Argument:
+    args (dict): the request's query string arguments.
+    """
+    ids = []
+    for value in args.get('ids', '').split(','):
+        value = value.strip()
+        if not value:
+            continue
+        try:
+            id_value = int(value)
+        except ValueError:
+            raise ValueError('Invalid id: %r' % value)
+        if id_value not in ids:
+            ids.append(id_value)
+
+    if not ids:
+        raise ValueError('No ids given, e.g. ids=1,2,3')
+    max_ids = current_app.config['API_BATCH_MAX_IDS']
+    if len(ids) > max_ids:
+        raise ValueError('Too many ids: %d, at most %d'
+                         % (len(ids), max_ids))
+    return ids
+
+
+def batch_response(name, found, ids, **extra):
+    """Return the resources found, keyed by id, and the missing ids.
+
+    Arguments:
+    name (str): the key of the resources, e.g. 'gifts'.
+    found (dict): the dicts of the resources found, by id.
+    ids (list): the ids that were asked for.
+    extra (dict): other keys to add to the response.
+    """
+    response = {name: dict((str(id_value), resource)
+                           for id_value, resource in found.items()),
+                'missing': [id_value for id_value in ids
+                            if id_value not in found]}
+    response.update(extra)
+    return jsonify(response)
@@ -2,19 +2,20 @@
 
 """Define routes for categories API."""
 
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
-from application.models import (Base,
-                    Category)
+from application.cache import category_registry
+from application.database import db_session
 
-from flask import (jsonify,
+from flask import (request,
+                   jsonify,
                    Blueprint)
 
-# Bind database
-engine = create_engine('sqlite:///giftr.db')
-Base.metadata.bind = engine
-DBSession = sessionmaker(bind=engine)
-c = DBSession()
+from application.serializers import category_encoder
+from application.views.api.decorators import conditional_get
+from application.views.api.errors import error_response
+from application.views.api.batch import requested_ids, batch_response
+
+# Bind database (request-scoped session)
+c = db_session
 
 api_categories_blueprint = Blueprint('api_categories', __name__, template_folder='templates')  # noqa
 
@@ -22,27 +23,49 @@ api_categories_blueprint = Blueprint('api_categories', __name__, template_folder
 # ROUTES
 
 @api_categories_blueprint.route('/api/categories')
+@conditional_get('category')
 def get():
-    """Return the categories in json."""
-    # Query database
-    categories = c.query(Category).all()
+    """Return the categories in json.
 
-    # Serialize
-    serialized_categories = [cat.serialize for cat in categories]
+    Add ids=1,2,3 as query string to only get these categories, keyed
+    by id (see application.views.api.batch).
+    """
+    if 'ids' in request.args:
+        try:
+            ids = requested_ids(request.args)
+        except ValueError as e:
+            return error_response(400, str(e))
+
+        # From the process-wide snapshot: no query
+        found = {}
+        for cat_id in ids:
+            category = category_registry.get(cat_id)
+            if category:
+                found[cat_id] = category_encoder.object_to_dict(category)
+        return batch_response('categories', found, ids)
+
+    # From the process-wide snapshot, ordered by id: no query, and
+    # nothing left to read from the database once the view returns
+    categories = [category_encoder.object_to_dict(cat)
+                  for cat in category_registry.all()]
 
     # Jsonify
-    return jsonify({'categories': serialized_categories})
+    return jsonify({'categories': categories})
 
 
 @api_categories_blueprint.route('/api/categories/<int:cat_id>')
+@conditional_get('category')
 def get_byid(cat_id):
-    """Return a category of id cat_id in json.
+    """Return a category of id cat_id in json, 404 if there is none.
 
     Argument:
     cat_id (int): the desired category.
     """
-    # Query database
-    category = c.query(Category).filter_by(id=cat_id).first()
+    # From the process-wide snapshot: no query
+    category = category_registry.get(cat_id)
+    if not category:
+        return error_response(404, 'There is no category %d.' % cat_id,
+                              resource='category', id=cat_id)
 
     # Serialize
     serialized_category = category.serialize
@@ -0,0 +1,31 @@
+#!/usr/bin/env python
+
+"""Define routes for claims API."""
+
+from application.models import Claim
+from application.serializers import claim_encoder
+
+from flask import (request,
+                   Blueprint)
+
+from application.views.api.errors import error_response
+from application.views.api.export import parse_since, export_response
+
+api_claims_blueprint = Blueprint('api_claims', __name__, template_folder='templates')  # noqa
+
+
+# ROUTES
+
+@api_claims_blueprint.route('/api/claims/export')
+def export():
+    """Stream all claims as newline-delimited json.
+
+    Add since=date as query string to only get the claims created or
+    updated since then.
+    """
+    try:
+        since = parse_since(request.args.get('since'))
+    except ValueError as e:
+        return error_response(400, str(e))
+
+    return export_response(claim_encoder, Claim, since)
@@ -0,0 +1,76 @@
+"""Define decorators shared by the API's routes."""
+
+import hashlib
+from functools import wraps
+
+from flask import request, current_app, make_response
+
+from application.database import db_session
+from application.models.table_version import get_versions
+
+
+def conditional_get(*tables, **options):
+    """Answer 304 Not Modified if the tables didn't change (decorator).
+
+    The ETag is derived from the request's URL and the tables' versions
+    (see TableVersion), so a client sending it back in If-None-Match gets
+    a 304 after a single primary key lookup, before any row is loaded.
+    Without If-None-Match the versions are looked up after the view, and
+    only for a 200: errors and 404s cost no lookup.
+
+    Arguments:
+    tables (str): the names of the tables the response is made from.
+    includes (dict): keyword only, the tables of the relations the
+                     response may include (include=...), by relation.
+    """
+    includes = options.get('includes', {})
+
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            asked = request.args.get('include', '').split(',')
+            tables_read = list(tables) + sorted(set(
+                includes[name] for name in asked if name in includes))
+
+            if request.if_none_match:
+                etag = make_etag(tables_read)
+                if request.if_none_match.contains(etag):
+                    response = current_app.response_class(status=304)
+                    return cacheable(response, etag)
+
+            response = make_response(f(*args, **kwargs))
+            if response.status_code != 200:
+                return response
+            if not request.if_none_match:
+                # After the rows: a write committed meanwhile can tag
+                # this body with its versions, until the tables change
+                etag = make_etag(tables_read)
+            return cacheable(response, etag)
+        return decorated_function
+    return decorator
+
+
+def make_etag(tables):
+    """Return the ETag of the request for the current table versions.
+
+    Argument:
+    tables (list): the names of the tables the response is made from.
+    """
+    versions = get_versions(db_session, tables)
+    state = ','.join('%s:%d' % (name, versions[name]) for name in tables)
+    key = u'%s|%s' % (request.full_path, state)
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+
+def cacheable(response, etag):
+    """Set the ETag and the caching headers of an API response.
+
+    Arguments:
+    response (object): the response, a 200 or a 304.
+    etag (str): its ETag.
+    """
+    response.set_etag(etag)
+    response.cache_control.public = True
+    response.cache_control.max_age = current_app.config['API_CACHE_MAX_AGE']
+    response.cache_control.must_revalidate = True
+    return response
@@ -0,0 +1,16 @@
+"""Build the API's error responses."""
+
+from flask import jsonify
+
+
+def error_response(status, message, **details):
+    """Return a JSON error: {"error": message, "status": status, ...}.
+
+    Arguments:
+    status (int): the HTTP status code.
+    message (str): what went wrong, for humans.
+    details (dict): more keys for programs, e.g. the missing resource.
+    """
+    response = jsonify(error=message, status=status, **details)
+    response.status_code = status
+    return response
@@ -0,0 +1,65 @@
+"""Stream whole tables out of the API, for analytics jobs."""
+
+from datetime import datetime
+
+from flask import Response, current_app
+from sqlalchemy import func
+from werkzeug.http import parse_date
+
+from application.database import db_session
+
+
+def parse_since(value):
+    """Return the datetime of a since=... query string, or None.
+
+    Accept ISO 8601 (2018-02-17T10:00:00) as well as the HTTP date format
+    the API uses for its own dates.
+    Raise ValueError if the value is neither.
+
+    Argument:
+    value (str): the value of the query string.
+    """
+    if not value:
+        return None
+    for date_format in ('%Y-%m-%dT%H:%M:%S.%f', '%Y-%m-%dT%H:%M:%S',
+                        '%Y-%m-%d'):
+        try:
+            return datetime.strptime(value, date_format)
+        except ValueError:
+            pass
+    since = parse_date(value)
+    if since is None:
+        raise ValueError('Invalid date for since: %r' % value)
+    return since
+
+
+def export_response(encoder, model, since=None):
+    """Return a response streaming a table as newline-delimited JSON.
+
+    The rows are read in batches from their own session (a server-side
+    cursor where the database supports it), so memory stays flat and the
+    request's session is not held while the response is sent.
+
+    Arguments:
+    encoder (object): the RowEncoder of the model.
+    model (object): the model of the table, with created_at and updated_at.
+    since (datetime): only export the rows created or updated since then.
+    """
+    batch_size = current_app.config['API_EXPORT_BATCH_SIZE']
+
+    def generate():
+        session = db_session.session_factory()
+        try:
+            rows = encoder.query(session)
+            if since is not None:
+                changed_at = func.coalesce(model.updated_at, model.created_at)
+                rows = rows.filter(changed_at >= since)
+            rows = rows.order_by(model.id) \
+                       .execution_options(stream_results=True) \
+                       .yield_per(batch_size)
+            for chunk in encoder.stream_lines(rows, batch_size):
+                yield chunk
+        finally:
+            session.close()
+
+    return Response(generate(), mimetype='application/x-ndjson')
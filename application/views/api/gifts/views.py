@@ -2,22 +2,31 @@
 
 """Define routes for gifts API."""
 
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
-from application.models import (Base,
-                    Gift,
-                    Claim,
-                    Category)
+from application.cache import category_registry
+from application.database import db_session
+from application.models import (Gift,
+                    Claim)
 
 from flask import (request,
                    jsonify,
-                   Blueprint)
-
-# Bind database
-engine = create_engine('sqlite:///giftr.db')
-Base.metadata.bind = engine
-DBSession = sessionmaker(bind=engine)
-c = DBSession()
+                   url_for,
+                   Blueprint,
+                   Response,
+                   current_app)
+
+from application.pagination import get_limit, paginate, search_page
+from application.search import search_index, fetch_in_order
+from application.serializers import gift_encoder
+from application.views.api.decorators import conditional_get
+from application.views.api.errors import error_response
+from application.views.api.batch import requested_ids, batch_response
+from application.views.api.includes import (GiftIncluder,
+                                            INCLUDE_TABLES,
+                                            requested_encoder)
+from application.views.api.export import parse_since, export_response
+
+# Bind database (request-scoped session)
+c = db_session
 
 api_gifts_blueprint = Blueprint('api_gifts', __name__, template_folder='templates')  # noqa
 
@@ -25,46 +34,174 @@ api_gifts_blueprint = Blueprint('api_gifts', __name__, template_folder='template
 # ROUTES
 
 @api_gifts_blueprint.route('/api/gifts')
+@conditional_get('gift', includes=INCLUDE_TABLES)
 def get():
-    """Return the gifts in json."""
-    req_cat = request.args.get('cat')
-    categories = c.query(Category).all()
+    """Return a page of gifts in json, newest first.
+
+    Add q=text as query string to search the gifts' names and
+    descriptions, results are then sorted by relevance.
+    Pages are requested with the "limit" and "cursor" query strings.
+    The url of the next page is in "next" and in the Link header.
+    Add fields[gift]=id,name to only get some fields, and
+    include=category,creator,claims to get related data too
+    (see application.views.api.includes).
+    Add ids=1,2,3 to get these gifts instead, keyed by id (see
+    application.views.api.batch).
+    """
+    req_cat = request.args.get('cat', type=int)
+    q = request.args.get('q', '').strip() or None
+
+    try:
+        encoder = requested_encoder(request.args, 'gift')
+        includer = GiftIncluder(c, request.args)
+        ids = requested_ids(request.args) if 'ids' in request.args else None
+    except ValueError as e:
+        return error_response(400, str(e))
+
+    if ids is not None:
+        return get_batch(ids, encoder, includer)
 
-    # If there is a valid int as query string,
+    # Only the asked columns, as tuples, and what paginating and
+    # including need
+    gifts = encoder.query(c, Gift.created_at, *includer.hidden_columns)
+
+    # If there is a valid category id as query string,
     # filter the gifts by category
+    if category_registry.get(req_cat):
+        gifts = gifts.filter(Gift.category_id == req_cat)
+    else:
+        req_cat = None
+
+    limit = get_limit(request.args,
+                      current_app.config['GIFTS_PER_PAGE'],
+                      current_app.config['GIFTS_MAX_PER_PAGE'])
     try:
-        req_cat = int(req_cat)
-        if req_cat > 0 and req_cat <= len(categories):
-            gifts = c.query(Gift).filter_by(category_id=req_cat).order_by(Gift.created_at.desc()).all()  # noqa
+        if q:
+            ids, cursor = search_page(search_index.search, q, limit,
+                                      request.args.get('cursor'),
+                                      session=c,
+                                      category_id=req_cat)
+            gifts = fetch_in_order(gifts, Gift.id, ids)
         else:
-            gifts = c.query(Gift).order_by(Gift.created_at.desc()).all()
-    except:
-        gifts = c.query(Gift).order_by(Gift.created_at.desc()).all()
+            gifts, cursor = paginate(gifts, Gift.created_at, Gift.id,
+                                     limit, request.args.get('cursor'))
+    except ValueError as e:
+        return error_response(400, str(e))
+
+    next_url = None
+    if cursor:
+        # Same fields and includes on the next page
+        shape = dict((key, value) for key, value in request.args.items()
+                     if key == 'include' or key.startswith('fields['))
+        next_url = url_for('api_gifts.get',
+                           cat=req_cat,
+                           q=q,
+                           limit=request.args.get('limit'),
+                           cursor=cursor,
+                           _external=True,
+                           **shape)
+
+    included = includer.load(gifts)
 
     # Serialize
-    serialized_gifts = [gift.serialize for gift in gifts]
+    response = Response(encoder.stream(gifts, 'gifts',
+                                       transform=includer.add_claims,
+                                       next=next_url,
+                                       **includer.response_keys(included)),
+                        mimetype='application/json')
+    if next_url:
+        response.headers['Link'] = '<%s>; rel="next"' % next_url
+    return response
+
+
+def get_batch(ids, encoder, includer):
+    """Return the gifts of some ids in json, keyed by id.
+
+    Arguments:
+    ids (list): the desired gifts.
+    encoder (object): the gift encoder, restricted to the asked fields.
+    includer (object): the GiftIncluder of the request.
+    """
+    # One IN query for all the gifts
+    gifts = encoder.query(c, *includer.hidden_columns) \
+                   .filter(Gift.id.in_(ids)) \
+                   .all()
+    included = includer.load(gifts)
 
-    # Jsonify
-    return jsonify(gifts=serialized_gifts)
+    found = {}
+    for gift in gifts:
+        serialized_gift = encoder.to_dict(gift)
+        includer.add_claims(gift, serialized_gift)
+        found[gift.id] = serialized_gift
+
+    return batch_response('gifts', found, ids,
+                          **includer.response_keys(included))
 
 
 @api_gifts_blueprint.route('/api/gifts/<int:g_id>')
+@conditional_get('gift', includes=INCLUDE_TABLES)
 def get_byid(g_id):
-    """Return a gift of id g_id in json.
+    """Return a gift of id g_id in json, 404 if there is none.
+
+    Add include=claims as query string to get the gift's claims too,
+    include=category,creator and fields[...] work like for /api/gifts.
 
     Argument:
     g_id (int): the desired gift.
     """
-    # Query database
-    gift = c.query(Gift).filter_by(id=g_id).first()
-    claims = c.query(Claim).filter_by(gift_id=g_id).all()
+    try:
+        encoder = requested_encoder(request.args, 'gift')
+        includer = GiftIncluder(c, request.args)
+    except ValueError as e:
+        return error_response(400, str(e))
+    with_claims = 'claims' in includer.includes
+
+    # One query, with the claims outer joined if asked for:
+    # one row per claim, or a single row without claims
+    rows = encoder.query(c, *includer.hidden_columns) \
+                  .filter(Gift.id == g_id)
+    split = len(rows.column_descriptions)
+    if with_claims:
+        claims_encoder = includer.encoders['claim']
+        # Labelled: the claim's id or creator_id must not shadow the
+        # gift's in the rows the includer reads by name
+        claim_columns = [column.label('claim_%s' % column.key)
+                         for column in claims_encoder.columns + [Claim.id]]
+        rows = rows.add_columns(*claim_columns) \
+                   .outerjoin(Claim, Claim.gift_id == Gift.id) \
+                   .order_by(Claim.id)
+    rows = rows.all()
+
+    if not rows:
+        return error_response(404, 'There is no gift %d.' % g_id,
+                              resource='gift', id=g_id)
 
     # Serialize
-    serialized_gift = gift.serialize
-    serialized_claims = [claim.serialize for claim in claims]
+    serialized_gift = encoder.to_dict(rows[0][:split])
+    if with_claims:
+        # The claim's id comes last: None when the gift has no claims
+        serialized_gift['claims'] = [claims_encoder.to_dict(row[split:])
+                                     for row in rows
+                                     if row[-1] is not None]
 
-    # Append the items to the restaurant
-    serialized_gift['claims'] = serialized_claims
+    response = {'gift': serialized_gift}
+    response.update(includer.response_keys(
+        includer.load([rows[0]], claims=False)))
 
     # Jsonify
-    return jsonify({'gift': serialized_gift})
+    return jsonify(response)
+
+
+@api_gifts_blueprint.route('/api/gifts/export')
+def export():
+    """Stream all gifts as newline-delimited json.
+
+    Add since=date as query string to only get the gifts created or
+    updated since then.
+    """
+    try:
+        since = parse_since(request.args.get('since'))
+    except ValueError as e:
+        return error_response(400, str(e))
+
+    return export_response(gift_encoder, Gift, since)
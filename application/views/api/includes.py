@@ -0,0 +1,150 @@
+"""Sparse fieldsets and related resources for the API's responses.
+
+`fields[gift]=id,name` only selects (and returns) these columns.
+`include=category,creator,claims` returns the related resources in the
+same response, loaded with one IN query per relation for the whole page
+(categories come from the category registry, without a query):
+
+- claims are nested in their gift, under "claims";
+- categories and creators, shared by many gifts, are listed once in
+  "included": {"categories": [...], "users": [...]}.
+
+Invalid parameters raise ValueError, for the views to answer 400.
+"""
+
+from application.cache import category_registry
+from application.models import Gift, Claim, User
+from application.serializers import (gift_encoder,
+                                     category_encoder,
+                                     public_user_encoder,
+                                     claim_encoder)
+
+# What include= accepts for gifts
+GIFT_INCLUDES = ('category', 'creator', 'claims')
+
+ENCODERS = {'gift': gift_encoder,
+            'category': category_encoder,
+            'user': public_user_encoder,
+            'claim': claim_encoder}
+
+# The tables the includes are read from, for the ETags
+INCLUDE_TABLES = {'category': 'category',
+                  'creator': 'user',
+                  'claims': 'claim'}
+
+
+def requested_encoder(args, type_name):
+    """Return the encoder of a type, restricted to fields[type] if asked.
+
+    Arguments:
+    args (dict): the request's query string arguments.
+    type_name (str): 'gift', 'category', 'user' or 'claim'.
+    """
+    encoder = ENCODERS[type_name]
+    value = args.get('fields[%s]' % type_name)
+    if value is None:
+        return encoder
+    keys = [key.strip() for key in value.split(',') if key.strip()]
+    if not keys:
+        raise ValueError('fields[%s] is empty' % type_name)
+    return encoder.only(keys)
+
+
+def requested_includes(args, allowed=GIFT_INCLUDES):
+    """Return the set of relations asked for with include=.
+
+    Arguments:
+    args (dict): the request's query string arguments.
+    allowed (list): the relations that can be included.
+    """
+    includes = set(name.strip()
+                   for name in args.get('include', '').split(',')
+                   if name.strip())
+    unknown = includes.difference(allowed)
+    if unknown:
+        raise ValueError('Cannot include: %s' % ', '.join(sorted(unknown)))
+    return includes
+
+
+class GiftIncluder(object):
+    """Load the relations of a page of gifts, in one query per relation."""
+
+    def __init__(self, session, args):
+        """Read what to include, and which fields, from the query string.
+
+        Arguments:
+        session (object): the request's database session.
+        args (dict): the request's query string arguments.
+        """
+        self.session = session
+        self.includes = requested_includes(args)
+        self.encoders = dict((type_name, requested_encoder(args, type_name))
+                             for type_name in ENCODERS)
+        self.claims = {}
+
+    @property
+    def hidden_columns(self):
+        """The gift columns the includes need, whatever fields[gift] says."""
+        columns = [Gift.id]
+        if 'category' in self.includes:
+            columns.append(Gift.category_id)
+        if 'creator' in self.includes:
+            columns.append(Gift.creator_id)
+        return columns
+
+    def load(self, gifts, claims=True):
+        """Load the relations of gifts, return the "included" dict.
+
+        Arguments:
+        gifts (list): rows with the hidden columns of the gifts.
+        claims (bool): False if the caller loads the claims itself.
+        """
+        included = {}
+
+        if claims and 'claims' in self.includes:
+            self.claims = dict((gift.id, []) for gift in gifts)
+            if self.claims:
+                encoder = self.encoders['claim']
+                rows = encoder.query(self.session, Claim.gift_id) \
+                              .filter(Claim.gift_id.in_(list(self.claims))) \
+                              .order_by(Claim.id)
+                for row in rows:
+                    self.claims[row.gift_id].append(encoder.to_dict(row))
+
+        if 'category' in self.includes:
+            encoder = self.encoders['category']
+            ids = sorted(set(gift.category_id for gift in gifts
+                             if gift.category_id is not None))
+            categories = [category_registry.get(i) for i in ids]
+            included['categories'] = [encoder.object_to_dict(category)
+                                       for category in categories
+                                       if category is not None]
+
+        if 'creator' in self.includes:
+            encoder = self.encoders['user']
+            ids = sorted(set(gift.creator_id for gift in gifts
+                             if gift.creator_id is not None))
+            users = encoder.query(self.session) \
+                           .filter(User.id.in_(ids)) \
+                           .order_by(User.id) if ids else []
+            included['users'] = [encoder.to_dict(user) for user in users]
+
+        return included
+
+    def add_claims(self, gift, serialized):
+        """Nest a gift's claims in its dict (a RowEncoder.stream transform).
+
+        Arguments:
+        gift (tuple): the gift's row.
+        serialized (dict): the gift's dict.
+        """
+        if 'claims' in self.includes:
+            serialized['claims'] = self.claims.get(gift.id, [])
+
+    def response_keys(self, included):
+        """Return the top-level keys to add to the response.
+
+        Argument:
+        included (dict): what load returned.
+        """
+        return {'included': included} if included else {}
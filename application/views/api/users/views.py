@@ -0,0 +1,42 @@
+#!/usr/bin/env python
+
+"""Define routes for users API."""
+
+from application.database import db_session
+from application.models import User
+
+from flask import (request,
+                   Blueprint)
+
+from application.serializers import public_user_encoder
+from application.views.api.decorators import conditional_get
+from application.views.api.errors import error_response
+from application.views.api.batch import requested_ids, batch_response
+
+# Bind database (request-scoped session)
+c = db_session
+
+api_users_blueprint = Blueprint('api_users', __name__, template_folder='templates')  # noqa
+
+
+# ROUTES
+
+@api_users_blueprint.route('/api/users')
+@conditional_get('user')
+def get():
+    """Return the public profiles of the users of ids=1,2,3, keyed by id.
+
+    The users are not listed: ids is required.
+    """
+    try:
+        ids = requested_ids(request.args)
+    except ValueError as e:
+        return error_response(400, str(e))
+
+    # One IN query, only the public columns
+    users = public_user_encoder.query(c).filter(User.id.in_(ids))
+
+    # Serialize
+    found = dict((user.id, public_user_encoder.to_dict(user))
+                 for user in users)
+    return batch_response('users', found, ids)
@@ -2,10 +2,8 @@
 
 """Define routes for login procedures."""
 
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
-from application.models import (Base,
-                    User)
+from application.database import db_session
+from application.models import User
 
 from flask import (request,
                    redirect,
@@ -17,35 +15,18 @@ from flask import (request,
                    Blueprint)
 
 # For OAuth
-from oauth2client.client import (flow_from_clientsecrets,
-                                 FlowExchangeError)
+from application.oauth import oauth_client
 import random
 import string
 import json
 import requests
-import httplib2
 
-# Bind database
-engine = create_engine('sqlite:///giftr.db')
-Base.metadata.bind = engine
-DBSession = sessionmaker(bind=engine)
-c = DBSession()
+# Bind database (request-scoped session)
+c = db_session
 
 login_blueprint = Blueprint('login', __name__, template_folder='templates')
 
 
-# API Secrets and IDs
-def get_google_client_id(json_file_name):
-    """Get client id for Google OAuth2, from provided json file."""
-    google_client_secrets_f = open(json_file_name, 'r')
-    google_client_secrets = google_client_secrets_f.read()
-    google_client_secrets_json = json.loads(google_client_secrets)
-    return google_client_secrets_json['web']['client_id']
-
-
-CLIENT_ID = get_google_client_id('google_client_secrets.json')
-
-
 # ROUTES
 
 @login_blueprint.route('/login', methods=['GET'])
@@ -76,6 +57,12 @@ def gconnect():
 
         return response
 
+    if oauth_client.google_secrets is None:
+        return json_response('Google login is not configured.', 500)
+
+    # Slow to import: only on the first Google login
+    from oauth2client.client import FlowExchangeError
+
     # PART 1: Getting the credentials object
     # -------
 
@@ -84,18 +71,10 @@ def gconnect():
 
     try:
         # Try and upgrade the authorization code into a CREDENTIALS OBJECT
-        # (Exchange it via oauth2client.client)
+        # (Exchange it via oauth2client.client, with the secrets read
+        # at start up)
         # The credentials object contains the ACCESS TOKEN for the server
-
-        # 1. Create oauth_flow object with the client's SECRET KEY info in it
-        oauth_flow = flow_from_clientsecrets('google_client_secrets.json',
-                                             scope='')
-        # 2. Specify that this is the one-time code flow
-        # the server will be sending off
-        oauth_flow.redirect_uri = 'postmessage'
-        # 3. Make the exchange, using the ONE-TIME-USE CODE
-        # Exchanges an authorization code with a CREDENTIALS OBJECT
-        credentials = oauth_flow.step2_exchange(code)
+        credentials = oauth_client.google_exchange(code)
 
     except FlowExchangeError:
         message = 'Failed to upgrade the authorization code.'
@@ -111,12 +90,11 @@ def gconnect():
 
     # 1. Get ACCESS TOKEN from credentials
     access_token = credentials.access_token
-    # 2. Get the URL for GOOGLE access token checking
-    url = ('https://www.googleapis.com/oauth2/v1/tokeninfo?access_token=%s' % access_token)  # noqa
-    # 3. Create a json GET request with the URL
-    # and store the result of that request in gapi_tokeninfo
-    h = httplib2.Http()
-    gapi_tokeninfo = json.loads(h.request(url, 'GET')[1])
+    # 2. Ask GOOGLE about it (recent answers are cached)
+    try:
+        gapi_tokeninfo = oauth_client.google_tokeninfo(access_token)
+    except (requests.RequestException, ValueError):
+        return json_response('Could not verify the token with Google.', 502)
 
     # Check if Google API's server's access token verification
     # returned an ERROR
@@ -146,7 +124,7 @@ def gconnect():
 
     # Check that our client's id matches that of the token
     # returned by Google API's server
-    if gapi_tokeninfo['issued_to'] != CLIENT_ID:
+    if gapi_tokeninfo['issued_to'] != oauth_client.google_client_id:
         message = "Token's client ID does not match this app's."
         response = make_response(json.dumps(message), 401)
         response.headers['Content-Type'] = 'application/json'
@@ -180,14 +158,10 @@ def gconnect():
     session['gplus_id'] = gplus_id
 
     # 2. Get user info from Google's API
-    # Get the URL for GOOGLE'S API
-    userinfo_url = "https://www.googleapis.com/oauth2/v1/userinfo"
-    # Get the parameters to send with the request
-    params = {'access_token': credentials.access_token, 'alt': 'json'}
-    # Send a GET request to Google's API
-    userinfo = requests.get(userinfo_url, params=params)
-    # Store the user's info in JSON from the response to the request
-    userinfo_json = json.loads(userinfo.text)
+    try:
+        userinfo_json = oauth_client.google_userinfo(access_token)
+    except (requests.RequestException, ValueError):
+        return json_response('Could not get your profile from Google.', 502)
 
     # 3. Store user info in the session
     session['username'] = userinfo_json['name']
@@ -229,28 +203,24 @@ def fbconnect():
 
         return response
 
+    if oauth_client.facebook_secrets is None:
+        return json_response('Facebook login is not configured.', 500)
+
     # 2. Get the ACCESS TOKEN sent through ajax
     access_token = request.data
 
-    # 3. Exchange client token for long-lived server-side token
-    # with GET /oauth/access_token?grant_type=fb_exchange_token&client_id=
-    # {app-id}&client_secret={app-secret}&fb_exchange_token={short-lived-token}
-    fb_info = json.loads(open('fb_client_secrets.json', 'r').read())
-    app_id = fb_info['web']['app_id']
-    app_secret = fb_info['web']['app_secret']
-    url = 'https://graph.facebook.com/oauth/access_token?grant_type=fb_exchange_token&client_id=%s&client_secret=%s&fb_exchange_token=%s' % (app_id, app_secret, access_token)  # noqa
-    h = httplib2.Http()
-    result = h.request(url, 'GET')[1]
-
-    # 4. Use the long-lived token to get user info from API
-    # extract access token from result
-    token = eval(result).get('access_token')
-
-    url = 'https://graph.facebook.com/v2.8/me?access_token=%s&fields=name,id,email,picture' % token  # noqa
-    h = httplib2.Http()
-    result = h.request(url, 'GET')[1]
-    data = json.loads(result)
+    try:
+        # 3. Exchange client token for long-lived server-side token
+        # (with the app's secrets read at start up)
+        token = oauth_client.facebook_exchange(access_token)
+
+        # 4. Use the long-lived token to get user info from API
+        data = oauth_client.facebook_me(token)
+    except (requests.RequestException, ValueError):
+        return json_response('Could not log in with Facebook.', 502)
 
+    # Kept to revoke the permissions on logout
+    session['access_token'] = token
     session['username'] = data['name']
     session['email'] = data['email']
     session['fb_id'] = data['id']
@@ -282,6 +252,18 @@ def fbconnect():
 
 # HELPERS
 
+def json_response(message, status):
+    """Return a message as a JSON response.
+
+    Arguments:
+    message (str): the message.
+    status (int): the HTTP status code.
+    """
+    response = make_response(json.dumps(message), status)
+    response.headers['Content-Type'] = 'application/json'
+    return response
+
+
 def get_random_string():
     """Get a random string of 32 uppercase letters and digits."""
     choice = string.ascii_uppercase + string.digits
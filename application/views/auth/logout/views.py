@@ -12,6 +12,8 @@ from flask import (redirect,
 import json
 import requests
 
+from application.oauth import oauth_client
+
 logout_blueprint = Blueprint('logout', __name__, template_folder='templates')
 
 
@@ -79,17 +81,13 @@ def gdisconnect():
     # -------
 
     # Have Google revoke the token
+    try:
+        revoked = oauth_client.google_revoke(token)
+    except requests.RequestException:
+        revoked = False
 
-    # 2. Create a POST request with the URL
-    # and store the json result of that request
-    url = 'https://accounts.google.com/o/oauth2/revoke'
-    params = {'token': token}
-    headers = {'content-type': 'application/x-www-form-urlencoded'}
-
-    result = requests.post(url=url, params=params, headers=headers)
-
-    # 3. Check if it's a success
-    if result.status_code == '200':
+    # Check if it's a success
+    if revoked:
         # 4. Send the response (DISCONNECT() TAKES CARE OF DELETING SESSION)
         response = make_response(json.dumps('Successfully disconnected.'), 200)
         response.headers['Content-Type'] = 'application/json'
@@ -122,18 +120,14 @@ def fbdisconnect():
 
     # Have Facebook revoke the permission
 
-    # 1. Get the URL for FACEBOOK permissions
     fb_id = session['fb_id']
-    url = 'https://graph.facebook.com/%s/permissions' % fb_id
-
-    # 2. Create a DELETE request with the URL
-    url = 'https://graph.facebook.com/%s/permissions' % fb_id
-    headers = {'content-type': 'application/x-www-form-urlencoded'}
-
-    result = requests.delete(url=url, headers=headers)
+    try:
+        revoked = oauth_client.facebook_revoke(fb_id, access_token)
+    except requests.RequestException:
+        revoked = False
 
-    # 3. Check if it's a success
-    if result.status_code == '200':
+    # Check if it's a success
+    if revoked:
         # 4. Send the response (DISCONNECT() TAKES CARE OF DELETING SESSION)
         response = make_response(json.dumps('Successfully disconnected.'), 200)
         response.headers['Content-Type'] = 'application/json'
@@ -2,10 +2,9 @@
 
 """Define routes for CRUD operations on categories."""
 
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
-from application.models import (Base,
-                    Category)
+from application.cache import category_registry, fragment_cache
+from application.database import db_session
+from application.models import Category
 
 from flask import (request,
                    redirect,
@@ -18,11 +17,8 @@ from flask import (request,
 # For making decorators
 from functools import wraps
 
-# Bind database
-engine = create_engine('sqlite:///giftr.db')
-Base.metadata.bind = engine
-DBSession = sessionmaker(bind=engine)
-c = DBSession()
+# Bind database (request-scoped session)
+c = db_session
 
 categories_blueprint = Blueprint('categories', __name__, template_folder='templates')  # noqa
 
@@ -44,7 +40,7 @@ def login_required(f):
 @categories_blueprint.route('/categories', methods=['GET'])
 def get():
     """Render all categories in the database."""
-    categories = c.query(Category).all()
+    categories = category_registry.all()
 
     return render_template('categories.html',
                            categories=categories)
@@ -86,6 +82,8 @@ def add_post():
 
     c.add(category)
     c.commit()
+    category_registry.invalidate()
+    fragment_cache.invalidate_feed()
 
     flash("The category \"%s\" was successfully added." % category.name)
 
@@ -127,6 +125,8 @@ def edit_post(cat_id):
 
     c.add(category)
     c.commit()
+    category_registry.invalidate()
+    fragment_cache.invalidate_feed()
 
     flash("The category \"%s\" was successfully edited." % category.name)
 
@@ -165,6 +165,8 @@ def delete_post(cat_id):
 
     c.delete(category)
     c.commit()
+    category_registry.invalidate()
+    fragment_cache.invalidate_feed()
 
     flash("The category \"%s\" was successfully deleted." % category.name)
 
@@ -2,10 +2,8 @@
 
 """Define routes for CRUD operations on claims."""
 
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
-from application.models import (Base,
-                    Gift,
+from application.database import db_session
+from application.models import (Gift,
                     Claim)
 
 from flask import (request,
@@ -21,17 +19,16 @@ from flask import (request,
 from functools import wraps
 
 # For sending emails
-from flask_mail import Mail, Message
-from application import mail
+from application.mailer import enqueue_mail, mail_sender
+
+from application.counters import claim_added, claim_removed
+from application.cache import fragment_cache
 
 from textwrap import dedent
 from datetime import datetime, timedelta
 
-# Bind database
-engine = create_engine('sqlite:///giftr.db')
-Base.metadata.bind = engine
-DBSession = sessionmaker(bind=engine)
-c = DBSession()
+# Bind database (request-scoped session)
+c = db_session
 
 claims_blueprint = Blueprint('claims', __name__, template_folder='templates')
 
@@ -209,7 +206,9 @@ def add_post(g_id, gift):
                   creator_id=session.get('user_id'))
 
     c.add(claim)
+    claim_added(c, g_id)
     c.commit()
+    fragment_cache.invalidate_feed()
 
     flash("Congratulations! You successfully claimed %s." % claim.gift.name)
 
@@ -308,8 +307,10 @@ def delete_post(g_id, c_id, claim):
     """
     gift_name = claim.gift.name
 
+    claim_removed(c, claim)
     c.delete(claim)
     c.commit()
+    fragment_cache.invalidate_feed()
 
     flash("Your claim on %s was successfully deleted." % gift_name)
 
@@ -330,11 +331,11 @@ def accept_post(g_id, c_id, claim):
     # Mark gift as closed
     gift = claim.gift
     gift.open = False
+    gift.accepted_claim_id = claim.id
     # Set gift expiring date to tomorrow
-    gift.expires_at = datetime.now() + timedelta(days=1)
+    gift.expires_at = datetime.utcnow() + timedelta(days=1)
 
     c.add(gift)
-    c.commit()
 
     # Send an email to both
     giver_name = session.get('username')
@@ -352,11 +353,16 @@ def accept_post(g_id, c_id, claim):
                  
                  Giftr""" % (giver_name, claimer_name, giver_name)
     message = dedent(message)  # Removes indentation
-    msg = Message("Congrats on sharing on Giftr!",
-                  sender="aguenet@gmail.com",
-                  recipients=[claimer_email, giver_email])
-    msg.body = message
-    mail.send(msg)
+    # Queued in the same transaction, sent in the background
+    enqueue_mail(c,
+                 "Congrats on sharing on Giftr!",
+                 sender="aguenet@gmail.com",
+                 recipients=[claimer_email, giver_email],
+                 body=message)
+
+    c.commit()
+    fragment_cache.invalidate_feed()
+    mail_sender.wake_up()
 
     flash("You accepted %s's claim on your gift." % claim.creator.name)
 
@@ -2,13 +2,14 @@
 
 """Define routes for CRUD operations on gifts."""
 
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
-from application.models import (Base,
-                    User,
+from sqlalchemy.orm import joinedload
+
+from application.cache import category_registry, fragment_cache
+from application.database import db_session
+from application.models import (User,
                     Gift,
-                    Claim,
-                    Category)
+                    Claim)
+from application.models.gift import GIFT_LIFETIME
 
 from flask import (request,
                    redirect,
@@ -17,18 +18,19 @@ from flask import (request,
                    flash,
                    session,
                    Blueprint,
-                   Markup)
+                   Markup,
+                   current_app)
+
+from application.pagination import get_limit, paginate, search_page
+from application.search import search_index, fetch_in_order
 
 # For making decorators
 from functools import wraps
 
-from datetime import datetime, timedelta
+from datetime import datetime
 
-# Bind database
-engine = create_engine('sqlite:///giftr.db')
-Base.metadata.bind = engine
-DBSession = sessionmaker(bind=engine)
-c = DBSession()
+# Bind database (request-scoped session)
+c = db_session
 
 gifts_blueprint = Blueprint('gifts', __name__, template_folder='templates')
 
@@ -50,7 +52,9 @@ def include_gift(f):
     @wraps(f)
     def decorated_function(*args, **kwargs):
         g_id = kwargs['g_id']
-        gift = c.query(Gift).filter_by(id=g_id).one_or_none()
+        gift = c.query(Gift).options(joinedload(Gift.creator)) \
+                            .filter_by(id=g_id) \
+                            .one_or_none()
         if not gift:
             flash('There\'s no gift here.')
             return redirect(url_for('gifts.get'))
@@ -64,7 +68,7 @@ def include_categories(f):
     """Return an object with all categories (decorator)."""
     @wraps(f)
     def decorated_function(*args, **kwargs):
-        categories = c.query(Category).all()
+        categories = category_registry.all()
         # pass along the categories object to the next function
         kwargs['categories'] = categories
         return f(*args, **kwargs)
@@ -101,38 +105,71 @@ def open_required(f):
 
 @gifts_blueprint.route('/', methods=['GET'])
 @gifts_blueprint.route('/gifts', methods=['GET'])
+@fragment_cache.anonymous_page
 @include_categories
 def get(categories):
-    """Render all gifts or gifts of category id "cat" if query.
+    """Render a page of gifts, or of gifts of category id "cat" if query.
+
+    Add q=text as query string to search the gifts' names and descriptions,
+    results are then sorted by relevance.
+    Pages are requested with the "limit" and "cursor" query strings,
+    the cursor of the next page is in the "More gifts" link.
+    Anonymous visitors get the page from the cache, when it's there.
 
     Argument:
     categories (object): generally passed through the
                          @include_categories decorator,
                          contains all categories in the database.
     """
-    req_cat = request.args.get('cat')
+    req_cat = request.args.get('cat', type=int)
+    q = request.args.get('q', '').strip() or None
 
-    # If there is a valid int as query string,
+    # The sweeper expires gifts in the background: also filter on
+    # expires_at for the gifts that expired since its last run
+    gifts = c.query(Gift).options(joinedload(Gift.creator)) \
+                         .filter(Gift.state == 'active') \
+                         .filter(Gift.expires_at > datetime.utcnow())
+
+    # If there is a valid category id as query string,
     # filter the gifts by category
+    category = category_registry.get(req_cat)
+    if category:
+        gifts = gifts.filter_by(category_id=req_cat)
+    else:
+        req_cat = None
+
+    limit = get_limit(request.args,
+                      current_app.config['GIFTS_PER_PAGE'],
+                      current_app.config['GIFTS_MAX_PER_PAGE'])
     try:
-        req_cat = int(req_cat)
-        if req_cat > 0 and req_cat <= len(categories):
-            gifts = c.query(Gift).filter_by(category_id=req_cat).filter(Gift.expires_at > datetime.now()).order_by(Gift.expires_at.desc()).all()  # noqa
-            req_cat = c.query(Category).filter_by(id=req_cat).first()
-
-            return render_template('gifts.html',
-                                   gifts=gifts,
-                                   categories=categories,
-                                   req_cat=req_cat,
-                                   page="gifts")
-    except:
-        pass
-
-    gifts = c.query(Gift).filter(Gift.expires_at > datetime.now()).order_by(Gift.expires_at.desc()).all()
+        if q:
+            ids, cursor = search_page(search_index.search, q, limit,
+                                      request.args.get('cursor'),
+                                      session=c,
+                                      category_id=req_cat,
+                                      live_only=True)
+            gifts = fetch_in_order(gifts, Gift.id, ids)
+        else:
+            gifts, cursor = paginate(gifts, Gift.expires_at, Gift.id,
+                                     limit, request.args.get('cursor'))
+    except ValueError:
+        # Stale or tampered cursor: start over from the first page
+        return redirect(url_for('gifts.get', cat=req_cat, q=q))
+
+    next_url = None
+    if cursor:
+        next_url = url_for('gifts.get',
+                           cat=req_cat,
+                           q=q,
+                           limit=request.args.get('limit'),
+                           cursor=cursor)
 
     return render_template('gifts.html',
                            categories=categories,
                            gifts=gifts,
+                           req_cat=category,
+                           q=q,
+                           next_url=next_url,
                            page="gifts")
 
 
@@ -155,7 +192,7 @@ def get_byid(g_id, gift, categories):
     # If user is gift's creator and that gift expired, flash them
     if session.get('username'):
         if gift.creator_id == session.get('user_id'):
-            if gift.expires_at < datetime.now():
+            if gift.expires_at < datetime.utcnow():
                 msg = """<form method="POST" action="%s">
                             Your gift expired.
                             <input type="submit" class="btn btn-success ml-4" value="Bring it back to life for 5 days"></input>
@@ -179,8 +216,10 @@ def get_byuserid(u_id, categories):
                          @include_categories decorator,
                          contains all categories in the database.
     """
-    gifts = c.query(Gift).filter_by(creator_id=u_id).order_by(Gift.created_at.desc()).all()  # noqa
     user = c.query(User).filter_by(id=u_id).first()
+    # The creator of all these gifts is already in the session,
+    # so gift.creator won't hit the database
+    gifts = c.query(Gift).filter_by(creator_id=u_id).order_by(Gift.created_at.desc()).all()  # noqa
 
     return render_template('gifts.html',
                            gifts=gifts,
@@ -219,7 +258,10 @@ def add_post():
                 category_id=request.form.get('category'),
                 creator_id=session.get('user_id'))
     c.add(gift)
+    c.flush()
+    search_index.index(c, gift)
     c.commit()
+    fragment_cache.invalidate_feed()
 
     flash("Thanks for your generosity! %s was successfully added." % gift.name)
 
@@ -274,7 +316,9 @@ def edit_post(g_id, gift):
     gift.category_id = request.form.get('category')
 
     c.add(gift)
+    search_index.index(c, gift)
     c.commit()
+    fragment_cache.invalidate_feed()
 
     flash("%s was successfully edited." % gift.name)
 
@@ -318,14 +362,13 @@ def delete_post(g_id, gift):
     gift (object): generally passed through the @include_gift decorator,
                    contains a gift object of id g_id.
     """
+    # Delete the claims to that gift too, in one statement
+    c.query(Claim).filter_by(gift_id=gift.id) \
+                  .delete(synchronize_session=False)
+    search_index.remove(c, [gift.id])
     c.delete(gift)
     c.commit()
-
-    # Delete the claims to that object too
-    claims = c.query(Claim).filter_by(gift_id=gift.id).all()
-    for claim in claims:
-        c.delete(claim)
-        c.commit()
+    fragment_cache.invalidate_feed()
 
     flash("%s was successfully deleted." % gift.name)
 
@@ -337,9 +380,11 @@ def delete_post(g_id, gift):
 @include_gift
 @creator_required
 def extend(g_id, gift):
-    gift.expires_at += timedelta(days=5)
+    gift.expires_at += GIFT_LIFETIME
+    gift.state = 'active'
     c.add(gift)
     c.commit()
+    fragment_cache.invalidate_feed()
 
     flash("%s is available again for five days." % gift.name)
 
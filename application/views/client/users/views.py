@@ -2,12 +2,17 @@
 
 """Define routes for CRUD operations on users."""
 
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
-from application.models import (Base,
-                    Gift,
+from sqlalchemy import or_, select
+
+from application.database import db_session
+from application.search import search_index
+from application.counters import refresh_claim_counters
+from application.cache import fragment_cache
+from application.models import (Gift,
                     Claim,
-                    User)
+                    User,
+                    gift_archive,
+                    claim_archive)
 
 from flask import (request,
                    redirect,
@@ -20,11 +25,8 @@ from flask import (request,
 # For making decorators
 from functools import wraps
 
-# Bind database
-engine = create_engine('sqlite:///giftr.db')
-Base.metadata.bind = engine
-DBSession = sessionmaker(bind=engine)
-c = DBSession()
+# Bind database (request-scoped session)
+c = db_session
 
 users_blueprint = Blueprint('users', __name__, template_folder='templates')
 
@@ -121,6 +123,7 @@ def edit_post(u_id, user):
 
     c.add(user)
     c.commit()
+    fragment_cache.invalidate_feed()
 
     session['username'] = user.name
     session['picture'] = user.picture
@@ -161,17 +164,34 @@ def delete_post(u_id, user):
     user (object): generally passed through the @include_user decorator,
                    contains a user object of id u_id.
     """
-    # Delete the gifts of that user too
-    user_gifts = c.query(Gift).filter_by(creator_id=user.id).all()
-    for gift in user_gifts:
-        # Delete the claims to that gift first
-        claims = c.query(Claim).filter_by(gift_id=gift.id).all()
-        for claim in claims:
-            c.delete(claim)
-        c.delete(gift)
+    # Other users' gifts this user claimed, to count their claims again
+    claimed_gift_ids = [gift_id for gift_id, in
+                        c.query(Claim.gift_id).filter_by(creator_id=user.id)
+                                              .distinct()]
+
+    # Delete the user's claims and the claims to their gifts,
+    # then their gifts, one statement each and in one transaction
+    user_gift_ids = c.query(Gift.id).filter_by(creator_id=user.id)
+    c.query(Claim).filter(or_(Claim.gift_id.in_(user_gift_ids.subquery()),
+                              Claim.creator_id == user.id)) \
+                  .delete(synchronize_session=False)
+    refresh_claim_counters(c, claimed_gift_ids)
+    search_index.remove(c, user_gift_ids)
+    c.query(Gift).filter_by(creator_id=user.id) \
+                 .delete(synchronize_session=False)
+
+    # Their archived gifts and claims go too
+    archived_gift_ids = select([gift_archive.c.id]) \
+        .where(gift_archive.c.creator_id == user.id)
+    c.execute(claim_archive.delete()
+                           .where(or_(claim_archive.c.gift_id.in_(archived_gift_ids),  # noqa
+                                      claim_archive.c.creator_id == user.id)))
+    c.execute(gift_archive.delete()
+                          .where(gift_archive.c.creator_id == user.id))
 
     c.delete(user)
     c.commit()
+    fragment_cache.invalidate_feed()
 
     flash("Your account was successfully deleted.")
 
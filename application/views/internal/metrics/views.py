@@ -0,0 +1,41 @@
+#!/usr/bin/env python
+
+"""Define the route Prometheus scrapes the app's metrics from."""
+
+from functools import wraps
+
+from flask import (request,
+                   abort,
+                   current_app,
+                   Response,
+                   Blueprint)
+
+from application.metrics import metrics
+
+internal_metrics_blueprint = Blueprint('internal_metrics', __name__)
+
+
+# DECORATORS
+
+def scrapers_only(f):
+    """Answer 404 unless enabled, and to METRICS_ALLOWED_ADDRESSES only
+    (decorator)."""
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        config = current_app.config
+        allowed = config['METRICS_ALLOWED_ADDRESSES']
+        if not config['METRICS_ENABLED'] or \
+                request.remote_addr not in allowed:
+            abort(404)
+        return f(*args, **kwargs)
+    return decorated_function
+
+
+# ROUTES
+
+@internal_metrics_blueprint.route('/metrics', methods=['GET'])
+@scrapers_only
+def get():
+    """Return the metrics of all processes in Prometheus' text format."""
+    return Response(metrics.render(),
+                    content_type='text/plain; version=0.0.4; charset=utf-8')
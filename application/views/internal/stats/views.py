@@ -0,0 +1,46 @@
+#!/usr/bin/env python
+
+"""Define routes for the app's internal statistics."""
+
+from functools import wraps
+
+from flask import (request,
+                   jsonify,
+                   abort,
+                   current_app,
+                   Blueprint)
+
+from application.instrumentation import query_stats
+
+internal_stats_blueprint = Blueprint('internal_stats', __name__)
+
+# Requests allowed to see the statistics
+LOCAL_ADDRESSES = ('127.0.0.1', '::1')
+
+
+# DECORATORS
+
+def local_only(f):
+    """Answer 404 unless enabled, and to local requests only (decorator)."""
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if not current_app.config['INTERNAL_STATS_ENABLED'] or \
+                request.remote_addr not in LOCAL_ADDRESSES:
+            abort(404)
+        return f(*args, **kwargs)
+    return decorated_function
+
+
+# ROUTES
+
+@internal_stats_blueprint.route('/_internal/stats', methods=['GET'])
+@local_only
+def get():
+    """Return this process's per-route request and SQL stats in json.
+
+    Add reset=1 as query string to start counting again afterwards.
+    """
+    stats = query_stats.snapshot()
+    if request.args.get('reset'):
+        query_stats.reset()
+    return jsonify({'routes': stats})
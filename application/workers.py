@@ -0,0 +1,83 @@
+"""Run a task periodically, in a thread of the web process or on its own.
+
+The mail outbox and the gift sweeper are both PeriodicWorkers: the web
+process runs them in a daemon thread when the config says so, from its
+first request on, otherwise their `flask` command runs them in the
+foreground.
+"""
+
+import logging
+import threading
+
+from application.metrics import metrics
+
+
+class PeriodicWorker(object):
+    """Call run_once every few seconds until stopped.
+
+    Subclasses set name (the thread's name), interval_key (the config
+    key of the number of seconds between two runs) and enabled_key (the
+    config key that runs them in the web process), and define run_once.
+    """
+
+    name = 'giftr-worker'
+    interval_key = None
+    enabled_key = None
+
+    def __init__(self):
+        self.app = None
+        self._wake_up = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start_on_first_request(self, app):
+        """Start in the background on the app's first request, if enabled.
+
+        Not when the app is built: commands (e.g. `flask init-db`) don't
+        need the thread, and it wouldn't survive a pre-forking server's
+        fork.
+
+        Argument:
+        app (object): the Flask app.
+        """
+        app.before_first_request(self.start_if_enabled)
+
+    def start_if_enabled(self):
+        """Start in the background if the config says so."""
+        if self.app.config[self.enabled_key]:
+            self.start()
+
+    def start(self):
+        """Start running in a background thread of this process."""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self.run, name=self.name)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """Ask the background thread to stop after its current run."""
+        self._stop.set()
+        self._wake_up.set()
+
+    def wake_up(self):
+        """Run now rather than at the next interval."""
+        self._wake_up.set()
+
+    def run(self):
+        """Call run_once every interval_key seconds until stopped."""
+        while not self._stop.is_set():
+            try:
+                with self.app.app_context():
+                    self.run_once()
+            except Exception:
+                logging.exception('%s failed.', self.name)
+            # Workers of their own process serve no request to flush on
+            metrics.maybe_flush()
+            self._wake_up.wait(self.app.config[self.interval_key])
+            self._wake_up.clear()
+
+    def run_once(self):
+        """Do the work once. Needs an application context."""
+        raise NotImplementedError
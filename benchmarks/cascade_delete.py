@@ -0,0 +1,100 @@
+#!/usr/bin/env python
+
+"""Count the statements and commits it takes to delete a gift or a user.
+
+Both should stay constant whatever the number of gifts and claims.
+
+Run it from the root directory of the project:
+    python benchmarks/cascade_delete.py
+"""
+
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from sqlalchemy import event
+
+
+def make_app(db_path):
+    """Return an app bound to a fresh database at db_path."""
+    os.environ['DATABASE_URL'] = 'sqlite:///%s' % db_path
+    from application import create_app
+    from application.migrations import create_schema
+    os.environ.setdefault('SECRET_KEY', 'benchmark')
+    app = create_app()
+    create_schema(app.extensions['sqlalchemy_engine'])
+    app.config['TESTING'] = True
+    return app
+
+
+def seed(session, gifts, claims_per_gift):
+    """Create a giver with gifts, claimed by another user, return both."""
+    from application.models import User, Category, Gift, Claim
+
+    giver = User(name='Giver', email='giver@example.com', oauth_id='giver')
+    taker = User(name='Taker', email='taker@example.com', oauth_id='taker')
+    category = Category(name='Stuff')
+    session.add_all([giver, taker, category])
+    session.flush()
+
+    for i in range(gifts):
+        gift = Gift(name='Gift %d' % i,
+                    creator_id=giver.id,
+                    category_id=category.id)
+        session.add(gift)
+        session.flush()
+        session.add_all([Claim(message='Me!',
+                               gift_id=gift.id,
+                               creator_id=taker.id)
+                         for j in range(claims_per_gift)])
+    session.commit()
+    return giver.id, taker.id
+
+
+def measure(gifts, claims_per_gift):
+    """Return the (statements, commits) of deleting a gift, then a user."""
+    from application.database import db_session
+
+    db_path = tempfile.mktemp(suffix='.db')
+    app = make_app(db_path)
+    with app.app_context():
+        giver_id, taker_id = seed(db_session, gifts, claims_per_gift)
+
+    counts = {'statements': 0, 'commits': 0}
+    engine = app.extensions['sqlalchemy_engine']
+
+    @event.listens_for(engine, 'before_cursor_execute')
+    def count_statement(*args):
+        counts['statements'] += 1
+
+    @event.listens_for(engine, 'commit')
+    def count_commit(*args):
+        counts['commits'] += 1
+
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['username'] = 'Giver'
+        session['user_id'] = giver_id
+
+    results = []
+    for url in ['/gifts/1/delete', '/users/%d/delete' % giver_id]:
+        counts['statements'] = counts['commits'] = 0
+        response = client.post(url)
+        assert response.status_code == 302, response.status_code
+        results.append((counts['statements'], counts['commits']))
+
+    os.remove(db_path)
+    return results
+
+
+if __name__ == '__main__':
+    print '%6s %8s | %-22s | %-22s' % ('gifts', 'claims', 'delete gift',
+                                      'delete user')
+    for gifts, claims_per_gift in [(1, 1), (10, 10), (100, 10), (100, 100)]:
+        gift_delete, user_delete = measure(gifts, claims_per_gift)
+        print '%6d %8d | %4d stmts, %2d commits | %4d stmts, %2d commits' % (
+            gifts, gifts * claims_per_gift,
+            gift_delete[0], gift_delete[1],
+            user_delete[0], user_delete[1])
@@ -0,0 +1,593 @@
+#!/usr/bin/env python
+
+"""Time every route of the web app and the API over a generated dataset.
+
+Seeds a fresh database with users, categories, gifts and claims drawn
+from skewed distributions (a few users create and claim most gifts, a
+few categories hold most of them, a few gifts get most claims, most
+gifts are past their date), then requests every route of the gifts,
+claims, categories and users blueprints and of the API through the
+Flask test client, anonymously or logged in. Reports, per route, the
+p50/p95/p99 latency, the queries per request and the throughput, and
+writes them to a JSON file that can be compared between commits.
+
+Run it from the root directory of the project:
+    python benchmarks/routes.py --output before.json
+    (check out another commit)
+    python benchmarks/routes.py --output after.json
+    python benchmarks/routes.py --compare before.json after.json
+"""
+
+import argparse
+import bisect
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import timeit
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from sqlalchemy import event, func, select
+
+WORDS = ('red blue green black white old new small big wooden metal '
+         'vintage broken shiny soft warm chair table lamp shoes boots '
+         'jacket book novel guitar piano bike helmet plant pot mug plate '
+         'sofa bed desk shelf radio camera phone toy puzzle game ball '
+         'rug mirror clock frame vase basket bag box').split()
+
+# The blueprints whose every route is benchmarked
+BLUEPRINTS = ('gifts', 'claims', 'categories', 'users',
+              'api_gifts', 'api_categories', 'api_claims', 'api_users')
+
+
+# DATA
+
+def skewed_picker(rng, items, skew=1.1):
+    """Return a function picking items, the first ones much more often.
+
+    The i-th item is picked with a weight of 1 / (i + 1) ** skew (Zipf).
+    """
+    cumulative = []
+    total = 0.0
+    for rank in range(len(items)):
+        total += 1.0 / (rank + 1) ** skew
+        cumulative.append(total)
+    return lambda: items[min(bisect.bisect(cumulative, rng.random() * total),
+                             len(items) - 1)]
+
+
+def words(rng, count):
+    """Return a few random words."""
+    return ' '.join(rng.choice(WORDS) for i in range(count))
+
+
+def seed(app, users, categories, gifts, claims, days, batch_size=10000):
+    """Fill the app's empty database, straight through the engine.
+
+    Gifts are created over the last days, and live for GIFT_LIFETIME:
+    the older ones are expired, or closed if a claim was accepted.
+
+    Arguments:
+    app (object): the Flask app.
+    users, categories, gifts, claims (int): the numbers of rows.
+    days (int): the age of the oldest gift.
+    """
+    from application.counters import refresh_claim_counters
+    from application.database import db_session
+    from application.models import User, Category, Gift, Claim
+    from application.models.gift import GIFT_LIFETIME
+    from application.search import search_index
+
+    engine = app.extensions['sqlalchemy_engine']
+    rng = random.Random(42)
+    now = datetime.utcnow()
+
+    engine.execute(User.__table__.insert(),
+                   [{'name': 'User %d' % i,
+                     'email': 'user%d@example.com' % i,
+                     'oauth_id': 'oauth%d' % i,
+                     'created_at': now - timedelta(days=days + 1)}
+                    for i in range(1, users + 1)])
+    engine.execute(Category.__table__.insert(),
+                   [{'name': 'Category %d' % i,
+                     'description': words(rng, 8)}
+                    for i in range(1, categories + 1)])
+
+    # Hot users and big categories come first
+    pick_creator = skewed_picker(rng, range(1, users + 1))
+    pick_category = skewed_picker(rng, range(1, categories + 1))
+
+    gift_rows = []
+    for start in range(0, gifts, batch_size):
+        rows = []
+        for i in range(start, min(start + batch_size, gifts)):
+            created_at = now - timedelta(seconds=rng.uniform(0, days * 86400))
+            expires_at = created_at + GIFT_LIFETIME
+            is_open = rng.random() > 0.1
+            if expires_at > now:
+                state = 'active'
+            else:
+                state = 'expired' if is_open else 'closed'
+            rows.append({'name': words(rng, 3),
+                         'description': words(rng, 12),
+                         'open': is_open,
+                         'created_at': created_at,
+                         'expires_at': expires_at,
+                         'state': state,
+                         'creator_id': pick_creator(),
+                         'category_id': pick_category()})
+        engine.execute(Gift.__table__.insert(), rows)
+        gift_rows.extend(rows)
+
+    # A few gifts get most claims, from the hot users
+    popular = range(len(gift_rows))
+    rng.shuffle(popular)
+    pick_gift = skewed_picker(rng, popular, skew=0.8)
+    pick_claimer = skewed_picker(rng, range(1, users + 1))
+    for start in range(0, claims, batch_size):
+        rows = []
+        for i in range(start, min(start + batch_size, claims)):
+            index = pick_gift()
+            gift = gift_rows[index]
+            creator_id = pick_claimer()
+            if creator_id == gift['creator_id']:
+                creator_id = creator_id % users + 1
+            created_at = min(now, gift['created_at'] + timedelta(
+                seconds=rng.uniform(0, GIFT_LIFETIME.total_seconds())))
+            rows.append({'message': words(rng, 6),
+                         'created_at': created_at,
+                         'gift_id': index + 1,
+                         'creator_id': creator_id})
+        engine.execute(Claim.__table__.insert(), rows)
+
+    # The closed gifts accepted their first claim
+    claim = Claim.__table__
+    first_claims = select([func.min(claim.c.id)]) \
+        .select_from(claim.join(Gift.__table__)) \
+        .where(Gift.__table__.c.open.is_(False)) \
+        .group_by(claim.c.gift_id)
+    engine.execute(claim.update()
+                        .where(claim.c.id.in_(first_claims))
+                        .values(accepted=True))
+
+    with app.app_context():
+        refresh_claim_counters(db_session)
+        search_index.rebuild(db_session)
+        db_session.commit()
+
+
+class Fixtures(object):
+    """The ids the scenarios request, found in the seeded database."""
+
+    def __init__(self, app):
+        from application.database import db_session
+        from application.models import User, Gift, Claim
+
+        self.app = app
+        c = db_session
+        with app.app_context():
+            live = [Gift.state == 'active', Gift.open.is_(True)]
+
+            # The logged in user: the one with the most gifts
+            self.member_id = c.query(Gift.creator_id) \
+                              .group_by(Gift.creator_id) \
+                              .order_by(func.count(Gift.id).desc()) \
+                              .first()[0]
+            self.member_gifts = ids(c.query(Gift.id)
+                                     .filter(Gift.creator_id == self.member_id,
+                                             Gift.claim_count > 0, *live)
+                                     .order_by(Gift.id))
+            self.dead_member_gifts = ids(
+                c.query(Gift.id)
+                 .filter(Gift.creator_id == self.member_id,
+                         Gift.state != 'active')
+                 .order_by(Gift.id.desc()))
+            self.other_gifts = ids(c.query(Gift.id)
+                                    .filter(Gift.creator_id != self.member_id,
+                                            *live)
+                                    .order_by(Gift.claim_count.desc()))
+            self.member_claims = c.query(Claim.gift_id, Claim.id) \
+                                  .join(Gift) \
+                                  .filter(Claim.creator_id == self.member_id,
+                                          *live) \
+                                  .order_by(Claim.id).all()
+            # Claims on the member's live gifts, one per gift
+            self.claims_to_accept = c.query(Claim.gift_id,
+                                            func.min(Claim.id)) \
+                                     .join(Gift) \
+                                     .filter(Gift.creator_id ==
+                                             self.member_id,
+                                             Gift.id != self.member_gifts[0],
+                                             *live) \
+                                     .group_by(Claim.gift_id).all()
+            self.hot_category_id = c.query(Gift.category_id) \
+                                    .group_by(Gift.category_id) \
+                                    .order_by(func.count(Gift.id).desc()) \
+                                    .first()[0]
+            # The least active users (the last ones), to be deleted
+            self.cold_users = ids(c.query(User.id)
+                                   .filter(User.id != self.member_id)
+                                   .order_by(User.id.desc()))
+
+    @property
+    def gift_id(self):
+        """A live gift of the member, with claims."""
+        return self.member_gifts[0]
+
+    def new_categories(self):
+        """The categories added by the categories.add_post scenario."""
+        from application.database import db_session
+        from application.models import Category
+        with self.app.app_context():
+            return ids(db_session.query(Category.id)
+                                 .filter(Category.name.like('Bench %'))
+                                 .order_by(Category.id))
+
+
+def ids(query):
+    """Return the first column of a query's rows."""
+    return [row[0] for row in query]
+
+
+# SCENARIOS
+#
+# (name, endpoint, method, targets): targets(fixtures, n) returns up to
+# n (url, form, user_id) tuples, one per request. user_id None requests
+# anonymously, 'member' as the fixtures' member. A scenario that uses
+# things up (e.g. deleting) returns as many targets as it has things.
+
+def repeat(url, form=None, user_id='member'):
+    """Return a targets function requesting the same url every time."""
+    def targets(f, n):
+        value = url(f) if callable(url) else url
+        return [(value, form, user_id)] * n
+    return targets
+
+
+def cycle(population, n):
+    """Return n items, going through population as many times as needed."""
+    return [population[i % len(population)] for i in range(n)]
+
+
+GIFT_FORM = {'name': 'Bench lamp', 'description': 'A lamp, barely used',
+             'picture': '', 'category': '1'}
+
+SCENARIOS = [
+    # Anonymous reads
+    ('feed', 'gifts.get', 'GET', repeat('/gifts', user_id=None)),
+    ('feed, hot category', 'gifts.get', 'GET',
+     repeat(lambda f: '/gifts?cat=%d' % f.hot_category_id, user_id=None)),
+    ('feed, search', 'gifts.get', 'GET',
+     repeat('/gifts?q=wooden+lamp', user_id=None)),
+    ('home', 'gifts.get', 'GET', repeat('/', user_id=None)),
+    ('gift', 'gifts.get_byid', 'GET',
+     lambda f, n: [('/gifts/%d' % g, None, None)
+                   for g in cycle(f.other_gifts, n)]),
+    ('gifts of a user', 'gifts.get_byuserid', 'GET',
+     repeat(lambda f: '/gifts/user/%d' % f.member_id, user_id=None)),
+    ('claims of a gift', 'claims.get', 'GET',
+     repeat(lambda f: '/gifts/%d/claims' % f.other_gifts[0],
+            user_id=None)),
+    ('all claims', 'claims.get_all', 'GET',
+     repeat('/gifts/claims', user_id=None)),
+    ('claim', 'claims.get_byid', 'GET',
+     lambda f, n: [('/gifts/%d/claims/%d' % claim, None, None)
+                   for claim in cycle(f.member_claims, n)]),
+    ('categories', 'categories.get', 'GET',
+     repeat('/categories', user_id=None)),
+    ('category', 'categories.get_byid', 'GET',
+     repeat(lambda f: '/categories/%d' % f.hot_category_id, user_id=None)),
+
+    # Logged in reads
+    ('feed, logged in', 'gifts.get', 'GET', repeat('/gifts')),
+    ('add gift form', 'gifts.add_get', 'GET', repeat('/gifts/add')),
+    ('edit gift form', 'gifts.edit_get', 'GET',
+     repeat(lambda f: '/gifts/%d/edit' % f.gift_id)),
+    ('delete gift form', 'gifts.delete_get', 'GET',
+     repeat(lambda f: '/gifts/%d/delete' % f.gift_id)),
+    ('add claim form', 'claims.add_get', 'GET',
+     repeat(lambda f: '/gifts/%d/claims/add' % f.other_gifts[0])),
+    ('edit claim form', 'claims.edit_get', 'GET',
+     repeat(lambda f: '/gifts/%d/claims/%d/edit' % f.member_claims[0])),
+    ('delete claim form', 'claims.delete_get', 'GET',
+     repeat(lambda f: '/gifts/%d/claims/%d/delete' % f.member_claims[0])),
+    ('add category form', 'categories.add_get', 'GET',
+     repeat('/categories/add')),
+    ('edit category form', 'categories.edit_get', 'GET',
+     repeat(lambda f: '/categories/%d/edit' % f.hot_category_id)),
+    ('delete category form', 'categories.delete_get', 'GET',
+     repeat(lambda f: '/categories/%d/delete' % f.hot_category_id)),
+    ('profile', 'users.get_byid', 'GET',
+     repeat(lambda f: '/users/%d/profile' % f.member_id)),
+    ('edit profile form', 'users.edit_get', 'GET',
+     repeat(lambda f: '/users/%d/edit' % f.member_id)),
+    ('delete profile form', 'users.delete_get', 'GET',
+     repeat(lambda f: '/users/%d/delete' % f.member_id)),
+
+    # API
+    ('api gifts', 'api_gifts.get', 'GET',
+     repeat('/api/gifts', user_id=None)),
+    ('api gifts, included', 'api_gifts.get', 'GET',
+     repeat('/api/gifts?include=category,creator,claims', user_id=None)),
+    ('api gifts, batch', 'api_gifts.get', 'GET',
+     repeat(lambda f: '/api/gifts?ids=%s'
+            % ','.join(str(g) for g in f.other_gifts[:50]), user_id=None)),
+    ('api gift', 'api_gifts.get_byid', 'GET',
+     lambda f, n: [('/api/gifts/%d?include=claims' % g, None, None)
+                   for g in cycle(f.other_gifts, n)]),
+    ('api gifts export', 'api_gifts.export', 'GET',
+     repeat('/api/gifts/export', user_id=None)),
+    ('api claims export', 'api_claims.export', 'GET',
+     repeat('/api/claims/export', user_id=None)),
+    ('api categories', 'api_categories.get', 'GET',
+     repeat('/api/categories', user_id=None)),
+    ('api category', 'api_categories.get_byid', 'GET',
+     repeat(lambda f: '/api/categories/%d' % f.hot_category_id,
+            user_id=None)),
+    ('api users, batch', 'api_users.get', 'GET',
+     repeat('/api/users?ids=%s' % ','.join(str(u) for u in range(1, 51)),
+            user_id=None)),
+
+    # Writes, the ones using things up last
+    ('add gift', 'gifts.add_post', 'POST', repeat('/gifts/add', GIFT_FORM)),
+    ('edit gift', 'gifts.edit_post', 'POST',
+     repeat(lambda f: '/gifts/%d/edit' % f.gift_id, GIFT_FORM)),
+    ('extend gift', 'gifts.extend', 'POST',
+     repeat(lambda f: '/gifts/%d/extend' % f.gift_id)),
+    ('add claim', 'claims.add_post', 'POST',
+     lambda f, n: [('/gifts/%d/claims/add' % g, {'message': 'Me!'}, 'member')
+                   for g in cycle(f.other_gifts, n)]),
+    ('edit claim', 'claims.edit_post', 'POST',
+     repeat(lambda f: '/gifts/%d/claims/%d/edit' % f.member_claims[0],
+            {'message': 'Me, please!'})),
+    ('add category', 'categories.add_post', 'POST',
+     repeat('/categories/add', {'name': 'Bench category',
+                                'description': '', 'picture': ''})),
+    ('edit category', 'categories.edit_post', 'POST',
+     repeat(lambda f: '/categories/%d/edit' % f.hot_category_id,
+            {'name': 'Category 1', 'description': '', 'picture': ''})),
+    ('edit profile', 'users.edit_post', 'POST',
+     repeat(lambda f: '/users/%d/edit' % f.member_id,
+            {'name': 'User 1', 'email': 'user1@example.com',
+             'picture': '', 'address': ''})),
+    ('accept claim', 'claims.accept_post', 'POST',
+     lambda f, n: [('/gifts/%d/claims/%d/accept' % claim, None, 'member')
+                   for claim in f.claims_to_accept[:n]]),
+    ('delete claim', 'claims.delete_post', 'POST',
+     lambda f, n: [('/gifts/%d/claims/%d/delete' % claim, None, 'member')
+                   for claim in f.member_claims[1:n + 1]]),
+    ('delete gift', 'gifts.delete_post', 'POST',
+     lambda f, n: [('/gifts/%d/delete' % g, None, 'member')
+                   for g in f.dead_member_gifts[:n]]),
+    ('delete category', 'categories.delete_post', 'POST',
+     lambda f, n: [('/categories/%d/delete' % cat, None, 'member')
+                   for cat in f.new_categories()[:n]]),
+    ('delete user', 'users.delete_post', 'POST',
+     lambda f, n: [('/users/%d/delete' % u, None, u)
+                   for u in f.cold_users[:n]]),
+]
+
+
+# MEASURES
+
+def percentile(values, p):
+    """Return the p-th percentile of values (nearest rank)."""
+    values = sorted(values)
+    rank = max(int(round(p / 100.0 * len(values) + 0.5)) - 1, 0)
+    return values[min(rank, len(values) - 1)]
+
+
+def log_in(client, user_id):
+    """Make the client's session that of a user, or anonymous if None."""
+    with client.session_transaction() as session:
+        session.clear()
+        if user_id is not None:
+            session['username'] = 'User %d' % user_id
+            session['email'] = 'user%d@example.com' % user_id
+            session['user_id'] = user_id
+            session['provider'] = 'google'
+
+
+def run_scenario(app, fixtures, scenario, requests, warmup, counter):
+    """Request a scenario's targets, return its measures as a dict."""
+    name, endpoint, method, targets = scenario
+    client = app.test_client()
+    targets = targets(fixtures, warmup + requests)
+
+    durations, queries, statuses = [], [], {}
+    for i, (url, form, user_id) in enumerate(targets):
+        log_in(client, fixtures.member_id if user_id == 'member'
+               else user_id)
+        counter[0] = 0
+        start = timeit.default_timer()
+        try:
+            response = client.open(url, method=method, data=form)
+            response.get_data()
+            status = str(response.status_code)
+        except Exception as e:
+            # A broken route is reported, it doesn't stop the benchmark
+            status = 'error: %s' % e
+        duration = timeit.default_timer() - start
+        if i < warmup:
+            continue
+        durations.append(duration * 1000)
+        queries.append(counter[0])
+        statuses[status] = statuses.get(status, 0) + 1
+
+    if not durations:
+        return {'endpoint': endpoint, 'method': method, 'requests': 0}
+    return {'endpoint': endpoint,
+            'method': method,
+            'url': targets[-1][0],
+            'requests': len(durations),
+            'statuses': statuses,
+            'p50_ms': round(percentile(durations, 50), 3),
+            'p95_ms': round(percentile(durations, 95), 3),
+            'p99_ms': round(percentile(durations, 99), 3),
+            'mean_ms': round(sum(durations) / len(durations), 3),
+            'queries_per_request': round(float(sum(queries)) /
+                                         len(queries), 2),
+            'max_queries': max(queries),
+            'requests_per_second': round(len(durations) * 1000 /
+                                         sum(durations), 1)}
+
+
+def make_app(db_path):
+    """Return an app bound to a fresh database at db_path."""
+    os.environ['DATABASE_URL'] = 'sqlite:///%s' % db_path
+    from application import create_app
+    from application.migrations import create_schema
+
+    os.environ.setdefault('SECRET_KEY', 'benchmark')
+    app = create_app()
+    create_schema(app.extensions['sqlalchemy_engine'])
+    # Background threads would skew the timings
+    app.config['MAIL_OUTBOX_WORKER'] = False
+    app.config['GIFT_SWEEPER_WORKER'] = False
+    app.config['TESTING'] = True
+    # The scenarios post forms without going through their page first
+    app.config['CSRF_ENABLED'] = False
+    app.extensions['mail'].suppress = True
+    return app
+
+
+def git_commit():
+    """Return the current commit's hash, None outside of a git checkout."""
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'],
+                                       cwd=os.path.dirname(__file__) or '.',
+                                       stderr=open(os.devnull, 'w')).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def benchmark(args):
+    """Seed a database, run the scenarios, write and print the results."""
+    if args.database and os.path.exists(args.database):
+        sys.exit('%s already exists: the benchmark needs an empty '
+                 'database.' % args.database)
+    db_path = args.database or tempfile.mktemp(suffix='.db')
+    app = make_app(db_path)
+
+    start = time.time()
+    seed(app, args.users, args.categories, args.gifts, args.claims,
+         args.days)
+    print 'Generated %d users, %d categories, %d gifts and %d claims ' \
+          'in %.1fs' % (args.users, args.categories, args.gifts,
+                        args.claims, time.time() - start)
+    fixtures = Fixtures(app)
+
+    counter = [0]
+
+    @event.listens_for(app.extensions['sqlalchemy_engine'],
+                       'before_cursor_execute')
+    def count_query(*args):
+        counter[0] += 1
+
+    only = set(args.only.split(',')) if args.only else None
+    results = {}
+    print '%-24s %7s %9s %9s %9s %8s %8s' % (
+        'route', 'status', 'p50 (ms)', 'p95 (ms)', 'p99 (ms)', 'queries',
+        'req/s')
+    for scenario in SCENARIOS:
+        if only and scenario[1] not in only and scenario[0] not in only:
+            continue
+        result = run_scenario(app, fixtures, scenario, args.requests,
+                              args.warmup, counter)
+        results[scenario[0]] = result
+        if not result['requests']:
+            print '%-24s %7s' % (scenario[0], 'skipped')
+            continue
+        print '%-24s %7s %9.2f %9.2f %9.2f %8.1f %8.1f' % (
+            scenario[0], ','.join(sorted(status[:5]
+                                         for status in result['statuses'])),
+            result['p50_ms'], result['p95_ms'], result['p99_ms'],
+            result['queries_per_request'], result['requests_per_second'])
+
+    # Every route of the benchmarked blueprints should have a scenario
+    covered = set(scenario[1] for scenario in SCENARIOS)
+    missing = sorted(rule.endpoint for rule in app.url_map.iter_rules()
+                     if rule.endpoint.split('.')[0] in BLUEPRINTS and
+                     rule.endpoint not in covered)
+    if missing:
+        print 'Routes without a scenario: %s' % ', '.join(missing)
+
+    report = {'commit': git_commit(),
+              'date': datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%SZ'),
+              'python': platform.python_version(),
+              'data': {'users': args.users,
+                       'categories': args.categories,
+                       'gifts': args.gifts,
+                       'claims': args.claims,
+                       'days': args.days},
+              'requests': args.requests,
+              'routes': results}
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+        f.write('\n')
+    print 'Results written to %s' % args.output
+
+    if not args.database:
+        os.remove(db_path)
+
+
+def compare(before_path, after_path):
+    """Print the changes between two result files."""
+    with open(before_path) as f:
+        before = json.load(f)
+    with open(after_path) as f:
+        after = json.load(f)
+    print '%s -> %s' % (before.get('commit'), after.get('commit'))
+    print '%-24s %19s %19s %15s' % ('route', 'p50 (ms)', 'p95 (ms)',
+                                    'queries')
+    for name in sorted(set(before['routes']) | set(after['routes'])):
+        old = before['routes'].get(name, {})
+        new = after['routes'].get(name, {})
+        if not old.get('requests') or not new.get('requests'):
+            print '%-24s %19s' % (name, 'only in one file')
+            continue
+        print '%-24s %8.2f -> %7.2f %8.2f -> %7.2f %6.1f -> %5.1f' % (
+            name, old['p50_ms'], new['p50_ms'], old['p95_ms'],
+            new['p95_ms'], old['queries_per_request'],
+            new['queries_per_request'])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--categories', type=int, default=20)
+    parser.add_argument('--gifts', type=int, default=20000)
+    parser.add_argument('--claims', type=int, default=50000)
+    parser.add_argument('--days', type=int, default=30,
+                        help='age of the oldest gift, most gifts are '
+                             'expired when it is well above 5')
+    parser.add_argument('--requests', type=int, default=50,
+                        help='measured requests per route')
+    parser.add_argument('--warmup', type=int, default=2,
+                        help='requests per route before measuring')
+    parser.add_argument('--only', help='comma-separated scenario names or '
+                                       'endpoints to run, e.g. gifts.get')
+    parser.add_argument('--database',
+                        help='SQLite file to seed and keep, a temporary '
+                             'one by default (it must not exist yet)')
+    parser.add_argument('--output', default='benchmark-results.json',
+                        help='the JSON file to write the results to')
+    parser.add_argument('--compare', nargs=2, metavar=('BEFORE', 'AFTER'),
+                        help='print the changes between two result files '
+                             'instead of benchmarking')
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+    else:
+        benchmark(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,130 @@
+#!/usr/bin/env python
+
+"""Time gift searches over a generated catalogue, FTS5 index vs LIKE.
+
+Run it from the root directory of the project:
+    python benchmarks/search.py --gifts 1000000
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+WORDS = ('red blue green black white old new small big wooden metal '
+         'vintage broken shiny soft warm chair table lamp shoes boots '
+         'jacket book novel guitar piano bike helmet plant pot mug plate '
+         'sofa bed desk shelf radio camera phone toy puzzle game ball '
+         'rug mirror clock frame vase basket bag box').split()
+
+SEARCHES = ['lamp', 'red chair', 'vin', 'wooden table lamp', 'zebra']
+
+SYLLABLES = 'ba ko ri te lu ma no si da fe go hi'.split()
+
+
+def make_vocabulary(size=20000):
+    """Return WORDS followed by made-up words, most frequent first."""
+    vocabulary = list(WORDS)
+    for i in range(size):
+        word, n = '', i
+        while True:
+            word += SYLLABLES[n % len(SYLLABLES)]
+            n //= len(SYLLABLES)
+            if not n:
+                break
+        vocabulary.append(word + 'x')
+    return vocabulary
+
+
+VOCABULARY = make_vocabulary()
+
+
+def sentence(rng, words):
+    """Return a few random words, frequent words are much more likely."""
+    last = len(VOCABULARY) - 1
+    return ' '.join(VOCABULARY[min(int(rng.expovariate(1.0 / 2000)), last)]
+                    for i in range(words))
+
+
+def seed(engine, gifts, batch_size=10000):
+    """Insert users, categories and gifts straight through the engine."""
+    from application.models import User, Category, Gift
+
+    rng = random.Random(42)
+    engine.execute(User.__table__.insert(),
+                   [{'name': 'User %d' % i, 'email': 'user%d@example.com' % i}
+                    for i in range(100)])
+    engine.execute(Category.__table__.insert(),
+                   [{'name': 'Category %d' % i} for i in range(10)])
+
+    for start in range(0, gifts, batch_size):
+        rows = [{'name': sentence(rng, 3),
+                 'description': sentence(rng, 12),
+                 'creator_id': rng.randint(1, 100),
+                 'category_id': rng.randint(1, 10)}
+                for i in range(start, min(start + batch_size, gifts))]
+        engine.execute(Gift.__table__.insert(), rows)
+
+
+def time_searches(backend, engine, repeat):
+    """Return the median time of each search, in milliseconds."""
+    from sqlalchemy.orm import Session
+
+    session = Session(bind=engine)
+    timings = []
+    for text in SEARCHES:
+        durations = []
+        for i in range(repeat):
+            start = time.time()
+            backend.search(session, text, limit=25)
+            durations.append((time.time() - start) * 1000)
+        timings.append((text, sorted(durations)[len(durations) // 2]))
+    session.close()
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--gifts', type=int, default=1000000,
+                        help='number of gifts to generate')
+    parser.add_argument('--repeat', type=int, default=5,
+                        help='runs of each search, the median is reported')
+    args = parser.parse_args()
+
+    db_path = tempfile.mktemp(suffix='.db')
+    os.environ['DATABASE_URL'] = 'sqlite:///%s' % db_path
+
+    from application import create_app
+    from application.migrations import create_schema
+    from application.search.backends import LikeBackend, SQLiteFTSBackend
+
+    os.environ.setdefault('SECRET_KEY', 'benchmark')
+    app = create_app()
+    engine = app.extensions['sqlalchemy_engine']
+    create_schema(engine)
+
+    start = time.time()
+    seed(engine, args.gifts)
+    print 'Generated %d gifts in %.1fs' % (args.gifts, time.time() - start)
+
+    fts = SQLiteFTSBackend()
+    start = time.time()
+    with engine.begin() as connection:
+        fts.rebuild(connection)
+    print 'Indexed them in %.1fs' % (time.time() - start)
+
+    print '%-20s %12s %12s' % ('search', 'fts5 (ms)', 'like (ms)')
+    fts_timings = time_searches(fts, engine, args.repeat)
+    like_timings = time_searches(LikeBackend(), engine, args.repeat)
+    for (text, fts_ms), (text, like_ms) in zip(fts_timings, like_timings):
+        print '%-20s %12.2f %12.2f' % (text, fts_ms, like_ms)
+
+    os.remove(db_path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,200 @@
+#!/usr/bin/env python
+
+"""Time the app's cold start: imports, create_app and first requests.
+
+Every run is a fresh python process, so that nothing is imported or
+cached yet. It times, in that process, importing the application
+package, building the app with create_app, then the first and second
+requests to the feed (/gifts) and to the API (/api/gifts), which
+compile templates and fill caches. The parent process also times the
+whole child, interpreter start and exit included. Reports the median
+and the slowest run of each phase, and writes them to a JSON file that
+can be compared between commits.
+
+Run it from the root directory of the project:
+    python benchmarks/startup.py --output before.json
+    (check out another commit)
+    python benchmarks/startup.py --output after.json
+    python benchmarks/startup.py --compare before.json after.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import timeit
+from datetime import datetime
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+
+# In the order they happen
+PHASES = ['import_ms', 'create_app_ms', 'first_request_ms',
+          'second_request_ms', 'first_api_request_ms',
+          'second_api_request_ms', 'process_ms']
+
+
+def child():
+    """Time one cold start, print the timings as JSON."""
+    timings = {}
+
+    start = timeit.default_timer()
+    from application import create_app
+    timings['import_ms'] = (timeit.default_timer() - start) * 1000
+
+    start = timeit.default_timer()
+    app = create_app()
+    timings['create_app_ms'] = (timeit.default_timer() - start) * 1000
+    # Background threads would skew the timings
+    app.config['MAIL_OUTBOX_WORKER'] = False
+    app.config['GIFT_SWEEPER_WORKER'] = False
+
+    client = app.test_client()
+    for name, path in [('request', '/gifts'), ('api_request', '/api/gifts')]:
+        for attempt in ('first', 'second'):
+            start = timeit.default_timer()
+            response = client.get(path)
+            timings['%s_%s_ms' % (attempt, name)] = \
+                (timeit.default_timer() - start) * 1000
+            if response.status_code != 200:
+                sys.exit('%s answered %d.' % (path, response.status_code))
+
+    timings['modules'] = len(sys.modules)
+    print json.dumps(timings)
+    sys.stdout.flush()
+    # Don't wait for the app's threads and pools to wind down
+    os._exit(0)
+
+
+def seed(db_path):
+    """Create the database's tables and a few rows for the pages."""
+    os.environ['DATABASE_URL'] = 'sqlite:///%s' % db_path
+    # Also passed on to the children
+    os.environ.setdefault('SECRET_KEY', 'benchmark')
+    from application import create_app
+    from application.database import db_session
+    from application.migrations import create_schema
+    from application.models import User, Category, Gift
+
+    app = create_app()
+    create_schema(app.extensions['sqlalchemy_engine'])
+    with app.app_context():
+        user = User(name='Giver', email='giver@example.com',
+                    oauth_id='giver')
+        category = Category(name='Stuff')
+        db_session.add_all([user, category])
+        db_session.flush()
+        for i in range(30):
+            db_session.add(Gift(name='Gift %d' % i,
+                                description='A gift to start with.',
+                                creator_id=user.id,
+                                category_id=category.id))
+        db_session.commit()
+
+
+def run_child(db_path):
+    """Time a cold start in a new process, return its timings."""
+    env = dict(os.environ, DATABASE_URL='sqlite:///%s' % db_path)
+    start = timeit.default_timer()
+    output = subprocess.check_output(
+        [sys.executable, os.path.abspath(__file__), '--child'],
+        cwd=ROOT, env=env)
+    timings = json.loads(output.strip().splitlines()[-1])
+    timings['process_ms'] = (timeit.default_timer() - start) * 1000
+    return timings
+
+
+def git_commit():
+    """Return the current commit's hash, None outside of a git checkout."""
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'],
+                                       cwd=ROOT,
+                                       stderr=open(os.devnull, 'w')).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def median(values):
+    values = sorted(values)
+    middle = len(values) // 2
+    if len(values) % 2:
+        return values[middle]
+    return (values[middle - 1] + values[middle]) / 2.0
+
+
+def benchmark(args):
+    """Seed a database, time the cold starts, write and print the results."""
+    db_path = tempfile.mktemp(suffix='.db')
+    seed(db_path)
+
+    runs = [run_child(db_path) for i in range(args.runs)]
+
+    results = {}
+    print '%-24s %12s %12s' % ('phase', 'median (ms)', 'max (ms)')
+    for phase in PHASES:
+        values = [run[phase] for run in runs]
+        results[phase] = {'median': round(median(values), 2),
+                          'max': round(max(values), 2)}
+        print '%-24s %12.2f %12.2f' % (phase, results[phase]['median'],
+                                       results[phase]['max'])
+    print 'Modules loaded: %d' % runs[-1]['modules']
+
+    report = {'commit': git_commit(),
+              'date': datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%SZ'),
+              'python': platform.python_version(),
+              'runs': args.runs,
+              'modules': runs[-1]['modules'],
+              'phases': results}
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+        f.write('\n')
+    print 'Results written to %s' % args.output
+
+    os.remove(db_path)
+
+
+def compare(before_path, after_path):
+    """Print the changes between two result files."""
+    with open(before_path) as f:
+        before = json.load(f)
+    with open(after_path) as f:
+        after = json.load(f)
+    print '%s -> %s' % (before.get('commit'), after.get('commit'))
+    print '%-24s %21s' % ('phase', 'median (ms)')
+    for phase in PHASES:
+        old = before['phases'].get(phase)
+        new = after['phases'].get(phase)
+        if not old or not new:
+            print '%-24s %21s' % (phase, 'only in one file')
+            continue
+        print '%-24s %9.2f -> %8.2f' % (phase, old['median'], new['median'])
+    print '%-24s %9d -> %8d' % ('modules', before['modules'],
+                                after['modules'])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=10,
+                        help='cold starts to time, each in a new process')
+    parser.add_argument('--output', default='startup-results.json',
+                        help='the JSON file to write the results to')
+    parser.add_argument('--compare', nargs=2, metavar=('BEFORE', 'AFTER'),
+                        help='print the changes between two result files '
+                             'instead of benchmarking')
+    parser.add_argument('--child', action='store_true',
+                        help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child()
+    elif args.compare:
+        compare(*args.compare)
+    else:
+        benchmark(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,22 @@
+"""Settings of gunicorn: gunicorn -c gunicorn.conf.py wsgi:app
+
+The master process imports wsgi.py, so builds and warms up the app,
+once; the workers are forked from it and share that memory.
+"""
+
+import multiprocessing
+import os
+
+bind = os.environ.get('GIFTR_BIND', '127.0.0.1:8080')
+workers = int(os.environ.get('WEB_CONCURRENCY',
+                             multiprocessing.cpu_count() * 2 + 1))
+preload_app = True
+# Let a slow export stream, but not hang forever
+timeout = 120
+
+
+def post_fork(server, worker):
+    """Give each worker its own database connections, metrics and threads."""
+    from application.server import after_fork
+    from wsgi import app
+    after_fork(app)
@@ -0,0 +1,70 @@
+"""Fixtures shared by the tests: an app on a database of its own.
+
+Run the tests from the root directory of the project: python -m pytest
+"""
+
+import os
+import shutil
+import tempfile
+
+import pytest
+
+from application import create_app
+from application.database import db_session
+from application.migrations import create_schema
+from application.models import User, Category, Gift
+
+
+@pytest.fixture
+def app(monkeypatch):
+    """Return an app of the testing profile, on a new SQLite database."""
+    directory = tempfile.mkdtemp()
+    monkeypatch.setenv('DATABASE_URL',
+                       'sqlite:///%s' % os.path.join(directory, 'giftr.db'))
+    app = create_app('testing')
+    engine = app.extensions['sqlalchemy_engine']
+    create_schema(engine)
+
+    yield app
+
+    db_session.remove()
+    engine.dispose()
+    shutil.rmtree(directory)
+
+
+@pytest.fixture
+def engine(app):
+    """Return the app's engine."""
+    return app.extensions['sqlalchemy_engine']
+
+
+@pytest.fixture
+def client(app):
+    """Return a test client of the app."""
+    return app.test_client()
+
+
+@pytest.fixture
+def data(app):
+    """Add two users, two categories and gifts, return them by name.
+
+    Giver has 12 gifts in each category, Taker has none.
+    """
+    with app.app_context():
+        giver = User(name='Giver', email='giver@example.com',
+                     oauth_id='giver')
+        taker = User(name='Taker', email='taker@example.com',
+                     oauth_id='taker')
+        books = Category(name='Books')
+        toys = Category(name='Toys')
+        db_session.add_all([giver, taker, books, toys])
+        db_session.flush()
+        for category in (books, toys):
+            for i in range(12):
+                db_session.add(Gift(name='%s %d' % (category.name, i),
+                                    description='A gift.',
+                                    creator_id=giver.id,
+                                    category_id=category.id))
+        db_session.commit()
+        return {'giver': giver.id, 'taker': taker.id,
+                'books': books.id, 'toys': toys.id}
@@ -0,0 +1,79 @@
+"""Helpers of the tests."""
+
+from contextlib import contextmanager
+
+from sqlalchemy import event
+
+
+@contextmanager
+def recorded_statements(engine):
+    """Record the SQL statements sent to the database in the block.
+
+    Yield the list of the (statement, parameters) sent, filled as they
+    go through the engine's before_cursor_execute event.
+
+    Argument:
+    engine (object): the app's engine.
+    """
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append((statement, parameters))
+
+    event.listen(engine, 'before_cursor_execute', record)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, 'before_cursor_execute', record)
+
+
+def query_plan(engine, statement, parameters):
+    """Return SQLite's plan of a statement, one line per step.
+
+    Arguments:
+    engine (object): an engine bound to a SQLite database.
+    statement (str): the statement, as sent to the database.
+    parameters (tuple): its parameters.
+    """
+    connection = engine.raw_connection()
+    try:
+        cursor = connection.cursor()
+        cursor.execute('EXPLAIN QUERY PLAN ' + statement, parameters)
+        # The step's description comes last
+        return [row[-1] for row in cursor.fetchall()]
+    finally:
+        connection.close()
+
+
+@contextmanager
+def assert_max_queries(engine, count):
+    """Fail if the block sends more than count statements to the database.
+
+    Yield the list of the (statement, parameters) sent, like
+    recorded_statements.
+
+    Arguments:
+    engine (object): the app's engine.
+    count (int): the most statements the block may send.
+    """
+    with recorded_statements(engine) as statements:
+        yield statements
+    assert len(statements) <= count, \
+        '%d statements, expected %d at most:\n%s' % (
+            len(statements), count,
+            '\n'.join(statement for statement, parameters in statements))
+
+
+def log_in(client, user_id, name='Giver'):
+    """Log a test client in as a user, without an OAuth provider.
+
+    Arguments:
+    client (object): a test client of the app.
+    user_id (int): the id of the user.
+    name (str): the user's name.
+    """
+    with client.session_transaction() as session:
+        session['username'] = name
+        session['user_id'] = user_id
+        session['email'] = '%s@example.com' % name.lower()
+        session['provider'] = 'google'
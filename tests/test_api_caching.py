@@ -0,0 +1,58 @@
+"""The API's ETags and 304 Not Modified answers."""
+
+from application.database import db_session
+from application.models import Gift
+from tests.helpers import recorded_statements
+
+
+def version_lookups(statements):
+    return [statement for statement, parameters in statements
+            if 'table_version' in statement]
+
+
+def test_a_404_looks_up_no_version(client, engine, data):
+    with recorded_statements(engine) as statements:
+        response = client.get('/api/gifts/9999')
+
+    assert response.status_code == 404
+    assert 'ETag' not in response.headers
+    assert version_lookups(statements) == []
+
+
+def test_an_error_looks_up_no_version(client, engine, data):
+    with recorded_statements(engine) as statements:
+        response = client.get('/api/gifts/1?include=owner')
+
+    assert response.status_code == 400
+    assert version_lookups(statements) == []
+
+
+def test_the_etag_answers_304_until_the_table_changes(app, client, engine,
+                                                      data):
+    etag = client.get('/api/gifts/1').headers['ETag']
+
+    with recorded_statements(engine) as statements:
+        response = client.get('/api/gifts/1',
+                              headers={'If-None-Match': etag})
+    assert response.status_code == 304
+    assert response.headers['ETag'] == etag
+    # The view didn't run
+    assert len(statements) == len(version_lookups(statements)) == 1
+
+    with app.app_context():
+        db_session.query(Gift).get(1).name = 'Renamed'
+        db_session.commit()
+
+    response = client.get('/api/gifts/1', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
+    assert client.get('/api/gifts/1', headers={
+        'If-None-Match': response.headers['ETag']}).status_code == 304
+
+
+def test_a_stale_etag_gets_the_same_etag_as_a_first_request(client, data):
+    response = client.get('/api/gifts/1', headers={'If-None-Match': '"old"'})
+
+    assert response.status_code == 200
+    assert response.headers['ETag'] == \
+        client.get('/api/gifts/1').headers['ETag']
@@ -0,0 +1,83 @@
+"""/api/gifts/<id> with sparse fieldsets and include=."""
+
+import itertools
+import json
+
+import pytest
+
+INCLUDES = ('category', 'claims', 'creator')
+
+
+def every_include():
+    """Return every include= value: '', 'category', ..., all three."""
+    return [','.join(names)
+            for count in range(len(INCLUDES) + 1)
+            for names in itertools.combinations(INCLUDES, count)]
+
+
+def claimed_gift(app, data, claimed=True):
+    """Return the id of one of Giver's gifts, claimed by Taker if asked."""
+    from application.database import db_session
+    from application.models import Claim, Gift
+
+    with app.app_context():
+        gift = db_session.query(Gift).order_by(Gift.id).first()
+        if claimed:
+            db_session.add(Claim(message='Me please.', gift_id=gift.id,
+                                 creator_id=data['taker']))
+            db_session.commit()
+        return gift.id
+
+
+def get_gift(client, gift_id, query=''):
+    response = client.get('/api/gifts/%d?%s' % (gift_id, query))
+    assert response.status_code == 200
+    return json.loads(response.data)
+
+
+@pytest.mark.parametrize('include', every_include())
+@pytest.mark.parametrize('claimed', [True, False])
+def test_get_byid_includes(app, client, data, include, claimed):
+    gift_id = claimed_gift(app, data, claimed)
+    body = get_gift(client, gift_id, 'include=' + include)
+    includes = set(include.split(',')) - set([''])
+
+    gift = body['gift']
+    assert gift['id'] == gift_id
+    assert gift['creator_id'] == data['giver']
+
+    if 'claims' in includes:
+        assert [claim['creator_id'] for claim in gift['claims']] == \
+            ([data['taker']] if claimed else [])
+    else:
+        assert 'claims' not in gift
+
+    included = body.get('included', {})
+    assert set(included) == \
+        set({'category': 'categories', 'creator': 'users'}[name]
+            for name in includes if name != 'claims')
+    if 'category' in includes:
+        assert [category['id'] for category in included['categories']] == \
+            [gift['category_id']]
+    if 'creator' in includes:
+        # The gift's creator, never its claimant
+        assert [user['id'] for user in included['users']] == [data['giver']]
+
+
+def test_get_byid_fields_with_includes(app, client, data):
+    gift_id = claimed_gift(app, data)
+
+    body = get_gift(client, gift_id,
+                    'fields[gift]=name&fields[claim]=message'
+                    '&include=claims,creator')
+
+    assert body['gift'] == {'name': 'Books 0',
+                            'claims': [{'message': 'Me please.'}]}
+    assert [user['id'] for user in body['included']['users']] == \
+        [data['giver']]
+
+
+def test_get_byid_unknown_include(client, data):
+    response = client.get('/api/gifts/1?include=owner')
+
+    assert response.status_code == 400
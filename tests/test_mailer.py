@@ -0,0 +1,213 @@
+"""The mail outbox, sent to a local SMTP server."""
+
+import asyncore
+import smtpd
+import socket
+import threading
+from datetime import datetime, timedelta
+
+import pytest
+
+from application import mail
+from application.database import db_session
+from application.mailer import enqueue_mail, mail_sender
+from application.models import OutboundMail
+
+
+class SMTPStub(smtpd.SMTPServer):
+    """Like smtpd.DebuggingServer, but keeps the mails instead of printing.
+
+    Rejects the mails to an address starting with "bounce".
+    """
+
+    def __init__(self):
+        smtpd.SMTPServer.__init__(self, ('127.0.0.1', 0), None)
+        self.port = self.socket.getsockname()[1]
+        self.connections = 0
+        self.mails = []
+
+    def handle_accept(self):
+        self.connections += 1
+        smtpd.SMTPServer.handle_accept(self)
+
+    def process_message(self, peer, mailfrom, rcpttos, data):
+        if any(rcpt.startswith('bounce') for rcpt in rcpttos):
+            return '550 No such user'
+        self.mails.append((mailfrom, rcpttos, data))
+
+
+@pytest.fixture
+def smtp(app):
+    """Start the SMTP stub, have Flask-Mail send to it for real."""
+    server = SMTPStub()
+    stopped = threading.Event()
+
+    def serve():
+        while not stopped.is_set():
+            asyncore.loop(timeout=0.05, count=1)
+
+    thread = threading.Thread(target=serve)
+    thread.daemon = True
+    thread.start()
+
+    use_port(app, server.port)
+    yield server
+
+    stopped.set()
+    thread.join()
+    # The server and its connections
+    asyncore.close_all()
+
+
+def use_port(app, port):
+    """Send the mails to 127.0.0.1:port (Flask-Mail reads it at init)."""
+    app.config.update(MAIL_SERVER='127.0.0.1', MAIL_PORT=port,
+                      MAIL_USE_SSL=False, MAIL_USE_TLS=False,
+                      MAIL_USERNAME=None, MAIL_PASSWORD=None,
+                      MAIL_SUPPRESS_SEND=False)
+    mail.init_app(app)
+
+
+def closed_port():
+    """Return a local port nothing listens on."""
+    sock = socket.socket()
+    sock.bind(('127.0.0.1', 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return port
+
+
+def enqueue(app, *recipients):
+    """Queue a mail to each recipient, return their ids."""
+    with app.app_context():
+        mails = [enqueue_mail(db_session, 'Your gift', 'giftr@example.com',
+                              [recipient], 'It has been claimed.')
+                 for recipient in recipients]
+        db_session.commit()
+        return [m.id for m in mails]
+
+
+def outbox(app):
+    """Return the outbox's mails by id."""
+    with app.app_context():
+        mails = db_session.query(OutboundMail).all()
+        db_session.expunge_all()
+        return dict((m.id, m) for m in mails)
+
+
+def make_due(app):
+    """Make the scheduled retries and the leased mails due now."""
+    with app.app_context():
+        db_session.query(OutboundMail) \
+                  .update({'next_attempt_at': datetime.utcnow() -
+                           timedelta(seconds=1)})
+        db_session.commit()
+
+
+def send_pending(app):
+    with app.app_context():
+        return mail_sender.send_pending()
+
+
+def test_batch_is_sent_over_one_connection(app, smtp):
+    ids = enqueue(app, 'a@example.com', 'b@example.com', 'c@example.com')
+
+    assert send_pending(app) == 3
+
+    assert smtp.connections == 1
+    assert sorted(rcpttos for mailfrom, rcpttos, data in smtp.mails) == \
+        [['a@example.com'], ['b@example.com'], ['c@example.com']]
+    mails = outbox(app)
+    for mail_id in ids:
+        assert mails[mail_id].status == 'sent'
+        assert mails[mail_id].sent_at is not None
+    # Nothing left to send
+    assert send_pending(app) == 0
+
+
+def test_rejected_mail_is_retried_with_backoff(app, smtp):
+    app.config.update(MAIL_OUTBOX_RETRY_DELAY=30, MAIL_OUTBOX_MAX_ATTEMPTS=3)
+    good, bounce = enqueue(app, 'a@example.com', 'bounce@example.com')
+
+    # The others of the batch still go
+    before = datetime.utcnow()
+    assert send_pending(app) == 1
+    mails = outbox(app)
+    assert mails[good].status == 'sent'
+    assert mails[bounce].status == 'pending'
+    assert mails[bounce].attempts == 1
+    assert '550' in mails[bounce].last_error
+    assert mails[bounce].next_attempt_at >= before + timedelta(seconds=30)
+    assert mails[bounce].next_attempt_at < before + timedelta(seconds=60)
+
+    # Not before its retry is due
+    assert send_pending(app) == 0
+    assert outbox(app)[bounce].attempts == 1
+
+    # Then the delay doubles
+    make_due(app)
+    before = datetime.utcnow()
+    send_pending(app)
+    retried = outbox(app)[bounce]
+    assert retried.attempts == 2
+    assert retried.next_attempt_at >= before + timedelta(seconds=60)
+
+    # Until MAIL_OUTBOX_MAX_ATTEMPTS
+    make_due(app)
+    send_pending(app)
+    assert outbox(app)[bounce].status == 'failed'
+    assert outbox(app)[bounce].attempts == 3
+    make_due(app)
+    assert send_pending(app) == 0
+    assert outbox(app)[bounce].attempts == 3
+
+
+def test_unreachable_server_retries_the_batch(app):
+    use_port(app, closed_port())
+    ids = enqueue(app, 'a@example.com', 'b@example.com')
+
+    assert send_pending(app) == 0
+
+    mails = outbox(app)
+    for mail_id in ids:
+        assert mails[mail_id].status == 'pending'
+        assert mails[mail_id].attempts == 1
+        assert mails[mail_id].last_error
+
+
+def test_leased_mails_wait_for_the_lease(app, smtp):
+    app.config['MAIL_OUTBOX_LEASE'] = 300
+    ids = enqueue(app, 'a@example.com', 'b@example.com')
+
+    # Another sender reserves the batch, then dies before sending it
+    with app.app_context():
+        claimed = mail_sender._claim_batch(10, 300)
+        assert sorted(m.id for m in claimed) == sorted(ids)
+    mails = outbox(app)
+    for mail_id in ids:
+        assert mails[mail_id].status == 'sending'
+        assert mails[mail_id].next_attempt_at > \
+            datetime.utcnow() + timedelta(seconds=290)
+
+    # Nobody else sends them during the lease
+    assert send_pending(app) == 0
+    assert smtp.mails == []
+
+    # Once it's over, they are sent, once
+    make_due(app)
+    assert send_pending(app) == 2
+    assert send_pending(app) == 0
+    assert len(smtp.mails) == 2
+    assert set(m.status for m in outbox(app).values()) == set(['sent'])
+
+
+def test_a_mail_is_reserved_by_one_sender_only(app):
+    enqueue(app, 'a@example.com')
+
+    with app.app_context():
+        first = mail_sender._claim_batch(10, 300)
+    with app.app_context():
+        second = mail_sender._claim_batch(10, 300)
+
+    assert len(first) == 1
+    assert second == []
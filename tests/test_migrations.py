@@ -0,0 +1,113 @@
+"""Bringing an existing database up to date."""
+
+from datetime import datetime, timedelta
+
+import pytest
+from click.testing import CliRunner
+from flask.cli import ScriptInfo, cli
+from sqlalchemy import inspect
+
+from application.database import db_session
+from application.migrations import backfill_timestamps, upgrade
+from application.models import Category
+
+
+def index_names(engine, table_name):
+    return set(index['name']
+               for index in inspect(engine).get_indexes(table_name))
+
+
+def test_upgrade_of_an_up_to_date_database_changes_nothing(engine):
+    assert upgrade(engine) == []
+
+
+def test_upgrade_creates_the_missing_indexes(engine):
+    engine.execute('DROP INDEX ix_gift_created_at')
+
+    assert upgrade(engine) == [('created', 'index', 'ix_gift_created_at')]
+    assert 'ix_gift_created_at' in index_names(engine, 'gift')
+
+
+def test_upgrade_drops_the_indexes_no_model_declares(engine):
+    # The feed's indexes before Gift.state
+    engine.execute('CREATE INDEX ix_gift_expires_at ON gift (expires_at)')
+    engine.execute('CREATE INDEX ix_gift_category_id_expires_at '
+                   'ON gift (category_id, expires_at)')
+
+    assert sorted(upgrade(engine)) == [
+        ('dropped', 'index', 'ix_gift_category_id_expires_at'),
+        ('dropped', 'index', 'ix_gift_expires_at')]
+
+    names = index_names(engine, 'gift')
+    assert 'ix_gift_expires_at' not in names
+    assert 'ix_gift_category_id_expires_at' not in names
+    assert 'ix_gift_state_expires_at' in names
+    assert upgrade(engine) == []
+
+
+def test_upgrade_rebuilds_the_archive_tables_keyed_by_id(engine):
+    # As created before archive_id
+    engine.execute('DROP TABLE gift_archive')
+    engine.execute('CREATE TABLE gift_archive (id INTEGER PRIMARY KEY, '
+                   'name VARCHAR(80), creator_id INTEGER, '
+                   'archived_at DATETIME)')
+    engine.execute('CREATE INDEX ix_gift_archive_creator_id '
+                   'ON gift_archive (creator_id)')
+    engine.execute("INSERT INTO gift_archive VALUES "
+                   "(7, 'Old', 1, '2017-01-01 00:00:00')")
+
+    assert upgrade(engine) == [('rebuilt', 'table', 'gift_archive')]
+
+    columns = inspect(engine).get_pk_constraint('gift_archive')
+    assert columns['constrained_columns'] == ['archive_id']
+    assert index_names(engine, 'gift_archive') == \
+        set(['ix_gift_archive_id', 'ix_gift_archive_creator_id'])
+    assert engine.execute('SELECT archive_id, id, name, creator_id '
+                          'FROM gift_archive').fetchall() == \
+        [(1, 7, 'Old', 1)]
+    assert upgrade(engine) == []
+
+
+def test_backfill_timestamps_applies_once(app):
+    written_at = datetime(2017, 6, 1, 14, 0)
+    with app.app_context():
+        db_session.add(Category(name='Books', created_at=written_at))
+        db_session.commit()
+
+        changed = backfill_timestamps(db_session, utc_offset=2)
+        db_session.commit()
+        assert changed['category'] == 1
+
+        with pytest.raises(RuntimeError):
+            backfill_timestamps(db_session, utc_offset=2)
+        db_session.rollback()
+
+        category = db_session.query(Category).one()
+        assert category.created_at == written_at - timedelta(hours=2)
+
+
+def test_upgrade_leaves_out_a_unique_index_rows_break(app, engine):
+    # As before oauth_id was unique
+    engine.execute('DROP INDEX ix_user_oauth_id')
+    engine.execute('CREATE INDEX ix_user_oauth_id_old ON user (oauth_id)')
+    for name, oauth_id in [('A', 'same'), ('B', 'other'), ('C', 'same'),
+                           ('D', None), ('E', None)]:
+        engine.execute("INSERT INTO user (name, email, oauth_id) "
+                       "VALUES (?, ?, ?)", name, name + '@example.com',
+                       oauth_id)
+
+    # The rest of the upgrade goes on
+    assert sorted(upgrade(engine)) == [
+        ('dropped', 'index', 'ix_user_oauth_id_old'),
+        ('skipped', 'index', 'ix_user_oauth_id')]
+    assert 'ix_user_oauth_id' not in index_names(engine, 'user')
+
+    result = CliRunner().invoke(
+        cli, ['upgrade-db'], obj=ScriptInfo(create_app=lambda info: app))
+    assert result.exit_code == 1
+    assert 'Left out the index ix_user_oauth_id: rows of user share ' \
+        'their oauth_id' in result.output
+    assert 'The rows, by id: 1, 3' in result.output
+
+    engine.execute("UPDATE user SET oauth_id = 'third' WHERE id = 3")
+    assert upgrade(engine) == [('created', 'index', 'ix_user_oauth_id')]
@@ -0,0 +1,218 @@
+"""The OAuth client, pointed at a local stub of Google and Facebook."""
+
+import BaseHTTPServer
+import SocketServer
+import json
+import os
+import threading
+import urlparse
+
+import pytest
+
+from application import oauth
+from application.oauth import oauth_client
+
+CLIENT_ID = 'giftr.apps.googleusercontent.com'
+
+
+class ProviderHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """Answer like Google's and Facebook's endpoints, keeping connections."""
+
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        BaseHTTPServer.BaseHTTPRequestHandler.setup(self)
+        # Once per connection, however many requests it carries
+        self.server.connections += 1
+
+    def do_GET(self):
+        url = urlparse.urlparse(self.path)
+        params = dict(urlparse.parse_qsl(url.query))
+        self.server.requests.append(url.path)
+        if url.path == '/tokeninfo':
+            if params['access_token'] == 'revoked':
+                self.reply({'error': 'invalid_token'})
+            else:
+                expires_in = 5 if params['access_token'] == 'short' else 3600
+                self.reply({'issued_to': CLIENT_ID, 'user_id': '42',
+                            'expires_in': expires_in})
+        elif url.path == '/oauth/access_token':
+            self.reply({'access_token': 'long-' + params['fb_exchange_token']})
+        elif url.path == '/v2.8/me':
+            self.reply({'id': '1234', 'name': 'Face', 'email': 'f@example.com',
+                        'picture': {'data': {'url': 'http://example.com/f'}}})
+        else:
+            self.reply({'error': 'not found'}, 404)
+
+    def do_POST(self):
+        # Google's revocation
+        self.revoke()
+
+    def do_DELETE(self):
+        # Facebook's revocation of the app's permissions
+        self.revoke()
+
+    def revoke(self):
+        length = int(self.headers.getheader('Content-Length') or 0)
+        self.rfile.read(length)
+        self.server.requests.append(urlparse.urlparse(self.path).path)
+        self.reply({'success': True})
+
+    def reply(self, body, status=200):
+        body = json.dumps(body)
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class ProviderStub(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    """A local HTTP server counting its connections and requests."""
+
+    daemon_threads = True
+
+    def __init__(self):
+        BaseHTTPServer.HTTPServer.__init__(self, ('127.0.0.1', 0),
+                                           ProviderHandler)
+        self.connections = 0
+        self.requests = []
+
+
+class Clock(object):
+    """Stands for the time module, with a time that only moves when told."""
+
+    def __init__(self):
+        self.now = 1000000.0
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def provider(app):
+    """Start the stub, point the app's provider URLs at it."""
+    stub = ProviderStub()
+    thread = threading.Thread(target=stub.serve_forever,
+                              kwargs={'poll_interval': 0.05})
+    thread.daemon = True
+    thread.start()
+
+    url = 'http://127.0.0.1:%d' % stub.server_address[1]
+    app.config.update(GOOGLE_TOKENINFO_URL=url + '/tokeninfo',
+                      GOOGLE_USERINFO_URL=url + '/userinfo',
+                      GOOGLE_REVOKE_URL=url + '/revoke',
+                      FACEBOOK_GRAPH_URL=url)
+    yield stub
+
+    # Let the stub's threads go
+    oauth_client.session.close()
+    stub.shutdown()
+    stub.server_close()
+
+
+@pytest.fixture
+def secrets(app, tmpdir, monkeypatch):
+    """Give the app secrets files, return the list of the files opened.
+
+    The client reads them again (init_app), with its module's open
+    counting the files it opens.
+    """
+    google = tmpdir.join('google_client_secrets.json')
+    google.write(json.dumps({'web': {'client_id': CLIENT_ID,
+                                     'client_secret': 'secret'}}))
+    facebook = tmpdir.join('fb_client_secrets.json')
+    facebook.write(json.dumps({'web': {'app_id': 'app',
+                                       'app_secret': 'secret'}}))
+    app.config.update(GOOGLE_CLIENT_SECRETS=str(google),
+                      FACEBOOK_CLIENT_SECRETS=str(facebook))
+
+    opened = []
+
+    def counting_open(name, *args):
+        opened.append(os.path.basename(name))
+        return open(name, *args)
+
+    monkeypatch.setattr(oauth, 'open', counting_open, raising=False)
+    oauth_client.init_app(app)
+    return opened
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Freeze the OAuth client's clock, return it."""
+    clock = Clock()
+    monkeypatch.setattr(oauth, 'time', clock)
+    return clock
+
+
+def facebook_login(client):
+    """Log in with Facebook through /fbconnect, return the response."""
+    with client.session_transaction() as session:
+        session['state'] = 'state'
+    return client.post('/fbconnect?state=state', data='short-lived')
+
+
+def test_secrets_are_read_once(client, provider, secrets):
+    assert sorted(secrets) == ['fb_client_secrets.json',
+                               'google_client_secrets.json']
+
+    for i in range(3):
+        assert facebook_login(client).status_code == 200
+        client.get('/disconnect')
+
+    # Three logins, no file read
+    assert len(secrets) == 2
+    assert provider.requests.count('/oauth/access_token') == 3
+
+
+def test_connections_are_reused(client, provider, secrets):
+    for i in range(3):
+        assert facebook_login(client).status_code == 200
+        client.get('/disconnect')
+    oauth_client.google_userinfo('token')
+
+    # An exchange, a profile and a revocation per login, then the profile
+    assert len(provider.requests) == 10
+    assert provider.connections == 1
+
+
+def test_tokeninfo_is_cached_for_its_ttl(app, provider, clock):
+    app.config['OAUTH_TOKENINFO_TTL'] = 60
+
+    assert oauth_client.google_tokeninfo('token')['user_id'] == '42'
+    clock.now += 59
+    oauth_client.google_tokeninfo('token')
+    assert provider.requests.count('/tokeninfo') == 1
+
+    clock.now += 1
+    oauth_client.google_tokeninfo('token')
+    assert provider.requests.count('/tokeninfo') == 2
+
+
+def test_tokeninfo_is_cached_until_the_token_expires(app, provider, clock):
+    app.config['OAUTH_TOKENINFO_TTL'] = 60
+
+    oauth_client.google_tokeninfo('short')
+    clock.now += 4
+    oauth_client.google_tokeninfo('short')
+    assert provider.requests.count('/tokeninfo') == 1
+
+    # It expires in 5 seconds, sooner than the TTL
+    clock.now += 1
+    oauth_client.google_tokeninfo('short')
+    assert provider.requests.count('/tokeninfo') == 2
+
+
+def test_errors_and_revoked_tokens_are_not_cached(provider, clock):
+    assert oauth_client.google_tokeninfo('revoked')['error']
+    oauth_client.google_tokeninfo('revoked')
+    assert provider.requests.count('/tokeninfo') == 2
+
+    oauth_client.google_tokeninfo('token')
+    oauth_client.google_revoke('token')
+    oauth_client.google_tokeninfo('token')
+    assert provider.requests.count('/tokeninfo') == 4
@@ -0,0 +1,58 @@
+"""The listing pages send a fixed number of statements, whatever their rows."""
+
+import pytest
+
+from application.database import db_session
+from application.models import Claim, Gift
+from tests.helpers import assert_max_queries, log_in
+
+
+def add_rows(app, data, count):
+    """Add count gifts of Giver's to Books, and count claims on the first.
+
+    Return the ids of the first gift and of its first claim, with data.
+
+    Arguments:
+    app (object): the Flask app.
+    data (dict): the ids of the data fixture.
+    count (int): the number of gifts and of claims to add.
+    """
+    with app.app_context():
+        first = db_session.query(Gift).order_by(Gift.id).first()
+        for i in range(count):
+            db_session.add(Gift(name='More %d' % i,
+                                description='Another gift.',
+                                creator_id=data['giver'],
+                                category_id=data['books']))
+            db_session.add(Claim(message='Me please.',
+                                 gift_id=first.id,
+                                 creator_id=data['taker']))
+        db_session.commit()
+        claim = db_session.query(Claim).order_by(Claim.id).first()
+        return dict(data, gift=first.id, claim=claim.id)
+
+
+@pytest.mark.parametrize('path, queries', [
+    # The gifts with their creator and category
+    ('/gifts?limit=100', 1),
+    ('/gifts?cat={books}&limit=100', 1),
+    # The user, then their gifts with their category
+    ('/gifts/user/{giver}', 2),
+    # The claims with their gift and creator, then the gift
+    ('/gifts/{gift}/claims', 2),
+    ('/gifts/{gift}/claims/{claim}', 1),
+])
+def test_listing_queries(app, client, engine, data, path, queries):
+    log_in(client, data['giver'])
+    # The categories are loaded once per process, not by the page
+    client.get('/categories')
+
+    ids = add_rows(app, data, 2)
+    with assert_max_queries(engine, queries) as few_rows:
+        assert client.get(path.format(**ids)).status_code == 200
+
+    add_rows(app, data, 30)
+    with assert_max_queries(engine, queries) as many_rows:
+        assert client.get(path.format(**ids)).status_code == 200
+
+    assert len(many_rows) == len(few_rows)
@@ -0,0 +1,52 @@
+"""The gift listings read the gift table through its indexes."""
+
+from datetime import datetime, timedelta
+
+import pytest
+
+from application.pagination import encode_cursor
+from tests.helpers import recorded_statements, query_plan
+
+
+def gift_plans(app, client, path):
+    """Return the plans of the queries of a page on the gift table."""
+    engine = app.extensions['sqlalchemy_engine']
+    # The categories are loaded once per process, not by the page
+    client.get('/categories')
+    with recorded_statements(engine) as statements:
+        response = client.get(path)
+    assert response.status_code == 200
+    return [query_plan(engine, statement, parameters)
+            for statement, parameters in statements
+            if 'FROM gift' in statement]
+
+
+@pytest.mark.parametrize('path, index', [
+    ('/gifts', 'ix_gift_state_expires_at'),
+    ('/gifts?cat={books}', 'ix_gift_state_category_id_expires_at'),
+    ('/gifts?cat={books}&limit=5&cursor={cursor}',
+     'ix_gift_state_category_id_expires_at'),
+    ('/api/gifts', 'ix_gift_created_at'),
+    ('/api/gifts?cat={books}', 'ix_gift_category_id_created_at'),
+])
+def test_gift_listings_use_their_index(app, client, data, path, index):
+    # A page past the first one
+    cursor = encode_cursor(datetime.utcnow() + timedelta(days=4), 1)
+    plans = gift_plans(app, client, path.format(cursor=cursor, **data))
+
+    assert plans
+    for plan in plans:
+        assert any(index in step for step in plan), plan
+        # Never a full scan of the gift table
+        assert not [step for step in plan
+                    if step.startswith(('SCAN TABLE gift', 'SCAN gift')) and
+                    'INDEX' not in step], plan
+
+
+def test_user_gifts_use_their_index(app, client, data):
+    plans = gift_plans(app, client, '/gifts/user/%d' % data['giver'])
+
+    assert plans
+    for plan in plans:
+        assert any('ix_gift_creator_id_created_at' in step
+                   for step in plan), plan
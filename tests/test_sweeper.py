@@ -0,0 +1,54 @@
+"""Expiring and archiving the gifts past their date."""
+
+from datetime import datetime, timedelta
+
+from sqlalchemy import select
+
+from application.database import db_session
+from application.models import Claim, Gift, User, gift_archive, claim_archive
+from application.sweeper import gift_sweeper
+
+
+def add_dead_gift(app, user_id, name):
+    """Add a gift, with a claim, expired for a month, return its id."""
+    with app.app_context():
+        gift = Gift(name=name, description='Gone.', creator_id=user_id,
+                    expires_at=datetime.utcnow() - timedelta(days=30))
+        db_session.add(gift)
+        db_session.flush()
+        db_session.add(Claim(message='Too late?', gift_id=gift.id,
+                             creator_id=user_id))
+        db_session.commit()
+        return gift.id
+
+
+def sweep(app):
+    with app.app_context():
+        return gift_sweeper.sweep()
+
+
+def test_archived_ids_may_come_back(app):
+    app.config['GIFT_ARCHIVE_AFTER_DAYS'] = 7
+    with app.app_context():
+        user = User(name='Giver', email='giver@example.com', oauth_id='g')
+        db_session.add(user)
+        db_session.commit()
+        user_id = user.id
+
+    first = add_dead_gift(app, user_id, 'First')
+    assert sweep(app) == (1, 1)
+
+    # SQLite hands out the id of the archived gift again
+    second = add_dead_gift(app, user_id, 'Second')
+    assert second == first
+    assert sweep(app) == (1, 1)
+
+    with app.app_context():
+        gifts = db_session.execute(
+            select([gift_archive.c.id, gift_archive.c.name])
+            .order_by(gift_archive.c.archive_id)).fetchall()
+        claims = db_session.execute(
+            select([claim_archive.c.gift_id])).fetchall()
+        assert db_session.query(Gift).count() == 0
+    assert gifts == [(first, 'First'), (first, 'Second')]
+    assert claims == [(first,), (first,)]
@@ -0,0 +1,49 @@
+"""The versions of the tables, bumped once per transaction."""
+
+from application.database import db_session
+from application.models import Category, Gift
+from application.models.table_version import get_version, get_versions
+from tests.helpers import recorded_statements
+
+
+def version_writes(statements):
+    # The data fixture wrote every table: their rows exist
+    return [parameters[-1] for statement, parameters in statements
+            if statement.startswith('UPDATE table_version')]
+
+
+def test_a_transaction_bumps_each_table_it_wrote_once(app, engine, data):
+    with app.app_context():
+        before = get_versions(db_session, ['gift', 'category', 'user'])
+        db_session.rollback()
+
+        with recorded_statements(engine) as statements:
+            for i in range(3):
+                db_session.query(Gift).get(i + 1).name = 'Renamed %d' % i
+                db_session.flush()
+            db_session.add(Category(name='Games'))
+            db_session.query(Gift).filter(Gift.id == 4) \
+                      .update({'name': 'Bulk'}, synchronize_session=False)
+            # Not bumped before the commit
+            assert version_writes(statements) == []
+            db_session.commit()
+
+        assert sorted(version_writes(statements)) == ['category', 'gift']
+        after = get_versions(db_session, ['gift', 'category', 'user'])
+        assert after == {'gift': before['gift'] + 1,
+                         'category': before['category'] + 1,
+                         'user': before['user']}
+
+
+def test_a_rolled_back_transaction_bumps_nothing(app, data):
+    with app.app_context():
+        before = get_version(db_session, 'gift')
+        db_session.query(Gift).get(1).name = 'Renamed'
+        db_session.flush()
+        db_session.rollback()
+
+        # Nor does the next one, that wrote no gift
+        db_session.add(Category(name='Games'))
+        db_session.commit()
+
+        assert get_version(db_session, 'gift') == before
@@ -0,0 +1,17 @@
+#!/usr/bin/env python
+
+"""Serve the app with a production WSGI server, e.g.:
+
+    SECRET_KEY=... gunicorn -c gunicorn.conf.py wsgi:app
+
+The app is built once, with the production profile (or GIFTR_PROFILE's),
+and warmed up before the server accepts requests.
+"""
+
+import os
+
+from application import create_app
+from application.server import warm_up
+
+app = create_app(os.environ.get('GIFTR_PROFILE') or 'production')
+warm_up(app)